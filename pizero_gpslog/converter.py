@@ -35,51 +35,165 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ##################################################################################
 """
 
+import os
 import sys
-import argparse
+import csv
 import json
+import time
+import shutil
+import argparse
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from glob import glob
+from itertools import islice
+from typing import (
+    Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Type
+)
+from xml.sax.saxutils import escape, quoteattr
 
 import pint
+from gpxpy.geo import distance
 from gpxpy.gpx import GPX, GPXTrack, GPXTrackSegment, GPXTrackPoint
 from gpxpy.gpxfield import TIME_TYPE
+from gpxpy.utils import make_str
 
+from pizero_gpslog.logreader import (
+    CHUNK_SIZE, FixReader, FixRecord, iter_fixes, iter_fixes_parallel, orjson
+)
+from pizero_gpslog.simplify import METHODS, fixes_to_keep
+from pizero_gpslog.track import Track, TrackColumns
+from pizero_gpslog.tripstats import RunningStats
+from pizero_gpslog.utils import parse_gps_time, process_context
 from pizero_gpslog.version import VERSION
 
+#: minimum input size in bytes for :py:class:`~.GpxConverter` to decode it in
+#: parallel, if allowed to use more than one process
+PARALLEL_MIN_SIZE = 2 * CHUNK_SIZE
+
 
 class GpxConverter(object):
 
-    def __init__(self, input_fpath, imperial=False):
+    def __init__(
+        self, input_fpath, imperial=False, jobs: Optional[int] = 1,
+        simplify: Optional[float] = None, simplify_method: str = 'dp'
+    ):
         self._in_fpath = input_fpath
         self._imperial = imperial
         self._ureg = pint.UnitRegistry()
+        #: number of processes to decode the input with; None for one per
+        #: CPU core
+        self._jobs: Optional[int] = jobs
+        #: if not None, :py:meth:`~.export` simplifies the track to within
+        #: this many metres, with :py:data:`~.simplify_method`
+        self.simplify: Optional[float] = simplify
+        #: name of the :py:data:`pizero_gpslog.simplify.METHODS` to use
+        self.simplify_method: str = simplify_method
 
     def convert(self):
-        logs = []
-        with open(self._in_fpath, 'r', errors='ignore') as fh:
-            lineno = 0
-            for line in fh.readlines():
-                lineno += 1
-                line = line.strip()
-                if len(line) == 0:
-                    continue
-                try:
-                    j = json.loads(line)
-                except json.decoder.JSONDecodeError as ex:
-                    sys.stderr.write(
-                        'Unable to decode JSON on line %s; skipping. '
-                        '(ERROR: %s)\n' % (
-                            lineno, ex
-                        )
-                    )
-                    continue
-                if 'tpv' not in j:
-                    continue
-                if j['tpv'][0].get('mode', 0) < 2:
-                    continue
-                j['lineno'] = lineno
-                logs.append(j)
-        gpx = self._gpx_for_logs(logs)
-        return gpx
+        return self._gpx_for_fixes(self._fixes())
+
+    def _fixes(
+        self, errors: Optional[TextIO] = sys.stderr
+    ) -> Iterator[FixRecord]:
+        """
+        Read the input's fixes, reporting invalid lines to ``errors``; in
+        parallel chunks with
+        :py:func:`pizero_gpslog.logreader.iter_fixes_parallel` if more than
+        one process is to be used and the input is at least
+        :py:data:`~.PARALLEL_MIN_SIZE` bytes, otherwise serially.
+        """
+        jobs = self._jobs or os.cpu_count() or 1
+        if jobs > 1 and os.path.getsize(self._in_fpath) >= PARALLEL_MIN_SIZE:
+            return iter_fixes_parallel(
+                self._in_fpath, jobs=jobs, errors=errors
+            )
+        return iter_fixes(self._in_fpath, errors=errors)
+
+    def convert_stream(self, out_fh: TextIO) -> dict:
+        """
+        Convert the input file to GPX written to ``out_fh`` one point at a
+        time, in constant memory. The output is the same as that of
+        :py:meth:`~.convert`. Returns the subset of
+        :py:meth:`~.stats_for_gpx` that can be computed while streaming.
+        """
+        return self.export([GpxStreamWriter(out_fh, self.source)])
+
+    @property
+    def source(self) -> str:
+        """Source / creator string written to output files."""
+        return 'pizero-gpslog %s' % VERSION
+
+    def export(self, writers: List['StreamWriter'], full_stats=False) -> dict:
+        """
+        Read the input file once, passing each fix to every one of
+        ``writers`` (see :py:data:`~.EXPORTERS`) and closing them at the
+        end. Returns the subset of :py:meth:`~.stats_for_gpx` that can be
+        computed while streaming or, if ``full_stats`` is True, all of them
+        as from :py:meth:`~.track_stats` (which keeps the time, position,
+        altitude and speed of every fix in memory until the end, in
+        :py:class:`pizero_gpslog.track.TrackColumns`).
+
+        If :py:attr:`~.simplify` is set, the input is read twice: first to
+        find the points kept by
+        :py:func:`pizero_gpslog.simplify.fixes_to_keep`, which keeps the
+        coordinates of every fix in memory and needs working arrays of the
+        same length to simplify them, then to write those points. The stats are
+        still those of the whole track (as of the first read), plus the
+        number of points written as ``simplified_points``.
+        """
+        stats = {'num_points': 0, '2d_horizontal_distance': 0.0}
+        columns: Optional[TrackColumns] = (
+            TrackColumns() if full_stats else None
+        )
+        prev: Optional[FixRecord] = None
+        first: Optional[FixRecord] = None
+        keep = None
+        if self.simplify is not None:
+            keep = fixes_to_keep(
+                self._fixes(errors=None), self.simplify,
+                method=self.simplify_method
+            )
+        source: Iterable[FixRecord] = self._fixes()
+        if keep is not None:
+            # ignore any fixes appended to the input since the first read
+            source = islice(source, len(keep))
+        for idx, fix in enumerate(source):
+            if keep is None or keep[idx]:
+                for writer in writers:
+                    writer.write_point(fix)
+            if columns is not None:
+                columns.append(fix)
+            stats['num_points'] += 1
+            if first is None:
+                first = fix
+            else:
+                stats['2d_horizontal_distance'] += distance(
+                    prev.lat, prev.lon, None, fix.lat, fix.lon, None
+                )
+            prev = fix
+        for writer in writers:
+            writer.close()
+        if columns is not None:
+            stats = columns.track().stats()
+        elif first is not None:
+            stats['track_start'] = TIME_TYPE.from_string(first.time)
+            stats['track_end'] = TIME_TYPE.from_string(prev.time)
+            stats['duration_sec'] = parse_gps_time(prev.time) - \
+                parse_gps_time(first.time)
+        if keep is not None:
+            stats['simplified_points'] = int(keep.sum())
+        return stats
+
+    def track_stats(self) -> dict:
+        """
+        Compute the same statistics as :py:meth:`~.stats_for_gpx` directly
+        from the input file, using the columnar
+        :py:class:`pizero_gpslog.track.Track` engine instead of gpxpy's
+        per-point objects.
+        """
+        return Track.from_file(self._in_fpath).stats()
 
     def stats_for_gpx(self, gpx):
         cloned_gpx = gpx.clone()
@@ -108,10 +222,15 @@ class GpxConverter(object):
         }
 
     def stats_text(self, stats):
+        if 'moving_time' not in stats:
+            return self._stream_stats_text(stats)
         s = 'Track Start: %s UTC\n' % stats['track_start']
         s += 'Track End: %s UTC\n' % stats['track_end']
         s += 'Track Duration: %s\n' % seconds(stats['duration_sec'])
         s += '%d points in track\n' % stats['num_points']
+        if 'simplified_points' in stats:
+            s += '%d points written after simplification\n' % \
+                stats['simplified_points']
         s += 'Moving time: %s\n' % seconds(stats['moving_time'])
         s += 'Stopped time: %s\n' % seconds(stats['stopped_time'])
         s += 'Max Speed: %s\n' % self._ms_mph(stats['max_speed_ms'])
@@ -128,45 +247,46 @@ class GpxConverter(object):
         s += 'Maximum elevation: %s\n' % self._m_ft(stats['max_elev'])
         return s
 
-    def _gpx_for_logs(self, logs):
+    def _stream_stats_text(self, stats):
+        s = ''
+        if 'track_start' in stats:
+            s += 'Track Start: %s UTC\n' % stats['track_start']
+            s += 'Track End: %s UTC\n' % stats['track_end']
+            s += 'Track Duration: %s\n' % seconds(stats['duration_sec'])
+        s += '%d points in track\n' % stats['num_points']
+        if 'simplified_points' in stats:
+            s += '%d points written after simplification\n' % \
+                stats['simplified_points']
+        s += '2D (Horizontal) distance: %s\n' % self._m_ftmi(
+            stats['2d_horizontal_distance']
+        )
+        return s
+
+    def _gpx_for_fixes(self, fixes: Iterable[FixRecord]) -> GPX:
         g = GPX()
         track = GPXTrack()
         track.source = 'pizero-gpslog %s' % VERSION
         g.tracks.append(track)
         seg = GPXTrackSegment()
         track.segments.append(seg)
-        prev_alt = 0.0
-
-        for item in logs:
-            try:
-                tpv = item['tpv'][0]
-                sky = item['sky'][0]
-                alt = tpv.get(
-                    'alt', item['gst'][0].get('alt', prev_alt)
-                )
-                prev_alt = alt
-                p = GPXTrackPoint(
-                    latitude=tpv['lat'],
-                    longitude=tpv['lon'],
-                    elevation=alt,
-                    time=TIME_TYPE.from_string(tpv['time']),
-                    speed=tpv['speed'],
-                    horizontal_dilution=sky.get('hdop', None),
-                    vertical_dilution=sky.get('vdop', None),
-                    position_dilution=sky.get('pdop', None)
-                )
-                if tpv['mode'] == 2:
-                    p.type_of_gpx_fix = '2d'
-                elif tpv['mode'] == 3:
-                    p.type_of_gpx_fix = '3d'
-                if 'satellites' in sky:
-                    p.satellites = len(sky['satellites'])
-                seg.points.append(p)
-            except Exception:
-                sys.stderr.write(
-                    'Exception loading line %d:\n' % item['lineno']
-                )
-                raise
+        for fix in fixes:
+            p = GPXTrackPoint(
+                latitude=fix.lat,
+                longitude=fix.lon,
+                elevation=fix.alt,
+                time=TIME_TYPE.from_string(fix.time),
+                speed=fix.speed,
+                horizontal_dilution=fix.hdop,
+                vertical_dilution=fix.vdop,
+                position_dilution=fix.pdop
+            )
+            if fix.mode == 2:
+                p.type_of_gpx_fix = '2d'
+            elif fix.mode == 3:
+                p.type_of_gpx_fix = '3d'
+            if fix.satellites is not None:
+                p.satellites = fix.satellites
+            seg.points.append(p)
         return g
 
     def _ms_mph(self, n):
@@ -190,6 +310,280 @@ class GpxConverter(object):
         return '%.4f ft' % val.magnitude
 
 
+class StreamWriter(object):
+    """
+    Base class for exporters that write an output file one fix at a time.
+    Subclasses are registered by format name in :py:data:`~.EXPORTERS`.
+
+    A closed output can be appended to later: :py:meth:`~.checkpoint`
+    returns the state needed to do so, and :py:meth:`~.resume` creates a
+    writer from it that continues the file as if it had never been closed.
+    """
+
+    #: written at the end of the output by :py:meth:`~.close`
+    _footer: str = ''
+
+    def __init__(self, fh: TextIO, source: str):
+        self._fh: TextIO = fh
+        #: offset in the output at which the footer starts, once closed
+        self._footer_offset: Optional[int] = None
+
+    def write_point(self, fix: FixRecord):
+        raise NotImplementedError()
+
+    def close(self):
+        self._footer_offset = self._tell()
+        self._fh.write(self._footer)
+
+    def _tell(self) -> Optional[int]:
+        """Current output offset, or None if it isn't seekable (a pipe)."""
+        try:
+            return self._fh.tell()
+        except OSError:
+            return None
+
+    def checkpoint(self) -> dict:
+        """
+        Return JSON-serializable state to pass to :py:meth:`~.resume` to
+        append to the output after :py:meth:`~.close`.
+        """
+        return {'footer_offset': self._footer_offset}
+
+    @classmethod
+    def resume(cls, fh: TextIO, source: str, state: dict) -> 'StreamWriter':
+        """
+        Return a writer that appends to the closed output open (in ``r+``
+        mode) as ``fh``, given the :py:meth:`~.checkpoint` state it was
+        closed with. The footer is removed and rewritten on close.
+        """
+        writer = cls.__new__(cls)
+        StreamWriter.__init__(writer, fh, source)
+        writer._restore(state)
+        return writer
+
+    def _restore(self, state: dict):
+        self._fh.seek(state['footer_offset'])
+        self._fh.truncate()
+
+
+class _SpooledStreamWriter(StreamWriter):
+    """
+    Base class for formats that need all of one value of each fix (written
+    to the output as it's read) before all of another; the latter are
+    spooled to a temporary file and copied to the output on close. On
+    resume, the copied part (which is all ASCII) is read back into a spool.
+    """
+
+    def __init__(self, fh: TextIO, source: str):
+        super().__init__(fh, source)
+        self._spool: TextIO = tempfile.TemporaryFile(mode='w+')
+        #: offset in the output at which the spooled part starts, once closed
+        self._spool_offset: Optional[int] = None
+
+    def close(self):
+        self._spool_offset = self._tell()
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, self._fh)
+        self._spool.close()
+        super().close()
+
+    def checkpoint(self) -> dict:
+        state = super().checkpoint()
+        state['spool_offset'] = self._spool_offset
+        return state
+
+    def _restore(self, state: dict):
+        self._spool = tempfile.TemporaryFile(mode='w+')
+        self._spool_offset = None
+        self._fh.seek(state['spool_offset'])
+        remaining = state['footer_offset'] - state['spool_offset']
+        while remaining > 0:
+            chunk = self._fh.read(min(remaining, 65536))
+            if not chunk:
+                break
+            self._spool.write(chunk)
+            remaining -= len(chunk)
+        self._fh.seek(state['spool_offset'])
+        self._fh.truncate()
+
+
+class GpxStreamWriter(StreamWriter):
+    """
+    Write a single-track, single-segment GPX 1.1 file one point at a time,
+    formatted the same as gpxpy's ``GPX.to_xml()`` output for the track
+    built by :py:meth:`GpxConverter.convert`.
+    """
+
+    _header = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 '
+        'http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" '
+        'creator="gpx.py -- https://github.com/tkrajina/gpxpy">\n'
+        '  <trk>\n'
+        '    <src>%s</src>\n'
+        '    <trkseg>\n'
+    )
+
+    _footer: str = (
+        '    </trkseg>\n'
+        '  </trk>\n'
+        '</gpx>'
+    )
+
+    def __init__(self, fh: TextIO, source: str):
+        super().__init__(fh, source)
+        self._fh.write(self._header % escape(source))
+
+    def write_point(self, fix: FixRecord):
+        lines = [
+            '      <trkpt lat=%s lon=%s>\n' % (
+                quoteattr(make_str(fix.lat)), quoteattr(make_str(fix.lon))
+            )
+        ]
+        if fix.alt is not None:
+            lines.append('        <ele>%s</ele>\n' % make_str(fix.alt))
+        lines.append('        <time>%s</time>\n' % gpx_time(fix.time))
+        if fix.mode == 2:
+            lines.append('        <fix>2d</fix>\n')
+        elif fix.mode == 3:
+            lines.append('        <fix>3d</fix>\n')
+        if fix.satellites is not None:
+            lines.append('        <sat>%d</sat>\n' % fix.satellites)
+        for tag in ('hdop', 'vdop', 'pdop'):
+            value = getattr(fix, tag)
+            if value is not None:
+                lines.append(
+                    '        <%s>%s</%s>\n' % (tag, make_str(value), tag)
+                )
+        lines.append('      </trkpt>\n')
+        self._fh.write(''.join(lines))
+
+
+class GeoJsonStreamWriter(_SpooledStreamWriter):
+    """
+    Write a GeoJSON FeatureCollection with a single LineString Feature of
+    ``[lon, lat, alt]`` coordinates; the fix times are in the Feature's
+    ``coordTimes`` property (which follows the coordinates, so is spooled).
+    """
+
+    _footer: str = ']}}]}\n'
+
+    def __init__(self, fh: TextIO, source: str):
+        super().__init__(fh, source)
+        self._fh.write(
+            '{"type": "FeatureCollection", "features": [{"type": "Feature", '
+            '"geometry": {"type": "LineString", "coordinates": ['
+        )
+        self._count: int = 0
+        self._spool.write(
+            ']}, "properties": {"source": %s, "coordTimes": [' % json.dumps(
+                source
+            )
+        )
+
+    def write_point(self, fix: FixRecord):
+        sep = ', ' if self._count else ''
+        self._count += 1
+        self._fh.write('%s[%r, %r, %r]' % (sep, fix.lon, fix.lat, fix.alt))
+        self._spool.write('%s%s' % (sep, json.dumps(fix.time)))
+
+    def checkpoint(self) -> dict:
+        state = super().checkpoint()
+        state['count'] = self._count
+        return state
+
+    def _restore(self, state: dict):
+        super()._restore(state)
+        self._count = state['count']
+
+
+class KmlStreamWriter(_SpooledStreamWriter):
+    """
+    Write a KML 2.2 document with one Placemark holding a ``gx:Track`` of
+    the fixes; the ``when`` elements are written as they're read, and the
+    ``gx:coord`` elements (which must follow all of them) are spooled.
+    """
+
+    _header = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2" '
+        'xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+        '  <Document>\n'
+        '    <name>%s</name>\n'
+        '    <Placemark>\n'
+        '      <gx:Track>\n'
+        '        <altitudeMode>absolute</altitudeMode>\n'
+    )
+
+    _footer: str = (
+        '      </gx:Track>\n'
+        '    </Placemark>\n'
+        '  </Document>\n'
+        '</kml>\n'
+    )
+
+    def __init__(self, fh: TextIO, source: str):
+        super().__init__(fh, source)
+        self._fh.write(self._header % escape(source))
+
+    def write_point(self, fix: FixRecord):
+        self._fh.write('        <when>%s</when>\n' % fix.time)
+        self._spool.write('        <gx:coord>%r %r %r</gx:coord>\n' % (
+            fix.lon, fix.lat, fix.alt
+        ))
+
+
+class CsvStreamWriter(StreamWriter):
+    """Write one CSV row per fix, with a header row of field names."""
+
+    #: :py:class:`~.FixRecord` fields written, in order
+    fields: List[str] = [
+        'time', 'lat', 'lon', 'alt', 'speed', 'mode', 'hdop', 'vdop',
+        'pdop', 'satellites'
+    ]
+
+    def __init__(self, fh: TextIO, source: str):
+        super().__init__(fh, source)
+        self._writer = csv.writer(fh, lineterminator='\n')
+        self._writer.writerow(self.fields)
+
+    def write_point(self, fix: FixRecord):
+        self._writer.writerow([getattr(fix, f) for f in self.fields])
+
+    def _restore(self, state: dict):
+        super()._restore(state)
+        self._writer = csv.writer(self._fh, lineterminator='\n')
+
+
+#: streaming exporters by output format name, which is also the default
+#: output file extension
+EXPORTERS: Dict[str, Type[StreamWriter]] = {
+    'gpx': GpxStreamWriter,
+    'geojson': GeoJsonStreamWriter,
+    'kml': KmlStreamWriter,
+    'csv': CsvStreamWriter,
+}
+
+
+def register_exporter(name: str, cls: Type[StreamWriter]):
+    """Register a :py:class:`~.StreamWriter` subclass as format ``name``."""
+    EXPORTERS[name] = cls
+
+
+def gpx_time(s: str) -> str:
+    """
+    Convert a gpsd ISO8601 time string to the format gpxpy writes it in,
+    without the cost of parsing it to a datetime.
+    """
+    whole, _, frac = s.rstrip('Z').partition('.')
+    frac = frac.rstrip('0')
+    if frac:
+        return '%s.%sZ' % (whole, frac.ljust(6, '0')[:6])
+    return whole + 'Z'
+
+
 def seconds(s):
     res = []
     if s > 3600:
@@ -202,20 +596,503 @@ def seconds(s):
     return ' '.join(res)
 
 
+def output_path(in_fpath: str, fmt: str) -> str:
+    """
+    Return the default output path for ``in_fpath``: its path with the
+    file extension replaced with ``fmt``.
+    """
+    if '.' not in os.path.basename(in_fpath):
+        return in_fpath + '.' + fmt
+    return in_fpath.rsplit('.', 1)[0] + '.' + fmt
+
+
+def is_up_to_date(in_fpath: str, out_fpath: str) -> bool:
+    """
+    Whether ``out_fpath`` exists, is not empty, and was modified no earlier
+    than ``in_fpath``.
+    """
+    try:
+        out_stat = os.stat(out_fpath)
+    except FileNotFoundError:
+        return False
+    return (
+        out_stat.st_size > 0 and
+        out_stat.st_mtime >= os.stat(in_fpath).st_mtime
+    )
+
+
+def find_inputs(paths: List[str]) -> List[str]:
+    """
+    Expand a list of files and directories into a sorted list of files;
+    directories are replaced with the ``*.json`` files directly in them.
+    """
+    result = set()
+    for path in paths:
+        if os.path.isdir(path):
+            result.update(glob(os.path.join(path, '*.json')))
+        else:
+            result.add(path)
+    return sorted(result)
+
+
+def convert_file(
+    in_fpath: str, outputs: Dict[str, str], stream: bool = False,
+    jobs: Optional[int] = 1, simplify: Optional[float] = None,
+    simplify_method: str = 'dp'
+) -> dict:
+    """
+    Convert one file to each of the formats in ``outputs``, a dict of
+    format name (see :py:data:`~.EXPORTERS`) to output path, reading the
+    input once; used by :py:func:`~.main` and run in a worker process in
+    batch mode. Returns the file's stats, as from
+    :py:meth:`GpxConverter.track_stats` (or only those that can be computed
+    while streaming, if ``stream`` is True). If conversion fails, partially
+    written outputs are removed. ``jobs`` is the number of processes to
+    decode the input with, if it is large (see
+    :py:meth:`GpxConverter._fixes`). If ``simplify`` is given, the outputs
+    are simplified to within that many metres (see
+    :py:meth:`GpxConverter.export`).
+    """
+    conv = GpxConverter(
+        in_fpath, jobs=jobs, simplify=simplify,
+        simplify_method=simplify_method
+    )
+    try:
+        with ExitStack() as stack:
+            writers = [
+                EXPORTERS[fmt](
+                    stack.enter_context(open(path, 'w')), conv.source
+                ) for fmt, path in outputs.items()
+            ]
+            return conv.export(writers, full_stats=not stream)
+    except Exception:
+        for path in outputs.values():
+            if os.path.exists(path):
+                os.unlink(path)
+        raise
+
+
+#: stats keys that are summed, maximized and minimized across files by
+#: :py:func:`~.aggregate_stats`
+_SUM_STATS = [
+    'duration_sec', 'num_points', 'moving_time', 'stopped_time',
+    'moving_distance', 'stopped_distance', '2d_horizontal_distance',
+    'total_elev_inc', 'total_elev_dec', 'simplified_points'
+]
+_MAX_STATS = ['track_end', 'max_speed_ms', 'max_elev']
+_MIN_STATS = ['track_start', 'min_elev']
+
+
+def aggregate_stats(all_stats: List[dict]) -> dict:
+    """
+    Combine the stats of several tracks into one dict with the same keys.
+    Only keys present in every one of ``all_stats`` are included, and None
+    values (e.g. from empty tracks) are ignored.
+    """
+    if not all_stats:
+        return {'num_points': 0, '2d_horizontal_distance': 0.0}
+    keys = set(all_stats[0]).intersection(*all_stats[1:])
+    result = {}
+    for key, func in (
+        [(k, sum) for k in _SUM_STATS] + [(k, max) for k in _MAX_STATS] +
+        [(k, min) for k in _MIN_STATS]
+    ):
+        if key not in keys:
+            continue
+        values = [x[key] for x in all_stats if x[key] is not None]
+        result[key] = func(values) if values else None
+    return result
+
+
+def convert_batch(
+    in_fpaths: List[str], formats: List[str], jobs: Optional[int] = None,
+    force: bool = False, stream: bool = False, out=sys.stderr,
+    simplify: Optional[float] = None, simplify_method: str = 'dp'
+) -> dict:
+    """
+    Convert many files to each of ``formats`` in parallel in a process pool
+    of ``jobs`` workers (default: one per CPU core, started with
+    :py:func:`~pizero_gpslog.utils.process_context`), skipping files whose
+    outputs are all already up to date unless ``force`` is True. Progress
+    and errors are written to ``out`` as each file finishes. ``simplify``
+    and ``simplify_method`` are passed to :py:func:`~.convert_file`.
+    Returns a dict with lists of the ``converted``, ``skipped`` and
+    ``failed`` input paths, and the ``stats`` aggregated across all
+    converted files.
+    """
+    result = {'converted': [], 'skipped': [], 'failed': []}
+    todo = []
+    for in_fpath in in_fpaths:
+        outputs = {fmt: output_path(in_fpath, fmt) for fmt in formats}
+        if not force and all(
+            is_up_to_date(in_fpath, x) for x in outputs.values()
+        ):
+            out.write('Skipping %s: %s up to date\n' % (
+                in_fpath, ', '.join(outputs.values())
+            ))
+            result['skipped'].append(in_fpath)
+            continue
+        todo.append((in_fpath, outputs))
+    all_stats = []
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=process_context()
+    ) as executor:
+        futures = {
+            executor.submit(
+                convert_file, i, o, stream, 1, simplify, simplify_method
+            ): (i, o)
+            for i, o in todo
+        }
+        for count, future in enumerate(as_completed(futures), start=1):
+            in_fpath, outputs = futures[future]
+            try:
+                stats = future.result()
+            except Exception as ex:
+                out.write('[%d/%d] ERROR converting %s: %s: %s\n' % (
+                    count, len(todo), in_fpath, ex.__class__.__name__, ex
+                ))
+                result['failed'].append(in_fpath)
+                continue
+            out.write('[%d/%d] %s written to: %s (%d points)\n' % (
+                count, len(todo), in_fpath, ', '.join(outputs.values()),
+                stats['num_points']
+            ))
+            result['converted'].append(in_fpath)
+            all_stats.append(stats)
+    result['stats'] = aggregate_stats(all_stats)
+    return result
+
+
+#: version of the checkpoint sidecar format written by
+#: :py:class:`~.IncrementalConverter`; others are ignored
+CHECKPOINT_VERSION = 3
+
+#: number of bytes before the checkpoint's offset that
+#: :py:class:`~.IncrementalConverter` checks are unchanged when resuming
+CHECKPOINT_TAIL_BYTES = 4096
+
+
+def checkpoint_path(in_fpath: str) -> str:
+    """Return the path of the checkpoint sidecar file for ``in_fpath``."""
+    return in_fpath + '.ckpt'
+
+
+def checkpoint_stats_path(ckpt_fpath: str) -> str:
+    """
+    Return the path of the file that the running stats for the checkpoint
+    at ``ckpt_fpath`` are saved in.
+    """
+    return ckpt_fpath + '.stats'
+
+
+class IncrementalConverter(object):
+    """
+    Convert a log that is still being written to, one batch of new lines at
+    a time. After each :py:meth:`~.update`, a checkpoint sidecar file is
+    written with the input byte offset and line number reached, the last
+    fix and the state of each output writer, so a later update (in this or
+    another process) only converts new lines. The checkpoint is ignored,
+    and conversion started over, if the input file has been replaced or
+    truncated, the outputs have changed since it was written, or a
+    different set of outputs is requested.
+
+    The stats (a :py:class:`pizero_gpslog.tripstats.RunningStats`, the
+    same as those of a one-shot conversion) are saved in a second, binary,
+    sidecar file (see :py:func:`~.checkpoint_stats_path`) with each
+    checkpoint, so resuming only reads the input from the checkpoint's
+    offset. The checkpoint records a CRC of the stats file and of the last
+    :py:data:`~.CHECKPOINT_TAIL_BYTES` of input before its offset; if
+    either doesn't match, the stats file or the input has been changed and
+    conversion starts over.
+    """
+
+    def __init__(
+        self, in_fpath: str, outputs: Dict[str, str],
+        ckpt_fpath: Optional[str] = None
+    ):
+        self._in_fpath: str = in_fpath
+        self._outputs: Dict[str, str] = outputs
+        self._ckpt_fpath: str = ckpt_fpath or checkpoint_path(in_fpath)
+        self._stats_fpath: str = checkpoint_stats_path(self._ckpt_fpath)
+        self._state: Optional[dict] = self._load()
+        #: running statistics for the whole track
+        self.stats: RunningStats = RunningStats()
+        if self._state is not None and not self._load_stats():
+            self._state = None
+
+    @property
+    def resumed(self) -> bool:
+        """Whether a valid checkpoint is being resumed from."""
+        return self._state is not None
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self._ckpt_fpath) as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return state if self._is_valid(state) else None
+
+    def _is_valid(self, state: dict) -> bool:
+        try:
+            st = os.stat(self._in_fpath)
+            if (
+                state['version'] != CHECKPOINT_VERSION or
+                state['inode'] != st.st_ino or state['offset'] > st.st_size or
+                set(state['outputs']) != set(self._outputs)
+            ):
+                return False
+            for fmt, path in self._outputs.items():
+                out = state['outputs'][fmt]
+                if out['path'] != path or os.path.getsize(path) != out['size']:
+                    return False
+        except (OSError, KeyError, TypeError):
+            return False
+        return True
+
+    def _tail_crc(self, offset: int) -> int:
+        """
+        Return the CRC32 of the :py:data:`~.CHECKPOINT_TAIL_BYTES` of input
+        before ``offset``.
+        """
+        start = max(0, offset - CHECKPOINT_TAIL_BYTES)
+        with open(self._in_fpath, 'rb') as fh:
+            fh.seek(start)
+            return zlib.crc32(fh.read(offset - start))
+
+    def _load_stats(self) -> bool:
+        """
+        Load :py:attr:`~.stats` from the stats file saved with the
+        checkpoint. Returns whether it and the input before the
+        checkpoint's offset are unchanged.
+        """
+        state = self._state
+        try:
+            with open(self._stats_fpath, 'rb') as fh:
+                data = fh.read()
+            if (
+                zlib.crc32(data) != state['stats_crc'] or
+                self._tail_crc(state['offset']) != state['tail_crc']
+            ):
+                return False
+            self.stats = RunningStats.from_bytes(data)
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def update(self) -> int:
+        """
+        Convert any complete lines added to the input since the last update
+        (or checkpoint), update the outputs and stats, and write the
+        checkpoint. Returns the number of new fixes.
+        """
+        st = os.stat(self._in_fpath)
+        state = self._state
+        if state is not None and (
+            state['inode'] != st.st_ino or state['offset'] > st.st_size
+        ):
+            state = None
+        if state is not None and state['offset'] == st.st_size:
+            return 0
+        source = GpxConverter(self._in_fpath).source
+        if state is None:
+            reader = FixReader(self._in_fpath)
+            self.stats = RunningStats()
+            last = None
+        else:
+            reader = FixReader(
+                self._in_fpath, offset=state['offset'],
+                lineno=state['lineno'], prev_alt=state['prev_alt']
+            )
+            last = state['last_fix']
+        count = 0
+        with ExitStack() as stack:
+            if state is None:
+                writers = {
+                    fmt: EXPORTERS[fmt](
+                        stack.enter_context(open(path, 'w')), source
+                    ) for fmt, path in self._outputs.items()
+                }
+            else:
+                writers = {
+                    fmt: EXPORTERS[fmt].resume(
+                        stack.enter_context(open(path, 'r+')), source,
+                        state['outputs'][fmt]['state']
+                    ) for fmt, path in self._outputs.items()
+                }
+            for fix in reader.fixes(complete_only=True):
+                for writer in writers.values():
+                    writer.write_point(fix)
+                self.stats.add(
+                    parse_gps_time(fix.time), fix.lat, fix.lon, fix.alt
+                )
+                last = fix._asdict()
+                count += 1
+            for writer in writers.values():
+                writer.close()
+        self._state = {
+            'version': CHECKPOINT_VERSION,
+            'inode': st.st_ino,
+            'offset': reader.offset,
+            'lineno': reader.lineno,
+            'prev_alt': reader.prev_alt,
+            'last_fix': last,
+            'tail_crc': self._tail_crc(reader.offset),
+            'outputs': {
+                fmt: {
+                    'path': path,
+                    'size': os.path.getsize(path),
+                    'state': writers[fmt].checkpoint()
+                } for fmt, path in self._outputs.items()
+            }
+        }
+        self._save()
+        return count
+
+    def _save(self):
+        data = self.stats.to_bytes()
+        tmp = self._stats_fpath + '.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, self._stats_fpath)
+        self._state['stats_crc'] = zlib.crc32(data)
+        tmp = self._ckpt_fpath + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self._state, fh)
+        os.replace(tmp, self._ckpt_fpath)
+
+    def follow(
+        self, interval: float = 1.0, out: TextIO = sys.stderr,
+        max_updates: Optional[int] = None
+    ):
+        """
+        Call :py:meth:`~.update` every ``interval`` seconds, writing a line
+        to ``out`` whenever there are new fixes, until interrupted (or
+        after ``max_updates`` updates).
+        """
+        updates = 0
+        while max_updates is None or updates < max_updates:
+            count = self.update()
+            updates += 1
+            if count:
+                stats = self.stats
+                out.write('%d new points; %d total, %.1f m\n' % (
+                    count, stats.num_points, stats.distance_2d
+                ))
+                out.flush()
+            if max_updates is None or updates < max_updates:
+                time.sleep(interval)
+
+
+def decoders() -> List[Tuple[str, dict]]:
+    """
+    The ways of reading fixes compared by :py:func:`~.benchmark_decode`, as
+    ``(name, iter_fixes keyword arguments)`` tuples.
+    """
+    result = [
+        ('full json', {'fast': False, 'loads': json.loads}),
+        ('projected json', {'fast': True, 'loads': json.loads})
+    ]
+    if orjson is not None:
+        result.extend([
+            ('full orjson', {'fast': False, 'loads': orjson.loads}),
+            ('projected orjson', {'fast': True, 'loads': orjson.loads})
+        ])
+    return result
+
+
+def benchmark_decode(in_fpaths: List[str]) -> List[Tuple[str, int, float]]:
+    """
+    Time reading all fixes from each of ``in_fpaths`` with each of
+    :py:func:`~.decoders`. Returns a list of ``(decoder name, number of
+    fixes, throughput in MB/s)`` tuples.
+    """
+    size = sum(os.path.getsize(p) for p in in_fpaths)
+    result = []
+    for name, kwargs in decoders():
+        count = 0
+        start = time.perf_counter()
+        for fpath in in_fpaths:
+            for _ in iter_fixes(fpath, errors=None, **kwargs):
+                count += 1
+        elapsed = time.perf_counter() - start
+        result.append((name, count, size / 1000000.0 / elapsed))
+    return result
+
+
 def main(argv=sys.argv[1:]):
     args = parse_args(argv)
-    if args.output is None:
-        if '.' not in args.JSON_FILE:
-            args.output = args.JSON_FILE + '.' + args.format
-        else:
-            args.output = args.JSON_FILE.rsplit('.', 1)[0] + '.' + args.format
+    if args.benchmark:
+        for name, count, mbps in benchmark_decode(find_inputs(args.JSON_FILE)):
+            print('%-18s %d fixes %10.2f MB/s' % (name, count, mbps))
+        return
+    formats = []
+    for fmt in ','.join(args.format or ['gpx']).split(','):
+        if fmt not in EXPORTERS:
+            raise SystemExit('ERROR: unknown output format: %s' % fmt)
+        if fmt not in formats:
+            formats.append(fmt)
+    if args.output is not None and len(formats) > 1:
+        raise SystemExit(
+            'ERROR: -o/--output cannot be used with more than one format'
+        )
+    if args.simplify is not None and (args.checkpoint or args.follow):
+        raise SystemExit(
+            'ERROR: --simplify cannot be used with -c/--checkpoint or --follow'
+        )
+    if len(args.JSON_FILE) > 1 or os.path.isdir(args.JSON_FILE[0]):
+        if args.checkpoint or args.follow:
+            raise SystemExit(
+                'ERROR: -c/--checkpoint and --follow cannot be used with more '
+                'than one input'
+            )
+        if args.output is not None:
+            raise SystemExit(
+                'ERROR: -o/--output cannot be used with more than one input'
+            )
+        res = convert_batch(
+            find_inputs(args.JSON_FILE), formats, jobs=args.jobs,
+            force=args.force, stream=args.stream, simplify=args.simplify,
+            simplify_method=args.simplify_method
+        )
+        sys.stderr.write(
+            '%d files converted, %d skipped as up to date, %d failed\n' % (
+                len(res['converted']), len(res['skipped']),
+                len(res['failed'])
+            )
+        )
+        if args.stats and res['converted']:
+            conv = GpxConverter(None, imperial=args.imperial)
+            print('Totals for %d converted files:' % len(res['converted']))
+            print(conv.stats_text(res['stats']))
+        if res['failed']:
+            raise SystemExit(1)
+        return
+    args.JSON_FILE = args.JSON_FILE[0]
+    if args.output is not None:
+        outputs = {formats[0]: args.output}
+    else:
+        outputs = {fmt: output_path(args.JSON_FILE, fmt) for fmt in formats}
     conv = GpxConverter(args.JSON_FILE, imperial=args.imperial)
-    gpx = conv.convert()
-    with open(args.output, 'w') as fh:
-        fh.write(gpx.to_xml())
-    sys.stderr.write('GPX file written to: %s' % args.output)
+    if args.checkpoint or args.follow:
+        inc = IncrementalConverter(args.JSON_FILE, outputs)
+        if args.follow:
+            try:
+                inc.follow(interval=args.interval)
+            except KeyboardInterrupt:
+                pass
+        else:
+            inc.update()
+        stats = inc.stats.stats()
+    else:
+        stats = convert_file(
+            args.JSON_FILE, outputs, stream=args.stream, jobs=args.jobs,
+            simplify=args.simplify, simplify_method=args.simplify_method
+        )
+    for fmt, path in outputs.items():
+        sys.stderr.write('%s file written to: %s\n' % (fmt.upper(), path))
     if args.stats:
-        print(conv.stats_text(conv.stats_for_gpx(gpx)))
+        print(conv.stats_text(stats))
 
 
 def parse_args(argv):
@@ -224,9 +1101,12 @@ def parse_args(argv):
         description='Convert pizero-gpslog (gpsd POLL format) output files to '
                     'common GPS formats.'
     )
-    p.add_argument('-f', '--format', dest='format', action='store', type=str,
-                   choices=['gpx'], default='gpx',
-                   help='destination format (default: gpx)')
+    p.add_argument('-f', '--format', dest='format', action='append',
+                   type=str, default=None,
+                   help='destination format; one of: %s (default: gpx). May '
+                        'be given more than once, or as a comma-separated '
+                        'list, to write several formats from one read of '
+                        'the input.' % ', '.join(sorted(EXPORTERS)))
     p.add_argument('-o', '--output', dest='output', action='store', type=str,
                    default=None,
                    help='Output file path. By default, will be the input '
@@ -236,10 +1116,63 @@ def parse_args(argv):
                    default=True,
                    help='do not print stats to STDERR'
                    )
+    p.add_argument('-s', '--stream', dest='stream', action='store_true',
+                   default=False,
+                   help='convert one point at a time, in constant memory, '
+                        'for very large files; only basic stats are '
+                        'available')
+    p.add_argument('-j', '--jobs', dest='jobs', action='store', type=int,
+                   default=None,
+                   help='when converting more than one file, the number of '
+                        'files to convert in parallel; when converting one '
+                        'large file, the number of processes to decode it '
+                        'with, in chunks (default: number of CPU cores)')
+    p.add_argument('-F', '--force', dest='force', action='store_true',
+                   default=False,
+                   help='when converting more than one file, also convert '
+                        'files whose output is newer than the input')
+    p.add_argument('-b', '--benchmark', dest='benchmark',
+                   action='store_true', default=False,
+                   help='do not convert; instead, report the throughput of '
+                        'reading fixes from the input files with each JSON '
+                        'decoder')
+    p.add_argument('-c', '--checkpoint', dest='checkpoint',
+                   action='store_true', default=False,
+                   help='convert incrementally: resume from (and then '
+                        'update) a checkpoint file next to the input '
+                        '(INPUT.ckpt), only converting lines added since '
+                        'the last run')
+    p.add_argument('--follow', dest='follow', action='store_true',
+                   default=False,
+                   help='like -c/--checkpoint, but keep following the input '
+                        'as it grows, updating the outputs and checkpoint '
+                        'every --interval seconds until interrupted')
+    p.add_argument('--interval', dest='interval', action='store', type=float,
+                   default=1.0,
+                   help='seconds between checks for new lines with --follow '
+                        '(default: 1.0)')
+    p.add_argument('--simplify', dest='simplify', action='store', type=float,
+                   default=None, metavar='METRES',
+                   help='write a simplified track that stays within this '
+                        'many metres of the original (stats are still for '
+                        'the whole track). The input is read twice; in '
+                        'between, the coordinates of every point are kept '
+                        'and simplified, taking roughly 130 (dp) or 330 '
+                        '(vw) bytes of memory per point.')
+    p.add_argument('--simplify-method', dest='simplify_method',
+                   action='store', choices=sorted(METHODS), default='dp',
+                   help='simplification algorithm: dp (Douglas-Peucker; '
+                        'every point removed is within --simplify metres of '
+                        'the output) or vw (Visvalingam-Whyatt; removes '
+                        'points whose triangle with their neighbours has an '
+                        'area under --simplify squared) (default: dp)')
     p.add_argument('-i', '--imperial', dest='imperial', action='store_true',
                    default=False, help='output stats in imperial units')
-    p.add_argument('JSON_FILE', action='store', type=str,
-                   help='Input file to convert')
+    p.add_argument('JSON_FILE', action='store', type=str, nargs='+',
+                   help='Input file to convert. If more than one file, or '
+                        'a directory (meaning all *.json files in it), is '
+                        'given, they are converted in parallel, each to the '
+                        'default output path.')
     args = p.parse_args(argv)
     return args
 
@@ -37,34 +37,50 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import os
 import logging
-from importlib import import_module
 import time
-from threading import Thread
-from typing import Optional, Tuple
+from multiprocessing.process import BaseProcess
+from multiprocessing.connection import Connection
+from threading import Thread, Event, Lock
+from typing import Callable, List, Optional, Tuple, Dict
 from datetime import datetime, timezone
 from pizero_gpslog.displays.base import BaseDisplay
-from pizero_gpslog.utils import ThreadSafeValue, FixType
+from pizero_gpslog.displays.layouts import RenderCache
+from pizero_gpslog.utils import (
+    AtomicState, DisplayState, FixType, import_classes, init_child_logging,
+    process_context
+)
 
 logger = logging.getLogger(__name__)
 
 
 class DisplayWriterThread(Thread):
 
+    #: maximum seconds to wait for a state change before checking whether
+    #: the thread has been asked to stop
+    idle_timeout: float = 1.0
+
     def __init__(
-        self, driver_cls: BaseDisplay.__class__, fix_type: ThreadSafeValue,
-        lat: ThreadSafeValue, lon: ThreadSafeValue,
-        extradata: ThreadSafeValue, fix_precision: ThreadSafeValue,
-        should_clear: ThreadSafeValue, refresh_sec: int = 0
+        self, driver_cls: BaseDisplay.__class__, state: AtomicState,
+        refresh_sec: float = 0, render_cache: Optional[RenderCache] = None
     ):
-        super().__init__(name='DisplayWriter', daemon=True)
-        self._fix_type: ThreadSafeValue = fix_type
-        self._lat: ThreadSafeValue = lat
-        self._lon: ThreadSafeValue = lon
-        self._extradata: ThreadSafeValue = extradata
-        self._fix_precision: ThreadSafeValue = fix_precision
-        self._should_clear: ThreadSafeValue = should_clear
+        super().__init__(
+            name='DisplayWriter-%s' % driver_cls.__name__, daemon=True
+        )
+        self._state: AtomicState = state
+        self._render_cache: Optional[RenderCache] = render_cache
         self._driver_cls: BaseDisplay.__class__ = driver_cls
         self._refresh_sec = refresh_sec
+        self._stop_event: Event = Event()
+        #: version of the last state written to the display
+        self._version: int = -1
+        #: ``clear_count`` of the last state written to the display
+        self._clear_count: int = 0
+        #: number of frames written to the display
+        self.frames: int = 0
+        #: total wall-clock seconds spent in :py:meth:`~.iteration`
+        self.render_seconds: float = 0.0
+        #: total thread CPU seconds spent in :py:meth:`~.iteration`
+        self.cpu_seconds: float = 0.0
         logger.info(
             'Initialize DisplayWriterThread; driver_class=%s refresh_sec=%s',
             driver_cls, refresh_sec
@@ -73,6 +89,7 @@ class DisplayWriterThread(Thread):
     def run(self):
         logger.debug('Initialize display driver class')
         driver: BaseDisplay = self._driver_cls()
+        driver.render_cache = self._render_cache
         if (
             self._refresh_sec != 0 and
             driver.min_refresh_seconds > self._refresh_sec
@@ -83,66 +100,312 @@ class DisplayWriterThread(Thread):
                 driver.min_refresh_seconds
             )
             self._refresh_sec = driver.min_refresh_seconds
-        logger.info('Refresh display every %d seconds', self._refresh_sec)
-        while True:
-            start = time.time()
-            self.iteration(driver)
-            duration = time.time() - start
+        logger.info('Refresh display every %s seconds', self._refresh_sec)
+        while not self._stop_event.is_set():
+            # frames whose state version has not changed are skipped
+            state = self._state.wait_for_newer(
+                self._version, timeout=self.idle_timeout
+            )
+            if state.version == self._version:
+                continue
+            start = time.perf_counter()
+            start_cpu = time.thread_time()
+            self.iteration(driver, state)
+            self.cpu_seconds += time.thread_time() - start_cpu
+            duration = time.perf_counter() - start
+            self.render_seconds += duration
+            self.frames += 1
             if duration < self._refresh_sec:
                 t = self._refresh_sec - duration
                 logger.debug('Sleep %s sec before next refresh', t)
-                time.sleep(t)
+                self._stop_event.wait(t)
+
+    def stop(self):
+        """
+        Ask the thread to exit after the current iteration.
+        """
+        self._stop_event.set()
 
-    def iteration(self, driver: BaseDisplay):
+    def iteration(self, driver: BaseDisplay, state: DisplayState):
+        driver.state_version = state.version
         driver.update_display(
-            fix_type=self._fix_type.get(),
-            fix_precision=self._fix_precision.get(),
-            lat=self._lat.get(), lon=self._lon.get(),
-            extradata=self._extradata.get(),
+            fix_type=state.fix_type,
+            fix_precision=state.fix_precision,
+            lat=state.lat, lon=state.lon,
+            extradata=state.extradata,
             dt=datetime.now(timezone.utc),
-            should_clear=self._should_clear.get()
+            should_clear=state.clear_count != self._clear_count
+        )
+        self._version = state.version
+        self._clear_count = state.clear_count
+
+
+def _start_writers(
+    driver_classes: List[BaseDisplay.__class__], state: AtomicState,
+    refresh_sec: float, render_cache: RenderCache
+) -> List[DisplayWriterThread]:
+    threads = []
+    for driver_cls in driver_classes:
+        t = DisplayWriterThread(
+            driver_cls, state, refresh_sec=refresh_sec,
+            render_cache=render_cache
         )
-        self._should_clear.set(False)
+        t.start()
+        threads.append(t)
+    return threads
+
+
+def _writer_stats(
+    threads: List[DisplayWriterThread], render_cache: RenderCache
+) -> Dict[str, float]:
+    return {
+        'frames': sum(t.frames for t in threads),
+        'render_seconds': sum(t.render_seconds for t in threads),
+        'cpu_seconds': sum(t.cpu_seconds for t in threads),
+        'cache_hits': render_cache.hits,
+        'cache_misses': render_cache.misses
+    }
+
+
+def _display_process(
+    classes: List[Tuple[str, str]], refresh_sec: float, conn: Connection,
+    log_level: int, child_init: Optional[Callable[[], object]] = None
+):
+    """
+    Entry point of the child process used by :py:class:`~.DisplayManager`
+    when running isolated. Runs the display writer threads, mirroring every
+    :py:class:`~pizero_gpslog.utils.DisplayState` received on ``conn`` (the
+    first one before starting the writers) into a local
+    :py:class:`~pizero_gpslog.utils.AtomicState`, until it receives
+    None or the pipe is closed. Then stops the writers and sends their
+    statistics back on ``conn``. If given, ``child_init`` is called before
+    the driver classes are imported.
+    """
+    init_child_logging(log_level)
+    try:
+        state = AtomicState(conn.recv())
+    except EOFError:
+        return
+    try:
+        if child_init is not None:
+            child_init()
+        driver_classes = import_classes(classes)
+    except Exception:
+        logger.critical(
+            'Unable to import display driver classes', exc_info=True
+        )
+        return
+    render_cache = RenderCache()
+    threads = _start_writers(
+        driver_classes, state, refresh_sec, render_cache
+    )
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        state.set(msg)
+    for t in threads:
+        t.stop()
+    for t in threads:
+        t.join(30)
+    try:
+        conn.send(_writer_stats(threads, render_cache))
+    except OSError:
+        pass
 
 
 class DisplayManager:
+    """
+    Drive one or more displays. Each display driver class gets its own
+    :py:class:`~.DisplayWriterThread`, refreshing at its own rate, but all of
+    them read the same :py:class:`~pizero_gpslog.utils.DisplayState` and
+    share a :py:class:`~pizero_gpslog.displays.layouts.RenderCache`, so
+    displays with the same layout only render the state-dependent part of the
+    display once per state change.
+
+    If ``isolate`` is True (default: True if the ``DISPLAY_PROCESS``
+    environment variable is set to ``true``), the writer threads run in a
+    separate child process and every state change is sent to it over a pipe.
+    This keeps the drivers' CPU-bound rendering and bus I/O from holding the
+    GIL of the process that reads gpsd and writes the log. The child is
+    started with :py:func:`~pizero_gpslog.utils.process_context`, and the
+    driver classes are only imported there.
+
+    :param classes: list of (module name, class name) tuples of the display
+      driver classes to use; see :py:func:`~pizero_gpslog.utils.parse_class_list`
+    :param isolate: whether to run the displays in a child process
+    :param child_init: when isolated, a picklable callable to run in the
+      child process before the driver classes are imported (e.g.
+      :py:func:`pizero_gpslog.fakehw.install_fake_hardware`)
+    """
 
-    def __init__(self, modname: str, clsname: str):
-        self._fix_type: ThreadSafeValue = ThreadSafeValue(FixType.NO_GPS)
-        self._fix_precision: ThreadSafeValue = ThreadSafeValue((0.0, 0.0))
-        self._lat: ThreadSafeValue = ThreadSafeValue()
-        self._lon: ThreadSafeValue = ThreadSafeValue()
-        self._extradata: ThreadSafeValue = ThreadSafeValue()
-        self._should_clear: ThreadSafeValue = ThreadSafeValue(False)
-        self._writer_thread: Optional[DisplayWriterThread] = None
-        logger.debug('Import %s:%s', modname, clsname)
-        mod = import_module(modname)
-        self._driver_cls: BaseDisplay.__class__ = getattr(mod, clsname)
+    #: default seconds for :py:meth:`~.stop` to wait for each writer thread,
+    #: or for the child process, to exit
+    stop_timeout: float = 10.0
+
+    def __init__(
+        self, classes: List[Tuple[str, str]], isolate: Optional[bool] = None,
+        child_init: Optional[Callable[[], object]] = None
+    ):
+        if isolate is None:
+            isolate = os.environ.get('DISPLAY_PROCESS', 'false') == 'true'
+        self._isolate: bool = isolate
+        self._child_init: Optional[Callable[[], object]] = child_init
+        self._classes: List[Tuple[str, str]] = classes
+        self._state: AtomicState = AtomicState()
+        self._render_cache: RenderCache = RenderCache()
+        self._writer_threads: List[DisplayWriterThread] = []
+        self._process: Optional[BaseProcess] = None
+        self._conn: Optional[Connection] = None
+        self._process_stats: Optional[Dict[str, float]] = None
+        # serializes state changes with sending them to the child process
+        self._publish_lock: Lock = Lock()
+        self._driver_classes: List[BaseDisplay.__class__] = []
+        if not isolate:
+            self._driver_classes = import_classes(classes)
         self.clear()
 
-    def start(self):
-        refresh_sec = int(os.environ.get('DISPLAY_REFRESH_SEC', '0'))
-        self._writer_thread = DisplayWriterThread(
-            self._driver_cls, self._fix_type, self._lat, self._lon,
-            self._extradata, self._fix_precision, self._should_clear,
-            refresh_sec=refresh_sec
+    def start(self, refresh_sec: Optional[float] = None):
+        if refresh_sec is None:
+            refresh_sec = float(os.environ.get('DISPLAY_REFRESH_SEC', '0'))
+        if not self._isolate:
+            self._writer_threads = _start_writers(
+                self._driver_classes, self._state, refresh_sec,
+                self._render_cache
+            )
+            return
+        logger.info('Starting display child process')
+        ctx = process_context()
+        parent_conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_display_process, name='DisplayProcess', daemon=True,
+            args=(
+                self._classes, refresh_sec, child_conn,
+                logging.getLogger().getEffectiveLevel(), self._child_init
+            )
         )
-        self._writer_thread.start()
+        self._process.start()
+        child_conn.close()
+        with self._publish_lock:
+            self._conn = parent_conn
+            self._publish(self._state.get())
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the display writer threads (or child process) and wait up to
+        ``timeout`` seconds (default: :py:attr:`~.stop_timeout`) for each of
+        them to exit. A child process that hasn't exited by then is
+        terminated.
+        """
+        if timeout is None:
+            timeout = self.stop_timeout
+        for t in self._writer_threads:
+            t.stop()
+        for t in self._writer_threads:
+            t.join(timeout)
+        if self._process is None:
+            return
+        end = time.monotonic() + timeout
+        with self._publish_lock:
+            self._publish(None)
+            if self._conn is not None and self._conn.poll(timeout):
+                try:
+                    self._process_stats = self._conn.recv()
+                except (EOFError, OSError):
+                    pass
+            self._close_conn()
+        self._process.join(max(end - time.monotonic(), 0))
+        if self._process.is_alive():
+            logger.warning(
+                'Display process did not exit within %ss; terminating it',
+                timeout
+            )
+            self._process.terminate()
+            self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join(1)
+
+    def _publish(self, state: Optional[DisplayState]):
+        """
+        Send ``state`` to the display child process, if there is one. Must be
+        called with ``self._publish_lock`` held.
+        """
+        if self._conn is None:
+            return
+        try:
+            self._conn.send(state)
+        except OSError as ex:
+            # the child has exited; stop sending to it rather than failing
+            # on every state change
+            logger.error(
+                'Unable to send state to display process (exit code %s); '
+                'displays stopped: %s', self._process.exitcode, ex
+            )
+            self._close_conn()
+
+    def _close_conn(self):
+        """
+        Close the pipe to the display child process. Must be called with
+        ``self._publish_lock`` held.
+        """
+        if self._conn is None:
+            return
+        self._conn.close()
+        self._conn = None
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Return render statistics summed across all display writer threads:
+        number of frames, total wall-clock and CPU seconds spent rendering
+        them, and the number of frames rendered and served from the shared
+        render cache. When running isolated, statistics are only available
+        after :py:meth:`~.stop`.
+        """
+        if self._process_stats is not None:
+            return dict(self._process_stats)
+        return _writer_stats(self._writer_threads, self._render_cache)
+
+    @property
+    def state(self) -> DisplayState:
+        """
+        Return the current display state snapshot.
+        """
+        return self._state.get()
+
+    def update(self, **changes) -> DisplayState:
+        """
+        Atomically set any of the fields of
+        :py:class:`~pizero_gpslog.utils.DisplayState` (other than ``version``
+        and ``clear_count``), so that the display never shows a mix of old
+        and new values.
+        """
+        with self._publish_lock:
+            state = self._state.update(**changes)
+            self._publish(state)
+        return state
 
     def set_fix_type(self, gps_status: FixType):
-        self._fix_type.set(gps_status)
+        self.update(fix_type=gps_status)
 
     def set_fix_precision(self, precision: Tuple[float, float]):
-        self._fix_precision.set(precision)
+        self.update(fix_precision=precision)
 
     def set_lat(self, lat: float):
-        self._lat.set(lat)
+        self.update(lat=lat)
 
     def set_lon(self, lon: float):
-        self._lon.set(lon)
+        self.update(lon=lon)
 
     def set_extradata(self, s: str):
-        self._extradata.set(s)
+        self.update(extradata=s)
 
     def clear(self):
-        self._should_clear.set(True)
+        with self._publish_lock:
+            self._publish(self._state.modify(
+                lambda s: {'clear_count': s.clear_count + 1}
+            ))
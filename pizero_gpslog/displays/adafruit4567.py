@@ -52,8 +52,8 @@ import busio
 import digitalio
 import adafruit_ssd1305
 from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.displays.layouts import Adafruit4567Layout
 from pizero_gpslog.utils import FixType
-from PIL import Image, ImageDraw
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -81,19 +81,7 @@ class Adafruit4567(BaseDisplay):
             128, 32, self._i2c, reset=self._oled_reset
         )
         self.clear()
-        # Create blank image for drawing.
-        # Make sure to create image with mode '1' for 1-bit color.
-        self._width = self._disp.width
-        self._height = self._disp.height
-        self._image = Image.new("1", (self._width, self._height))
-        # Get drawing object to draw on image.
-        self._draw = ImageDraw.Draw(self._image)
-        # Draw a black filled box to clear the image.
-        self._draw.rectangle(
-            (0, 0, self._width, self._height), outline=0, fill=0
-        )
-        self._top = -2
-        self._font = BaseDisplay.font(8)
+        self._layout: Adafruit4567Layout = Adafruit4567Layout()
 
     def update_display(
         self, fix_type: FixType, lat: float, lon: float, extradata: str,
@@ -101,53 +89,13 @@ class Adafruit4567(BaseDisplay):
     ):
         if should_clear:
             self.clear()
-        dts = dt.strftime('%H:%M:%S Z')
-        if fix_type == FixType.NO_GPS:
-            return self._write_lines([
-                dts,
-                'No GPS yet',
-                '',
-                extradata
-            ])
-        if fix_type == FixType.NO_FIX:
-            return self._write_lines([
-                dts,
-                'No Fix yet',
-                '',
-                extradata
-            ])
-        ft = '??'
-        if fix_type == FixType.FIX_2D:
-            ft = '2D'
-        elif fix_type == FixType.FIX_3D:
-            ft = '3D'
-        if extradata is not None and extradata.strip() != '':
-            return self._write_lines([
-                dts + f' | {ft} fix',
-                f'Lat: {lat:.15}',
-                f'Lon: {lon:.15}',
-                extradata
-            ])
-        # else we don't have extradata, so we have an extra line...
-        return self._write_lines([
-            dts,
-            f'{ft} fix: {fix_precision[0]:.7},{fix_precision[1]:.7}',
-            f'Lat: {lat:.15}',
-            f'Lon: {lon:.15}'
-        ])
-
-    def _write_lines(self, lines):
+        self._write_image(self.render_frame(
+            self._layout, fix_type, lat, lon, extradata, fix_precision, dt
+        ))
+
+    def _write_image(self, image):
         logging.info('Begin update display')
-        self._draw.rectangle(
-            (0, 0, self._width, self._height), outline=0, fill=0
-        )
-        for idx, content in enumerate(lines):
-            coords = (0, self._top + (idx * 8))
-            self._draw.text(
-                coords, content, font=self._font, fill=255
-            )
-        # Display image.
-        self._disp.image(self._image)
+        self._disp.image(image)
         self._disp.show()
         logging.info('End update display')
 
@@ -37,9 +37,9 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 from abc import ABC, abstractmethod
 import logging
-from PIL import ImageFont
+from PIL import Image, ImageFont
 from pkg_resources import resource_filename
-from typing import ClassVar, Tuple
+from typing import ClassVar, Optional, Tuple
 from pizero_gpslog.utils import FixType
 from datetime import datetime
 
@@ -60,6 +60,16 @@ class BaseDisplay(ABC):
     #: the minimum number of seconds between refreshes of the display
     min_refresh_seconds: ClassVar[int] = 0
 
+    #: :py:class:`~pizero_gpslog.displays.layouts.RenderCache` shared with the
+    #: other displays driven by the same ``DisplayManager``, if any; set by
+    #: the display writer thread after the driver is initialized.
+    render_cache = None
+
+    #: version of the :py:class:`~pizero_gpslog.utils.DisplayState` being
+    #: written, if known; set by the display writer thread before each call
+    #: to :py:meth:`~.update_display`.
+    state_version: Optional[int] = None
+
     def __init__(self):
         """
         Initialize the display. This should do everything that's required to
@@ -73,6 +83,25 @@ class BaseDisplay(ABC):
         f = resource_filename('pizero_gpslog', 'DejaVuSansMono.ttf')
         return ImageFont.truetype(f, size_pts)
 
+    def render_frame(
+        self, layout, fix_type: FixType, lat: float, lon: float,
+        extradata: str, fix_precision: Tuple[float, float], dt: datetime
+    ) -> Image.Image:
+        """
+        Render a frame of ``layout`` (a
+        :py:class:`~pizero_gpslog.displays.layouts.BaseLayout`) for the given
+        values, using the shared :py:attr:`~.render_cache` if there is one
+        and :py:attr:`~.state_version` is known.
+        """
+        if self.render_cache is None or self.state_version is None:
+            return layout.render(layout.lines(
+                fix_type, lat, lon, extradata, fix_precision, dt
+            ))
+        return self.render_cache.frame(
+            layout, self.state_version, fix_type, lat, lon, extradata,
+            fix_precision, dt
+        )
+
     @abstractmethod
     def update_display(
         self, fix_type: FixType, lat: float, lon: float, extradata: str,
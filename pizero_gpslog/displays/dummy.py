@@ -37,6 +37,7 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.displays.layouts import EPD2in13bcLayout
 from pizero_gpslog.utils import FixType
 from typing import ClassVar, Tuple
 from datetime import datetime
@@ -60,6 +61,7 @@ class DummyDisplay(BaseDisplay):
     def __init__(self):
         super().__init__()
         self.sleep_time: int = int(os.environ.get('DUMMY_SLEEP_TIME', '2'))
+        self._layout: EPD2in13bcLayout = EPD2in13bcLayout()
         logger.debug(
             'Initialize DummyDisplay; sleep time (%d sec) set by '
             'DUMMY_SLEEP_TIME environment variable.'
@@ -71,22 +73,9 @@ class DummyDisplay(BaseDisplay):
     ):
         if should_clear:
             self.clear()
-        lines = [dt.strftime('%H:%M:%S UTC')]
-        if fix_type == FixType.NO_GPS:
-            lines.extend(['No GPS yet', '', ''])
-        elif fix_type == FixType.NO_FIX:
-            lines.extend(['No Fix yet', '', ''])
-        else:
-            ft = '??'
-            if fix_type == FixType.FIX_2D:
-                ft = '2D'
-            elif fix_type == FixType.FIX_3D:
-                ft = '3D'
-            lines.append(f'{ft} {fix_precision[0]:.8},{fix_precision[1]:.8}')
-            lines.append(f'Lat: {lat:.15}')
-            lines.append(f'Lon: {lon:.15}')
-        lines.append(extradata)
-        self._write_lines(lines)
+        self._write_lines(self._layout.lines(
+            fix_type, lat, lon, extradata, fix_precision, dt
+        ))
 
     def _write_lines(self, lines):
         fmt: str = 'DUMMYDISPLAY>|%-' + '%ds|' % self.width_chars
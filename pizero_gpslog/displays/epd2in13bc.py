@@ -78,10 +78,12 @@ import logging
 import spidev
 import RPi.GPIO
 from typing import Optional, ClassVar, Tuple
+from threading import Event
 from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.displays.layouts import EPD2in13bcLayout
 from pizero_gpslog.utils import FixType
 from datetime import datetime
-from PIL import Image, ImageDraw
+from PIL import Image
 
 
 logger = logging.getLogger(__name__)
@@ -98,17 +100,22 @@ class EPD2in13bc(BaseDisplay):
     #: the minimum number of seconds between refreshes of the display
     min_refresh_seconds: ClassVar[int] = 15
 
+    #: longest wait for a BUSY pin edge before checking the pin again
+    edge_check_sec: ClassVar[float] = 0.5
+
     def __init__(
         self, bus: int = 0, device: int = 0, rst_pin: int = 17,
         dc_pin: int = 25, cs_pin: int = 8, busy_pin: int = 24,
-        epd_width: int = 104, epd_height: int = 212
+        epd_width: int = 104, epd_height: int = 212,
+        busy_timeout_sec: float = 30.0, busy_poll_ms: int = 100
     ):
         super().__init__()
         logger.debug(
             'EPD.__init__(bus=%d, device=%d, rst_pin=%d, dc_pin=%d,'
-            'cs_pin=%d, busy_pin=%d, epd_width=%d, epd_height=%d)',
+            'cs_pin=%d, busy_pin=%d, epd_width=%d, epd_height=%d, '
+            'busy_timeout_sec=%s, busy_poll_ms=%d)',
             bus, device, rst_pin, dc_pin, cs_pin, busy_pin, epd_width,
-            epd_height
+            epd_height, busy_timeout_sec, busy_poll_ms
         )
         self._GPIO = RPi.GPIO
         self._SPI = spidev.SpiDev(bus, device)
@@ -116,8 +123,17 @@ class EPD2in13bc(BaseDisplay):
         self._dc_pin: int = dc_pin
         self._busy_pin: int = busy_pin
         self._cs_pin: int = cs_pin
+        self._busy_timeout_sec: float = busy_timeout_sec
+        self._busy_poll_ms: int = busy_poll_ms
+        # use GPIO edge detection to wait for BUSY, if the backend has it
+        self._edge_detect: bool = hasattr(self._GPIO, 'add_event_detect')
+        #: seconds the panel was busy during the most recent wait
+        self.last_busy_seconds: float = 0.0
+        #: total seconds the panel has been busy
+        self.total_busy_seconds: float = 0.0
         self._width: int = epd_width
         self._height: int = epd_height
+        self._layout: EPD2in13bcLayout = EPD2in13bcLayout()
         self._GPIO.setmode(self._GPIO.BCM)
         self._GPIO.setwarnings(False)
         self._GPIO.setup(self._reset_pin, self._GPIO.OUT)
@@ -173,10 +189,65 @@ class EPD2in13bc(BaseDisplay):
         return self._digital_read(self._busy_pin) == 0
 
     def _wait_for_not_busy(self):
-        logger.debug("Waiting until display is not busy (100ms check interval)")
-        while self._is_busy:
-            self._delay_ms(100)
-        logger.debug("display is no longer busy")
+        start = time.monotonic()
+        if self._is_busy and self._edge_detect:
+            logger.debug("Waiting for BUSY pin rising edge")
+            self._wait_for_busy_edge(start)
+        if self._is_busy:
+            logger.debug(
+                "Waiting until display is not busy (%dms check interval)",
+                self._busy_poll_ms
+            )
+            while (
+                self._is_busy and
+                time.monotonic() - start < self._busy_timeout_sec
+            ):
+                self._delay_ms(self._busy_poll_ms)
+        duration = time.monotonic() - start
+        self.last_busy_seconds = duration
+        self.total_busy_seconds += duration
+        if self._is_busy:
+            logger.warning(
+                "display still busy after %.3f seconds; continuing", duration
+            )
+            return
+        logger.debug("display is no longer busy after %.3f seconds", duration)
+
+    def _wait_for_busy_edge(self, start: float):
+        """
+        Wait for a rising edge of the (active-low) BUSY pin using GPIO edge
+        detection, until the panel is no longer busy or ``busy_timeout_sec``
+        has elapsed since ``start``. Edge detection is armed before the pin
+        is checked, so an edge between the check and the wait is not missed;
+        waits are also made in chunks of at most ``edge_check_sec``, after
+        each of which the pin is checked again. If the GPIO backend cannot
+        do edge detection, disable it and return so the caller polls instead.
+        """
+        edge = Event()
+        try:
+            self._GPIO.add_event_detect(
+                self._busy_pin, self._GPIO.RISING,
+                callback=lambda channel: edge.set()
+            )
+        except RuntimeError as ex:
+            logger.warning(
+                'GPIO edge detection unavailable on BUSY pin (%s); '
+                'falling back to polling', ex
+            )
+            self._edge_detect = False
+            return
+        try:
+            while True:
+                edge.clear()
+                if not self._is_busy:
+                    return
+                remaining = self._busy_timeout_sec - (time.monotonic() - start)
+                if remaining <= 0:
+                    return
+                if not edge.wait(min(remaining, self.edge_check_sec)):
+                    logger.debug('Timed out waiting for BUSY edge; re-check')
+        finally:
+            self._GPIO.remove_event_detect(self._busy_pin)
 
     def _initialize(self):
         logger.debug('Initialize EPD')
@@ -250,36 +321,16 @@ class EPD2in13bc(BaseDisplay):
     ):
         if should_clear:
             self.clear()
-        lines = [dt.strftime('%H:%M:%S UTC')]
-        if fix_type == FixType.NO_GPS:
-            lines.extend(['No GPS yet', '', ''])
-        elif fix_type == FixType.NO_FIX:
-            lines.extend(['No Fix yet', '', ''])
-        else:
-            ft = '??'
-            if fix_type == FixType.FIX_2D:
-                ft = '2D'
-            elif fix_type == FixType.FIX_3D:
-                ft = '3D'
-            lines.append(f'{ft} {fix_precision[0]:.8},{fix_precision[1]:.8}')
-            lines.append(f'Lat: {lat:.15}')
-            lines.append(f'Lon: {lon:.15}')
-        lines.append(extradata)
-        self._write_lines(lines)
-
-    def _write_lines(self, lines):
+        self._write_image(self.render_frame(
+            self._layout, fix_type, lat, lon, extradata, fix_precision, dt
+        ))
+
+    def _write_image(self, image):
         """
-        Write ``lines`` to the display.
+        Write the rendered ``image`` to the display.
         """
         logging.info('Begin update display')
-        font = self.font(16)
-        HBlackimage = Image.new('1', (self._height, self._width), 255)
-        drawblack = ImageDraw.Draw(HBlackimage)
-        for idx, content in enumerate(lines):
-            drawblack.text(
-                (0, 20 * idx), content, font=font, fill=0
-            )
-        self._display(black=HBlackimage)
+        self._display(black=image)
         logging.info('End update display')
 
     def clear(self):
@@ -0,0 +1,110 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import logging
+from typing import ClassVar, Optional, Tuple
+from datetime import datetime
+from PIL import Image
+from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.displays.layouts import LAYOUTS, BaseLayout
+from pizero_gpslog.utils import FixType
+
+logger = logging.getLogger(__name__)
+
+
+class HeadlessDisplay(BaseDisplay):
+    """
+    Display driver that renders the same PIL layout as a hardware display,
+    but into an in-memory image instead of a physical screen. This allows
+    measuring the real render cost of the display stack off-device.
+
+    The layout is selected by the ``HEADLESS_LAYOUT`` environment variable
+    (one of the keys of :py:data:`~.LAYOUTS`; default ``epd2in13bc``). If the
+    ``HEADLESS_OUTPUT_DIR`` environment variable is set, each frame is also
+    written to that directory as a numbered PNG file.
+    """
+
+    #: width of the display in characters
+    width_chars: ClassVar[int] = 21
+
+    #: height of the display in lines
+    height_lines: ClassVar[int] = 5
+
+    #: the minimum number of seconds between refreshes of the display
+    min_refresh_seconds: ClassVar[int] = 0
+
+    def __init__(self):
+        super().__init__()
+        layout_name: str = os.environ.get('HEADLESS_LAYOUT', 'epd2in13bc')
+        self._layout: BaseLayout = LAYOUTS[layout_name]()
+        self._output_dir: Optional[str] = os.environ.get(
+            'HEADLESS_OUTPUT_DIR', None
+        )
+        #: the most recently rendered frame
+        self.image: Image.Image = Image.new(
+            self._layout.mode, self._layout.size, self._layout.background
+        )
+        #: number of frames rendered so far
+        self.frame_count: int = 0
+        logger.debug(
+            'Initialize HeadlessDisplay; layout=%s output_dir=%s',
+            layout_name, self._output_dir
+        )
+
+    def update_display(
+        self, fix_type: FixType, lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float], dt: datetime, should_clear: bool
+    ):
+        if should_clear:
+            self.clear()
+        self.image = self.render_frame(
+            self._layout, fix_type, lat, lon, extradata, fix_precision, dt
+        )
+        self.frame_count += 1
+        if self._output_dir is not None:
+            self.image.save(os.path.join(
+                self._output_dir, 'frame-%06d.png' % self.frame_count
+            ))
+
+    def clear(self):
+        self.image = Image.new(
+            self._layout.mode, self._layout.size, self._layout.background
+        )
+
+    def __del__(self):
+        pass
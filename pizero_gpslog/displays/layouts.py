@@ -0,0 +1,285 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import ClassVar, Dict, List, Tuple
+from datetime import datetime
+from PIL import Image, ImageDraw
+from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.utils import FixType
+
+logger = logging.getLogger(__name__)
+
+
+class BaseLayout(ABC):
+    """
+    Base class for display layouts. A layout turns display values into a list
+    of text lines, and renders those lines into a PIL image. Layouts have no
+    hardware dependencies, so the same layout can be used by a hardware
+    driver and by :py:class:`~.HeadlessDisplay`.
+    """
+
+    #: size of the rendered image in pixels, as (width, height)
+    size: ClassVar[Tuple[int, int]] = (0, 0)
+
+    #: PIL image mode of the rendered image
+    mode: ClassVar[str] = '1'
+
+    #: fill value for the image background
+    background: ClassVar[int] = 0
+
+    #: fill value for text
+    foreground: ClassVar[int] = 255
+
+    #: font size in points
+    font_size: ClassVar[int] = 8
+
+    #: vertical offset of the first line, in pixels
+    top: ClassVar[int] = 0
+
+    #: height of each line, in pixels
+    line_height: ClassVar[int] = 8
+
+    def __init__(self):
+        self._font = BaseDisplay.font(self.font_size)
+
+    @staticmethod
+    def fix_type_str(fix_type: FixType) -> str:
+        if fix_type == FixType.FIX_2D:
+            return '2D'
+        if fix_type == FixType.FIX_3D:
+            return '3D'
+        return '??'
+
+    @abstractmethod
+    def clock_line(
+        self, fix_type: FixType, extradata: str, dt: datetime
+    ) -> str:
+        """
+        Return the first display line, which shows the current time and so
+        changes on every frame.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def body_lines(
+        self, fix_type: FixType, lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float]
+    ) -> List[str]:
+        """
+        Return the display lines after the first; these only depend on the
+        display state, not on the time.
+        """
+        raise NotImplementedError()
+
+    def lines(
+        self, fix_type: FixType, lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float], dt: datetime
+    ) -> List[str]:
+        """
+        Return the list of text lines to display for the given values.
+        """
+        return [self.clock_line(fix_type, extradata, dt)] + self.body_lines(
+            fix_type, lat, lon, extradata, fix_precision
+        )
+
+    def render(self, lines: List[str]) -> Image.Image:
+        """
+        Render ``lines`` into a new image of :py:attr:`~.size`.
+        """
+        image = Image.new(self.mode, self.size, self.background)
+        self._draw_lines(image, lines, 0)
+        return image
+
+    def render_body(self, body: List[str]) -> Image.Image:
+        """
+        Render :py:meth:`~.body_lines` into a new image, leaving the first
+        line blank for :py:meth:`~.draw_clock`.
+        """
+        image = Image.new(self.mode, self.size, self.background)
+        self._draw_lines(image, body, 1)
+        return image
+
+    def draw_clock(self, body: Image.Image, clock: str) -> Image.Image:
+        """
+        Return a copy of the ``body`` image from :py:meth:`~.render_body` with
+        the ``clock`` line drawn on it. ``body`` itself is not modified.
+        """
+        image = body.copy()
+        self._draw_lines(image, [clock], 0)
+        return image
+
+    def _draw_lines(self, image: Image.Image, lines: List[str], first: int):
+        draw = ImageDraw.Draw(image)
+        for idx, content in enumerate(lines, first):
+            draw.text(
+                (0, self.top + (idx * self.line_height)), content,
+                font=self._font, fill=self.foreground
+            )
+
+
+class EPD2in13bcLayout(BaseLayout):
+    """
+    Five-line layout used by the Waveshare 2.13 inch e-Paper display, drawn
+    horizontally in black on white.
+    """
+
+    size: ClassVar[Tuple[int, int]] = (212, 104)
+    background: ClassVar[int] = 255
+    foreground: ClassVar[int] = 0
+    font_size: ClassVar[int] = 16
+    line_height: ClassVar[int] = 20
+
+    def clock_line(
+        self, fix_type: FixType, extradata: str, dt: datetime
+    ) -> str:
+        return dt.strftime('%H:%M:%S UTC')
+
+    def body_lines(
+        self, fix_type: FixType, lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float]
+    ) -> List[str]:
+        if fix_type == FixType.NO_GPS:
+            lines = ['No GPS yet', '', '']
+        elif fix_type == FixType.NO_FIX:
+            lines = ['No Fix yet', '', '']
+        else:
+            lines = []
+            ft = self.fix_type_str(fix_type)
+            lines.append(f'{ft} {fix_precision[0]:.8},{fix_precision[1]:.8}')
+            lines.append(f'Lat: {lat:.15}')
+            lines.append(f'Lon: {lon:.15}')
+        lines.append(extradata)
+        return lines
+
+
+class Adafruit4567Layout(BaseLayout):
+    """
+    Four-line layout used by the Adafruit 4567 128x32 OLED display, drawn in
+    white on black.
+    """
+
+    size: ClassVar[Tuple[int, int]] = (128, 32)
+    top: ClassVar[int] = -2
+
+    @staticmethod
+    def _has_extradata(fix_type: FixType, extradata: str) -> bool:
+        # with a fix and extradata, the fix type moves up to the clock line
+        return (
+            fix_type not in (FixType.NO_GPS, FixType.NO_FIX) and
+            extradata is not None and extradata.strip() != ''
+        )
+
+    def clock_line(
+        self, fix_type: FixType, extradata: str, dt: datetime
+    ) -> str:
+        dts = dt.strftime('%H:%M:%S Z')
+        if self._has_extradata(fix_type, extradata):
+            return dts + f' | {self.fix_type_str(fix_type)} fix'
+        return dts
+
+    def body_lines(
+        self, fix_type: FixType, lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float]
+    ) -> List[str]:
+        if fix_type == FixType.NO_GPS:
+            return ['No GPS yet', '', extradata]
+        if fix_type == FixType.NO_FIX:
+            return ['No Fix yet', '', extradata]
+        if self._has_extradata(fix_type, extradata):
+            return [f'Lat: {lat:.15}', f'Lon: {lon:.15}', extradata]
+        # else we don't have extradata, so we have an extra line...
+        ft = self.fix_type_str(fix_type)
+        return [
+            f'{ft} fix: {fix_precision[0]:.7},{fix_precision[1]:.7}',
+            f'Lat: {lat:.15}',
+            f'Lon: {lon:.15}'
+        ]
+
+
+#: Layouts by short name, for selecting a layout from configuration.
+LAYOUTS = {
+    'epd2in13bc': EPD2in13bcLayout,
+    'adafruit4567': Adafruit4567Layout,
+}
+
+
+class RenderCache:
+    """
+    Shares rendering work between display writer threads, so that several
+    displays using the same layout only compose and render the state-dependent
+    part of the display once per state change. The body (every line but the
+    clock) of the most recent state version is kept for each layout class;
+    each frame then only draws its own clock line onto a copy of the body.
+    """
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._bodies: Dict[type, Tuple[int, Image.Image]] = {}
+        #: number of frames whose body was taken from the cache
+        self.hits: int = 0
+        #: number of frames whose body was rendered
+        self.misses: int = 0
+
+    def frame(
+        self, layout: BaseLayout, version: int, fix_type: FixType,
+        lat: float, lon: float, extradata: str,
+        fix_precision: Tuple[float, float], dt: datetime
+    ) -> Image.Image:
+        """
+        Return the image for a frame of ``layout`` showing state ``version``
+        (which must identify the other arguments, except ``dt``) at ``dt``.
+        """
+        with self._lock:
+            cached = self._bodies.get(type(layout))
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                body = cached[1]
+            else:
+                body = None
+        if body is None:
+            body = layout.render_body(layout.body_lines(
+                fix_type, lat, lon, extradata, fix_precision
+            ))
+            with self._lock:
+                self._bodies[type(layout)] = (version, body)
+                self.misses += 1
+        return layout.draw_clock(
+            body, layout.clock_line(fix_type, extradata, dt)
+        )
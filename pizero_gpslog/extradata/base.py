@@ -36,8 +36,12 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 from abc import ABC, abstractmethod
+from collections import deque
 import logging
-from threading import Thread
+import os
+from threading import Lock, Thread
+from time import time
+from typing import Deque, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -48,16 +52,99 @@ class BaseExtraDataProvider(ABC, Thread):
 
     ``self._data`` should be a dict with a ``message`` key that has a string
     value, and a ``data`` key that has an arbitrary JSON-encodable value.
+
+    Providers should set new data with :py:meth:`~._set_data`, which also
+    keeps the last ``EXTRA_DATA_BUFFER`` (default 64) samples in a
+    timestamped ring buffer, so that :py:meth:`~.sample_at` can find the
+    sample closest to the time of a GPS fix.
     """
 
+    #: key this provider's data is stored under when more than one provider
+    #: is in use; if None, the lower-cased class name
+    namespace: Optional[str] = None
+
     def __init__(self):
         self._data = {}
+        self._buffer_lock: Lock = Lock()
+        self._buffer: Deque[Tuple[float, dict]] = deque(
+            maxlen=int(os.environ.get('EXTRA_DATA_BUFFER', '64'))
+        )
         super().__init__(name='ExtraDataProvider', daemon=True)
 
     @property
     def data(self):
         return self._data
 
+    def _set_data(self, data: dict, sample_time: Optional[float] = None):
+        """
+        Set the current data and add it to the ring buffer.
+
+        :param data: the new data, in the same format as ``self._data``
+        :param sample_time: float timestamp when the data was sampled; if
+          None, ``data['data']['time']`` if present, otherwise now
+        """
+        if sample_time is None:
+            inner = data.get('data')
+            if isinstance(inner, dict) and 'time' in inner:
+                sample_time = inner['time']
+            else:
+                sample_time = time()
+        with self._buffer_lock:
+            self._buffer.append((sample_time, data))
+            self._data = data
+
+    def sample_at(
+        self, t: float, interpolate: bool = False
+    ) -> Tuple[dict, Optional[float]]:
+        """
+        Return the buffered sample nearest to timestamp ``t``, along with the
+        sample time minus ``t`` in seconds. If ``interpolate`` is True and
+        ``t`` is between two samples, return a sample with the numeric values
+        in ``data`` linearly interpolated between them (and other values from
+        the nearest one), with an offset of 0.
+
+        If the buffer is empty (e.g. for a provider that sets ``self._data``
+        directly) this returns the current data and an offset of None.
+        """
+        with self._buffer_lock:
+            samples = list(self._buffer)
+        if not samples:
+            return self._data, None
+        after = 0
+        while after < len(samples) and samples[after][0] < t:
+            after += 1
+        if after == 0 or after == len(samples):
+            st, data = samples[0] if after == 0 else samples[-1]
+            return data, st - t
+        (t0, d0), (t1, d1) = samples[after - 1], samples[after]
+        if not interpolate or t1 <= t0:
+            if t - t0 <= t1 - t:
+                return d0, t0 - t
+            return d1, t1 - t
+        return _interpolate(d0, d1, (t - t0) / (t1 - t0)), 0.0
+
     @abstractmethod
     def run(self):
         raise NotImplementedError()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _interpolate(d0: dict, d1: dict, frac: float) -> dict:
+    """
+    Return a copy of the nearer of ``d0`` and ``d1`` with each numeric value
+    in its ``data`` dict interpolated at ``frac`` (0 to 1) between them.
+    """
+    nearest = d0 if frac <= 0.5 else d1
+    inner0 = d0.get('data')
+    inner1 = d1.get('data')
+    if not isinstance(inner0, dict) or not isinstance(inner1, dict):
+        return nearest
+    result = dict(nearest['data'])
+    for k, v0 in inner0.items():
+        v1 = inner1.get(k)
+        if _is_number(v0) and _is_number(v1):
+            result[k] = v0 + (v1 - v0) * frac
+    return dict(nearest, data=result)
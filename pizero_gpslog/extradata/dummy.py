@@ -53,11 +53,11 @@ class DummyData(BaseExtraDataProvider):
         while True:
             dt = datetime.now()
             hms = dt.strftime('%H:%M:%W')
-            self._data = {
+            self._set_data({
                 'message': f'updated at {hms}',
                 'data': {
                     'hms': hms,
                     'time': time()
                 }
-            }
+            })
             sleep(2)
@@ -0,0 +1,265 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Download the history flash of a GQ GMC-500+ geiger counter and join it to a
+pizero-gpslog JSON file by timestamp.
+
+Note: for dependencies, downloading from the device requires pyserial, and
+automatic device discovery requires the dependencies of
+:py:mod:`pizero_gpslog.extradata.gq_gmc500plus`.
+"""
+
+import sys
+import argparse
+import json
+import logging
+from bisect import bisect_left
+from typing import List, Optional
+
+from pizero_gpslog.extradata.gmc_protocol import (
+    FLASH_SIZE, SPIR_MAX_LENGTH, HistorySample, open_serial, parse_history,
+    read_flash
+)
+from pizero_gpslog.utils import parse_gps_time, set_log_debug, set_log_info
+
+logger = logging.getLogger(__name__)
+
+
+def download(devname: Optional[str], baudrate: int = 115200,
+             size: int = FLASH_SIZE) -> bytes:
+    """Read the history flash from the GMC at ``devname``."""
+    if devname is None:
+        from pizero_gpslog.extradata.gq_gmc500plus import find_usb_device
+        devname = find_usb_device()
+        if devname is None:
+            raise RuntimeError(
+                'Could not find GMC-500+ device; specify it with --device'
+            )
+    logger.info('Reading up to %d bytes of history from %s', size, devname)
+    port = open_serial(devname, baudrate, timeout=5.0)
+    try:
+        return read_flash(port, size=size, chunk_size=SPIR_MAX_LENGTH)
+    finally:
+        port.close()
+
+
+class HistoryJoiner(object):
+    """Find the history sample nearest to a given time."""
+
+    def __init__(self, samples: List[HistorySample],
+                 max_offset: Optional[float] = None):
+        """
+        :param samples: time-sorted samples, as from
+          :py:func:`~.parse_history`
+        :param max_offset: maximum seconds between a fix and its sample; if
+          None, the sample's own interval
+        """
+        self._samples = samples
+        self._times = [x.time for x in samples]
+        self._max_offset = max_offset
+
+    def nearest(self, t: float) -> Optional[HistorySample]:
+        idx = bisect_left(self._times, t)
+        candidates = [
+            self._samples[i] for i in (idx - 1, idx)
+            if 0 <= i < len(self._samples)
+        ]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda x: abs(x.time - t))
+        max_offset = self._max_offset
+        if max_offset is None:
+            max_offset = best.interval
+        if abs(best.time - t) > max_offset:
+            return None
+        return best
+
+    @staticmethod
+    def _fix_time(j) -> Optional[float]:
+        """
+        Return the timestamp of decoded log line ``j`` if it has a 2D or 3D
+        fix, or None if it has no fix (or isn't a log line with a TPV).
+        """
+        try:
+            tpv = j['tpv'][0]
+        except (KeyError, IndexError, TypeError):
+            return None
+        if not isinstance(tpv, dict) or tpv.get('mode', 0) < 2:
+            return None
+        try:
+            return parse_gps_time(tpv['time'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def join_file(self, in_fpath: str, out_fpath: str) -> dict:
+        """
+        Copy the pizero-gpslog file at ``in_fpath`` to ``out_fpath``, adding
+        a ``_gmc_history`` key to each line with a fix that has a sample
+        close enough to it. Every other line, including blank lines and
+        lines that aren't valid JSON or UTF-8 (which are logged), is copied
+        byte for byte. Returns counts of lines, fixes and joined fixes.
+        """
+        counts = {'lines': 0, 'fixes': 0, 'joined': 0}
+        with open(in_fpath, 'rb') as fh, open(out_fpath, 'wb') as out:
+            for lineno, raw in enumerate(fh, start=1):
+                counts['lines'] += 1
+                line = raw.strip()
+                if len(line) == 0:
+                    out.write(raw)
+                    continue
+                try:
+                    j = json.loads(line.decode('utf-8'))
+                except ValueError as ex:
+                    logger.warning(
+                        'Unable to decode JSON on line %d; copying it '
+                        'unchanged. (ERROR: %s)', lineno, ex
+                    )
+                    out.write(raw)
+                    continue
+                t = self._fix_time(j)
+                if t is None:
+                    out.write(raw)
+                    continue
+                counts['fixes'] += 1
+                sample = self.nearest(t)
+                if sample is None:
+                    out.write(raw)
+                    continue
+                counts['joined'] += 1
+                j['_gmc_history'] = {
+                    'time': sample.time,
+                    'count': sample.count,
+                    'unit': sample.unit,
+                    'offset': sample.time - t
+                }
+                out.write(('%s\n' % json.dumps(j)).encode('utf-8'))
+        return counts
+
+
+def main(argv=sys.argv[1:]):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING, format='[%(asctime)s %(levelname)s] %(message)s'
+    )
+    if args.verbose > 1:
+        set_log_debug(logging.getLogger())
+    elif args.verbose == 1:
+        set_log_info(logging.getLogger())
+    if args.from_dump is not None:
+        with open(args.from_dump, 'rb') as fh:
+            buf = fh.read()
+    else:
+        buf = download(args.device, args.baudrate, args.size)
+    if args.dump is not None:
+        with open(args.dump, 'wb') as fh:
+            fh.write(buf)
+        sys.stderr.write(
+            'Wrote %d bytes of raw history to: %s\n' % (len(buf), args.dump)
+        )
+    samples = parse_history(buf, utc_offset=args.utc_offset)
+    if not samples:
+        sys.stderr.write('No history samples found.\n')
+        return
+    sys.stderr.write(
+        '%d history samples from %d to %d\n' % (
+            len(samples), samples[0].time, samples[-1].time
+        )
+    )
+    if args.JSON_FILE is None:
+        return
+    if args.output is None:
+        args.output = args.JSON_FILE.rsplit('.', 1)[0] + '.gmc.json'
+    counts = HistoryJoiner(samples, args.max_offset).join_file(
+        args.JSON_FILE, args.output
+    )
+    sys.stderr.write(
+        'Joined history to %d of %d fixes (%d lines); written to: %s\n' % (
+            counts['joined'], counts['fixes'], counts['lines'], args.output
+        )
+    )
+
+
+def parse_args(argv):
+    """parse arguments/options"""
+    p = argparse.ArgumentParser(
+        description='Download the history of a GQ GMC-500+ geiger counter '
+                    'and join it to a pizero-gpslog output file by '
+                    'timestamp. Stop pizero-gpslog first if it is using the '
+                    'same counter.'
+    )
+    p.add_argument('-D', '--device', dest='device', action='store', type=str,
+                   default=None,
+                   help='GMC tty device (default: find it with pyudev)')
+    p.add_argument('-b', '--baudrate', dest='baudrate', action='store',
+                   type=int, default=115200,
+                   help='serial baud rate (default: 115200)')
+    p.add_argument('-s', '--size', dest='size', action='store', type=int,
+                   default=FLASH_SIZE,
+                   help='maximum bytes of flash to read (default: %d)' %
+                        FLASH_SIZE)
+    p.add_argument('--dump', dest='dump', action='store', type=str,
+                   default=None,
+                   help='also write the raw history data to this file')
+    p.add_argument('--from-dump', dest='from_dump', action='store', type=str,
+                   default=None,
+                   help='read raw history data from this file (written by '
+                        '--dump) instead of from the device')
+    p.add_argument('-u', '--utc-offset', dest='utc_offset', action='store',
+                   type=float, default=0.0,
+                   help='hours the counter\'s clock is ahead of UTC '
+                        '(default: 0)')
+    p.add_argument('-m', '--max-offset', dest='max_offset', action='store',
+                   type=float, default=None,
+                   help='maximum seconds between a fix and its history '
+                        'sample (default: the sample interval)')
+    p.add_argument('-o', '--output', dest='output', action='store', type=str,
+                   default=None,
+                   help='Output file path. By default, the input file path '
+                        'with the extension replaced by ".gmc.json"')
+    p.add_argument('-v', '--verbose', dest='verbose', action='count',
+                   default=0,
+                   help='verbose output. specify twice for debug-level '
+                        'output.')
+    p.add_argument('JSON_FILE', action='store', type=str, nargs='?',
+                   default=None,
+                   help='pizero-gpslog file to join the history to; if '
+                        'omitted, only download (and --dump) the history')
+    args = p.parse_args(argv)
+    return args
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
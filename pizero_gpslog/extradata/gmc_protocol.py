@@ -0,0 +1,290 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Low-level GQ Electronics GMC serial protocol (GQ-RFC1801) helpers that
+don't depend on the ``gmc`` package, used for batched acquisition and for
+downloading and parsing the history flash.
+"""
+
+import logging
+import struct
+from calendar import timegm
+from datetime import datetime
+from time import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+#: Mask for the count bits of a CPS reading; the top two bits are reserved.
+CPS_MASK = 0x3FFFFFFF
+
+#: (data key, command, mask) for each value read in one batched acquisition.
+#: On the GMC-500/600 series every one of these returns a 4-byte big-endian
+#: unsigned integer.
+BATCH_QUERIES: List[Tuple[str, bytes, int]] = [
+    ('cps', b'<GETCPS>>', CPS_MASK),
+    ('cpsl', b'<GETCPSL>>', CPS_MASK),
+    ('cpsh', b'<GETCPSH>>', CPS_MASK),
+    ('cpm', b'<GETCPM>>', 0xFFFFFFFF),
+    ('cpml', b'<GETCPML>>', 0xFFFFFFFF),
+    ('cpmh', b'<GETCPMH>>', 0xFFFFFFFF),
+    ('maxcps', b'<GETMAXCPS>>', CPS_MASK),
+]
+
+#: Size in bytes of each response to the commands in :py:data:`BATCH_QUERIES`
+RESPONSE_SIZE = 4
+
+
+def batch_command(queries=BATCH_QUERIES) -> bytes:
+    """Return the concatenation of all commands in ``queries``."""
+    return b''.join(q[1] for q in queries)
+
+
+def parse_batch_response(buf: bytes, queries=BATCH_QUERIES) -> Dict[str, int]:
+    """
+    Parse the concatenated responses to :py:func:`batch_command`.
+
+    :raises ValueError: if ``buf`` is not exactly the expected length
+    """
+    expected = RESPONSE_SIZE * len(queries)
+    if len(buf) != expected:
+        raise ValueError(
+            f'Expected {expected} bytes of GMC response; got {len(buf)}'
+        )
+    values = struct.unpack(f'>{len(queries)}I', buf)
+    return {
+        key: value & mask for (key, _, mask), value in zip(queries, values)
+    }
+
+
+class BatchedGMC:
+    """
+    Query a GMC device over an already-open serial port, writing all
+    commands back-to-back and reading all of the responses in one go, so
+    that a reading costs a single serial round trip instead of one per value.
+
+    ``port`` may be any object with pyserial's ``write()``, ``read()``,
+    ``flush()`` and ``reset_input_buffer()`` methods.
+    """
+
+    def __init__(self, port, queries=BATCH_QUERIES):
+        self._port = port
+        self._queries = queries
+        self._command = batch_command(queries)
+        self._size = RESPONSE_SIZE * len(queries)
+
+    def read(self) -> Tuple[Dict[str, int], float, float]:
+        """
+        Perform one batched acquisition.
+
+        Returns a 3-tuple of the parsed values, the acquisition timestamp
+        (the midpoint of the round trip) and the round-trip latency in
+        seconds.
+
+        :raises ValueError: on a short or over-long response
+        """
+        self._port.reset_input_buffer()
+        start = time()
+        self._port.write(self._command)
+        self._port.flush()
+        buf = self._port.read(self._size)
+        end = time()
+        values = parse_batch_response(buf, self._queries)
+        latency = end - start
+        return values, start + (latency / 2.0), latency
+
+
+def open_serial(devname: str, baudrate: int = 115200,
+                timeout: Optional[float] = 2.0):
+    """Open ``devname`` with pyserial, with the GMC's 8N1 framing."""
+    import serial
+    return serial.Serial(
+        devname, baudrate=baudrate, bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE,
+        timeout=timeout
+    )
+
+
+#: Size of the GMC-500/600 series history flash, in bytes
+FLASH_SIZE = 0x100000
+
+#: Largest length accepted by one ``SPIR`` command
+SPIR_MAX_LENGTH = 4096
+
+#: Marker that starts every non-count record in the history data
+HISTORY_MARKER = b'\x55\xaa'
+
+#: Save mode byte of a history timestamp record -> (unit, seconds per sample);
+#: a unit of None means history saving was turned off.
+HISTORY_MODES: Dict[int, Tuple[Optional[str], int]] = {
+    0: (None, 0),
+    1: ('CPS', 1),
+    2: ('CPM', 60),
+    3: ('CPM', 3600),
+    4: ('CPS', 1),
+    5: ('CPM', 60),
+}
+
+
+class HistorySample(NamedTuple):
+    """One reading from the history flash."""
+
+    #: sample time, as an integer UTC timestamp
+    time: int
+
+    #: count for the sample
+    count: int
+
+    #: unit of ``count``; "CPS" or "CPM"
+    unit: str
+
+    #: seconds between samples at the time this one was saved
+    interval: int
+
+
+def spir_command(address: int, length: int) -> bytes:
+    """Return the ``SPIR`` command to read ``length`` bytes of flash."""
+    if not 0 < length <= SPIR_MAX_LENGTH:
+        raise ValueError(f'Invalid SPIR length: {length}')
+    return b'<SPIR' + address.to_bytes(3, 'big') + \
+        length.to_bytes(2, 'big') + b'>>'
+
+
+def read_flash(port, size: int = FLASH_SIZE,
+               chunk_size: int = SPIR_MAX_LENGTH,
+               stop_at_blank: bool = True) -> bytes:
+    """
+    Read the history flash of a GMC over the already-open serial ``port``,
+    in ``chunk_size`` reads. Unless ``stop_at_blank`` is False, stop at the
+    first chunk that is entirely unwritten (0xFF).
+
+    :raises IOError: on a short read
+    """
+    buf = bytearray()
+    port.reset_input_buffer()
+    for address in range(0, size, chunk_size):
+        length = min(chunk_size, size - address)
+        port.write(spir_command(address, length))
+        port.flush()
+        chunk = port.read(length)
+        if len(chunk) != length:
+            raise IOError(
+                f'Short read of GMC flash at 0x{address:06x}: got '
+                f'{len(chunk)} of {length} bytes'
+            )
+        if stop_at_blank and chunk.count(0xFF) == length:
+            logger.debug('Flash is blank from 0x%06x', address)
+            break
+        buf += chunk
+        logger.debug('Read %d bytes of GMC flash', len(buf))
+    return bytes(buf)
+
+
+def parse_history(buf: bytes, utc_offset: float = 0.0) -> List[HistorySample]:
+    """
+    Parse raw history flash data into a time-sorted list of samples.
+
+    The device stores its history as a stream of one-byte counts, broken up
+    by ``55 AA``-prefixed records: ``55 AA 00 YY MM DD HH MM SS 55 AA <mode>``
+    sets the time and save mode of the following counts; ``55 AA 01 <hi>
+    <lo>``, ``55 AA 03 <3 bytes>`` and ``55 AA 04 <4 bytes>`` hold a single
+    multi-byte count; ``55 AA 02 <len> <text>`` is a note. Counts before the
+    first timestamp record, and unwritten (0xFF) flash at the end, are
+    ignored.
+
+    :param buf: raw flash contents
+    :param utc_offset: hours the device clock is ahead of UTC
+    """
+    samples: List[HistorySample] = []
+    buf = buf.rstrip(b'\xff')
+    offset = int(round(utc_offset * 3600))
+    t: Optional[int] = None
+    unit: Optional[str] = None
+    interval = 0
+    skipped = 0
+    i = 0
+    end = len(buf)
+
+    def add(count):
+        nonlocal t, skipped
+        if t is None or unit is None:
+            skipped += 1
+            return
+        samples.append(HistorySample(t, count, unit, interval))
+        t += interval
+
+    while i < end:
+        if buf[i:i + 2] != HISTORY_MARKER or i + 2 >= end:
+            add(buf[i])
+            i += 1
+            continue
+        kind = buf[i + 2]
+        if kind == 0x00 and i + 12 <= end:
+            yy, mo, dd, hh, mi, ss = buf[i + 3:i + 9]
+            mode = buf[i + 11]
+            try:
+                dt = datetime(2000 + yy, mo, dd, hh, mi, ss)
+                t = timegm(dt.timetuple()) - offset
+            except ValueError:
+                logger.warning(
+                    'Invalid history timestamp at offset %d: %s', i,
+                    buf[i:i + 12].hex()
+                )
+                t = None
+            unit, interval = HISTORY_MODES.get(mode, (None, 0))
+            i += 12
+        elif kind == 0x01 and i + 5 <= end:
+            add(int.from_bytes(buf[i + 3:i + 5], 'big'))
+            i += 5
+        elif kind in (0x03, 0x04) and i + 3 + kind <= end:
+            add(int.from_bytes(buf[i + 3:i + 3 + kind], 'big'))
+            i += 3 + kind
+        elif kind == 0x02 and i + 4 <= end:
+            length = buf[i + 3]
+            logger.debug(
+                'History note: %s',
+                buf[i + 4:i + 4 + length].decode('ascii', errors='replace')
+            )
+            i += 4 + length
+        else:
+            add(buf[i])
+            i += 1
+    if skipped:
+        logger.warning(
+            'Skipped %d history counts with no preceding timestamp', skipped
+        )
+    samples.sort(key=lambda x: x.time)
+    return samples
@@ -38,15 +38,18 @@ Note: for dependencies, this requires:
 
 pyudev==0.22.0
 
+and, for batched acquisition (``GMC_BATCH=true``), pyserial (which the
+``gmc`` package also depends on).
 """
 
 import logging
 import os
-from glob import iglob
-from pyudev import Context, Devices
 from time import sleep, time
+from typing import Optional
 from gmc import GMC
 from pizero_gpslog.extradata.base import BaseExtraDataProvider
+from pizero_gpslog.extradata.gmc_protocol import BatchedGMC, open_serial
+from pizero_gpslog.extradata.udev import get_watcher
 if not hasattr(GMC, 'get_config'):
     raise RuntimeError(
         'ERROR: gmc must be installed from jantman\'s fork on the '
@@ -67,7 +70,13 @@ class GqGMC500plus(BaseExtraDataProvider):
         super().__init__()
         self._original_devname = devname
         self._gmc = None
+        self._serial = None
+        self._batched = None
         self._data = self._default_response()
+        self._batch = os.environ.get('GMC_BATCH', 'false') == 'true'
+        self._baudrate = int(os.environ.get('GMC_BAUD', '115200'))
+        self._retry_sec = float(os.environ.get('GMC_RETRY_SEC', '10'))
+        self._watcher = get_watcher()
         self._sleep_time = int(os.environ.get('GMC_SLEEP_SEC', '5'))
         logger.info(
             'Sleeping %d seconds between GMC polls; override by setting '
@@ -87,7 +96,8 @@ class GqGMC500plus(BaseExtraDataProvider):
                 'cpml': None,
                 'cpmh': None,
                 'maxcps': None,
-                'calibration': None
+                'calibration': None,
+                'latency': None
             }
         }
 
@@ -122,46 +132,89 @@ class GqGMC500plus(BaseExtraDataProvider):
         self._calibration = {
             x: self._config[x] for x in calib_fields
         }
+        if self._batch:
+            logger.debug(
+                'Switching to batched queries on %s at %d baud',
+                self._devname, self._baudrate
+            )
+            self._gmc.close_device()
+            self._serial = open_serial(self._devname, self._baudrate)
+            self._batched = BatchedGMC(self._serial)
+
+    def _close_serial(self):
+        if self._serial is None:
+            return
+        try:
+            self._serial.close()
+        except Exception:
+            logger.debug('Error closing serial port', exc_info=True)
+        self._serial = None
+        self._batched = None
 
     def _init_gmc(self):
+        """
+        Connect to the GMC. If that fails, wait for the counter to be plugged
+        in (see :py:meth:`~._wait_for_device`) and try again immediately when
+        it is, until it connects or the wait times out.
+        """
+        self._close_serial()
         self._gmc = None
         self._data = self._default_response()
-        try:
-            self._try_init()
-            return
-        except Exception as ex:
-            logger.critical(
-                'Error initializing GMC; try again in 10s', ex
+        while True:
+            since = self._watcher.generation
+            try:
+                self._try_init()
+                if self._gmc is not None:
+                    return
+            except Exception as ex:
+                logger.critical('Error initializing GMC: %s', ex)
+                logger.debug('GMC init error: %s', ex, exc_info=True)
+                self._close_serial()
+                self._gmc = None
+            if self._wait_for_device(since) is None:
+                return
+
+    def _wait_for_device(self, since: int) -> Optional[str]:
+        """
+        Wait up to ``GMC_RETRY_SEC`` seconds for a GMC to be plugged in
+        (after udev event generation ``since``). Returns its device node, or
+        None on timeout.
+        """
+        logger.info(
+            'Waiting up to %ss for GMC device to be connected',
+            self._retry_sec
+        )
+        if self._original_devname is None:
+            devname = self._watcher.wait_for_add(
+                matches=self._gmc_vendor_model_revision,
+                timeout=self._retry_sec, since=since
             )
-            logger.debug('GMC init error: %s', ex, exc_info=True)
-            sleep(10)
+        else:
+            devname = self._watcher.wait_for_add(
+                devname=self._original_devname, timeout=self._retry_sec,
+                since=since
+            )
+        if devname is not None:
+            logger.info('GMC device connected at %s', devname)
+        return devname
 
     def run(self):
         logger.debug('Running extra data provider...')
         while True:
             try:
-                cps = self._gmc.cps(numeric=True)
-                cpsl = self._gmc.cpsl(numeric=True)
-                cpsh = self._gmc.cpsh(numeric=True)
-                cpm = self._gmc.cpm(numeric=True)
-                cpml = self._gmc.cpml(numeric=True)
-                cpmh = self._gmc.cpmh(numeric=True)
-                maxcps = self._gmc.max_cps(numeric=True)
-                logger.debug('End querying GMC')
-                self._data = {
-                    'message': f'{cps} CPS | {cpm} CPM',
-                    'data': {
-                        'time': time(),
-                        'cps': cps,
-                        'cpsl': cpsl,
-                        'cpsh': cpsh,
-                        'cpm': cpm,
-                        'cpml': cpml,
-                        'cpmh': cpmh,
-                        'maxcps': maxcps,
-                        'calibration': self._calibration
-                    }
-                }
+                if self._batched is not None:
+                    values, t, latency = self._batched.read()
+                else:
+                    values, t, latency = self._query_individually()
+                logger.debug('End querying GMC (%.3fs)', latency)
+                data = {'time': t}
+                data.update(values)
+                data['calibration'] = self._calibration
+                data['latency'] = latency
+                self._set_data({
+                    'message': f'{values["cps"]} CPS | {values["cpm"]} CPM',
+                    'data': data
+                }, t)
             except Exception as ex:
                 logger.error(
                     'Error querying GMC; re-init. Error: %s', ex, exc_info=True
@@ -170,23 +223,45 @@ class GqGMC500plus(BaseExtraDataProvider):
                 self._init_gmc()
             sleep(self._sleep_time)
 
+    def _query_individually(self):
+        """
+        Query each value with a separate round trip through the ``gmc``
+        package. Returns the same 3-tuple as :py:meth:`BatchedGMC.read`,
+        with the timestamp taken from when the first query was sent.
+        """
+        start = time()
+        values = {
+            'cps': self._gmc.cps(numeric=True),
+            'cpsl': self._gmc.cpsl(numeric=True),
+            'cpsh': self._gmc.cpsh(numeric=True),
+            'cpm': self._gmc.cpm(numeric=True),
+            'cpml': self._gmc.cpml(numeric=True),
+            'cpmh': self._gmc.cpmh(numeric=True),
+            'maxcps': self._gmc.max_cps(numeric=True)
+        }
+        return values, start, time() - start
+
     def _find_usb_device(self):
-        logger.debug('Using pyudev to find GMC tty device')
-        context = Context()
-        for devname in iglob('/dev/ttyUSB*'):
-            device = Devices.from_device_file(context, devname)
-            if device.properties['ID_BUS'] != 'usb':
-                continue
-            k = (
-                device.properties['ID_VENDOR_ID'],
-                device.properties['ID_MODEL_ID'],
-                device.properties['ID_REVISION']
-            )
-            if k in self._gmc_vendor_model_revision:
-                logger.debug('Found GMC-500+ at: %s', devname)
-                return devname
-        return None
+        return find_usb_device(self._gmc_vendor_model_revision)
 
     def __del__(self):
         logger.info('Closing GMC device')
-        self._gmc.close_device()
+        self._close_serial()
+        if self._gmc is not None and not self._batch:
+            self._gmc.close_device()
+
+
+def find_usb_device(vendor_model_revisions=None):
+    """
+    Find the tty device of a GMC-500+ in the udev device cache (see
+    :py:func:`pizero_gpslog.extradata.udev.get_watcher`), or return None.
+
+    :param vendor_model_revisions: list of (vendor ID, model ID, revision)
+      tuples to match; defaults to those of the GMC-500+.
+    """
+    if vendor_model_revisions is None:
+        vendor_model_revisions = GqGMC500plus._gmc_vendor_model_revision
+    devname = get_watcher().find(vendor_model_revisions)
+    if devname is not None:
+        logger.debug('Found GMC-500+ at: %s', devname)
+    return devname
@@ -0,0 +1,394 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Generic provider for line-oriented serial sensors.
+"""
+
+import os
+import re
+import json
+import logging
+import selectors
+import termios
+from importlib import import_module
+from time import monotonic, time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pizero_gpslog.extradata.base import BaseExtraDataProvider
+
+logger = logging.getLogger(__name__)
+
+#: A line parser takes one decoded line (without the line ending) and returns
+#: a dict of values, or None to ignore the line.
+LineParser = Callable[[str], Optional[dict]]
+
+
+def _number(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_raw(line: str) -> Optional[dict]:
+    """The whole line, as a string."""
+    return {'line': line}
+
+
+def parse_number(line: str) -> Optional[dict]:
+    """A single number per line."""
+    value = _number(line.strip())
+    if isinstance(value, str):
+        return None
+    return {'value': value}
+
+
+def parse_csv(line: str) -> Optional[dict]:
+    """Comma-separated values, as a list."""
+    return {'values': [_number(x.strip()) for x in line.split(',')]}
+
+
+def parse_keyvalue(line: str) -> Optional[dict]:
+    """
+    Whitespace- or comma-separated ``key=value`` or ``key:value`` pairs, e.g.
+    ``T=21.5 RH=40 P=1013.2``.
+    """
+    result = {}
+    for item in line.replace(',', ' ').split():
+        for sep in '=:':
+            if sep in item:
+                k, v = item.split(sep, 1)
+                result[k] = _number(v)
+                break
+    return result or None
+
+
+def parse_json(line: str) -> Optional[dict]:
+    """One JSON object per line."""
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(value, dict):
+        return {'value': value}
+    return value
+
+
+#: Line parsers by name; add to this with :py:func:`~.register_parser`
+PARSERS: Dict[str, LineParser] = {
+    'raw': parse_raw,
+    'number': parse_number,
+    'csv': parse_csv,
+    'keyvalue': parse_keyvalue,
+    'json': parse_json,
+}
+
+
+def register_parser(name: str, func: LineParser):
+    """Register a line parser for use by name in ``SERIAL_SENSORS``."""
+    PARSERS[name] = func
+
+
+def get_parser(name: str) -> LineParser:
+    """
+    Return the registered parser called ``name``, or import it if ``name``
+    is a ``module:function`` string.
+    """
+    if name in PARSERS:
+        return PARSERS[name]
+    if ':' not in name:
+        raise ValueError(f'Unknown serial line parser: {name}')
+    modname, funcname = name.split(':', 1)
+    return getattr(import_module(modname), funcname)
+
+
+class PortConfig(NamedTuple):
+    """Configuration of one serial sensor."""
+
+    #: name the sensor's data is stored under
+    name: str
+
+    #: tty device path
+    path: str
+
+    #: baud rate
+    baudrate: int = 9600
+
+    #: name of the line parser; see :py:func:`~.get_parser`
+    parser: str = 'raw'
+
+
+_PARSER_NAME_RE = re.compile(r'^\w+$')
+_PARSER_FUNC_RE = re.compile(r'^[A-Za-z_][\w.]*:[A-Za-z_]\w*$')
+
+
+def _split_port_options(rest: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Split ``path[:baudrate[:parser]]`` into its path, baud rate and parser.
+    Device paths may contain colons (e.g. ``/dev/serial/by-path/`` names),
+    and parsers may be ``module:function``, so the optional fields are split
+    off the right: a numeric field followed by nothing, a parser name, or a
+    ``module:function`` is the baud rate, and everything before it is the
+    path.
+    """
+    parts = rest.split(':')
+    for nparser in (2, 1, 0):
+        idx = len(parts) - nparser - 1
+        if idx < 1 or not parts[idx].isdigit():
+            continue
+        parser = ':'.join(parts[idx + 1:])
+        if nparser == 2 and not _PARSER_FUNC_RE.match(parser):
+            continue
+        if nparser == 1 and not _PARSER_NAME_RE.match(parser):
+            continue
+        return ':'.join(parts[:idx]), parts[idx], parser or None
+    return rest, None, None
+
+
+def parse_port_list(value: str) -> List[PortConfig]:
+    """
+    Parse a comma-separated list of ``name:path[:baudrate[:parser]]``
+    strings, as used in the ``SERIAL_SENSORS`` environment variable. The
+    path may contain colons; see :py:func:`~._split_port_options`. Raises
+    ValueError for an item without a path, or with an unsupported baud rate.
+    """
+    result = []
+    for item in value.split(','):
+        item = item.strip()
+        if item == '':
+            continue
+        name, _, rest = item.partition(':')
+        if not name or not rest:
+            raise ValueError(f'Invalid serial sensor: {item}')
+        path, baudrate, parser = _split_port_options(rest)
+        if baudrate is not None and not hasattr(termios, f'B{baudrate}'):
+            raise ValueError(
+                f'Unsupported baud rate for serial sensor {name}: {baudrate}'
+            )
+        result.append(PortConfig(
+            name, path, 9600 if baudrate is None else int(baudrate),
+            parser or 'raw'
+        ))
+    return result
+
+
+def open_port(path: str, baudrate: int) -> int:
+    """
+    Open the tty at ``path`` non-blocking, in raw 8N1 mode at ``baudrate``,
+    and return its file descriptor.
+    """
+    speed = getattr(termios, f'B{baudrate}', None)
+    if speed is None:
+        raise ValueError(f'Unsupported baud rate: {baudrate}')
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        iflag, oflag, cflag, lflag, _, _, cc = termios.tcgetattr(fd)
+        iflag &= ~(
+            termios.IGNBRK | termios.BRKINT | termios.PARMRK |
+            termios.ISTRIP | termios.INLCR | termios.IGNCR | termios.ICRNL |
+            termios.IXON
+        )
+        oflag &= ~termios.OPOST
+        lflag &= ~(
+            termios.ECHO | termios.ECHONL | termios.ICANON | termios.ISIG |
+            termios.IEXTEN
+        )
+        cflag &= ~(termios.CSIZE | termios.PARENB | termios.CSTOPB)
+        cflag |= termios.CS8 | termios.CREAD | termios.CLOCAL
+        termios.tcsetattr(
+            fd, termios.TCSANOW,
+            [iflag, oflag, cflag, lflag, speed, speed, cc]
+        )
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+class _Port:
+    """State of one open (or closed, awaiting reopen) serial port."""
+
+    def __init__(self, config: PortConfig):
+        self.config: PortConfig = config
+        self.parser: LineParser = get_parser(config.parser)
+        self.fd: Optional[int] = None
+        self.buffer: bytearray = bytearray()
+        self.retry_at: float = 0.0
+        self.lines: int = 0
+        self.errors: int = 0
+        self.error_logged_at: Optional[float] = None
+
+
+class SerialLineSensors(BaseExtraDataProvider):
+    """
+    Read any number of line-oriented serial sensors from a single thread,
+    multiplexing the ports with :py:mod:`selectors`. Each port has its own
+    read buffer and line parser; every complete line updates that port's
+    values, stored under the port's name in ``data`` along with the time the
+    line was received.
+
+    Ports come from the ``ports`` argument or, by default, the
+    ``SERIAL_SENSORS`` environment variable (see :py:func:`~.parse_port_list`).
+    Ports that fail to open, or that hang up, are retried every
+    ``reopen_sec`` seconds.
+    """
+
+    #: seconds between attempts to reopen a failed port
+    reopen_sec: float = 5.0
+
+    #: longest partial line kept in a port's buffer, in bytes
+    max_line_length: int = 4096
+
+    #: minimum seconds between logged line parser errors, per port
+    error_log_sec: float = 60.0
+
+    def __init__(self, ports: Optional[List[PortConfig]] = None):
+        super().__init__()
+        if ports is None:
+            ports = parse_port_list(os.environ.get('SERIAL_SENSORS', ''))
+        if not ports:
+            raise RuntimeError('No serial sensors configured')
+        self._ports: List[_Port] = [_Port(x) for x in ports]
+        self._values: Dict[str, dict] = {}
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._data = {'message': '', 'data': {}}
+
+    def run(self):
+        logger.debug('Running serial line sensors provider...')
+        while True:
+            self._open_ports()
+            for key, _ in self._selector.select(timeout=self.reopen_sec):
+                self._read(key.data)
+
+    def _open_ports(self):
+        now = monotonic()
+        for port in self._ports:
+            if port.fd is not None or now < port.retry_at:
+                continue
+            try:
+                port.fd = open_port(port.config.path, port.config.baudrate)
+            except (OSError, termios.error) as ex:
+                logger.error(
+                    'Unable to open serial sensor %s at %s: %s',
+                    port.config.name, port.config.path, ex
+                )
+                port.retry_at = now + self.reopen_sec
+                continue
+            logger.info(
+                'Opened serial sensor %s at %s', port.config.name,
+                port.config.path
+            )
+            port.buffer.clear()
+            self._selector.register(port.fd, selectors.EVENT_READ, port)
+
+    def _close(self, port: _Port):
+        self._selector.unregister(port.fd)
+        os.close(port.fd)
+        port.fd = None
+        port.retry_at = monotonic() + self.reopen_sec
+
+    def _read(self, port: _Port):
+        try:
+            chunk = os.read(port.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as ex:
+            logger.error(
+                'Error reading serial sensor %s: %s', port.config.name, ex
+            )
+            self._close(port)
+            return
+        if not chunk:
+            logger.error('Serial sensor %s hung up', port.config.name)
+            self._close(port)
+            return
+        now = time()
+        port.buffer += chunk
+        *lines, rest = port.buffer.split(b'\n')
+        if len(rest) > self.max_line_length:
+            logger.warning(
+                'Discarding %d bytes without a line ending from serial '
+                'sensor %s', len(rest), port.config.name
+            )
+            rest = b''
+        port.buffer[:] = rest
+        for raw in lines:
+            line = raw.rstrip(b'\r').decode('ascii', errors='replace')
+            if not line:
+                continue
+            try:
+                values = port.parser(line)
+            except Exception:
+                self._parse_error(port, line)
+                continue
+            if values is None:
+                continue
+            port.lines += 1
+            self._values[port.config.name] = dict(values, time=now)
+            self._set_data({
+                'message': self._message(),
+                'data': dict(self._values)
+            }, now)
+
+    def _parse_error(self, port: _Port, line: str):
+        """
+        Count a line that ``port``'s parser raised an exception for, and log
+        it at most once every :py:attr:`~.error_log_sec` per port.
+        """
+        port.errors += 1
+        now = monotonic()
+        if port.error_logged_at is not None and \
+                now - port.error_logged_at < self.error_log_sec:
+            return
+        port.error_logged_at = now
+        logger.warning(
+            'Error parsing line from serial sensor %s (%d errors so far; '
+            'logged at most every %ss): %r', port.config.name, port.errors,
+            self.error_log_sec, line, exc_info=True
+        )
+
+    def _message(self) -> str:
+        parts = []
+        for name, values in self._values.items():
+            first = next(
+                (v for k, v in values.items() if k != 'time'), ''
+            )
+            parts.append(f'{name} {first}')
+        return ' '.join(parts)
@@ -0,0 +1,219 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Hotplug-aware discovery of USB serial devices for extra data providers.
+
+Note: for dependencies, this requires:
+
+pyudev==0.22.0
+
+"""
+
+import logging
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+#: USB (vendor ID, model ID, revision) of a device
+UsbId = Tuple[str, str, str]
+
+
+class DeviceCache:
+    """
+    Thread-safe cache of present USB tty devices, by device node, that lets
+    callers wait for a matching device to be added.
+    """
+
+    def __init__(self):
+        self._cond: Condition = Condition()
+        self._devices: Dict[str, UsbId] = {}
+        #: incremented on every add event
+        self._generation: int = 0
+        #: (generation, device node, USB ID) of the most recent add events
+        self._added: List[Tuple[int, str, UsbId]] = []
+
+    @property
+    def generation(self) -> int:
+        """Counter of add events; pass to :py:meth:`~.wait_for_add`."""
+        return self._generation
+
+    @property
+    def devices(self) -> Dict[str, UsbId]:
+        with self._cond:
+            return dict(self._devices)
+
+    def add(self, devname: str, usb_id: UsbId):
+        logger.debug('USB tty device added: %s %s', devname, usb_id)
+        with self._cond:
+            self._devices[devname] = usb_id
+            self._generation += 1
+            self._added.append((self._generation, devname, usb_id))
+            del self._added[:-16]
+            self._cond.notify_all()
+
+    def remove(self, devname: str):
+        logger.debug('USB tty device removed: %s', devname)
+        with self._cond:
+            self._devices.pop(devname, None)
+            self._cond.notify_all()
+
+    def find(self, matches: List[UsbId]) -> Optional[str]:
+        """Return the device node of a present device matching ``matches``."""
+        with self._cond:
+            for devname, usb_id in sorted(self._devices.items()):
+                if usb_id in matches:
+                    return devname
+        return None
+
+    def wait_for_add(
+        self, matches: Optional[List[UsbId]] = None,
+        devname: Optional[str] = None, timeout: Optional[float] = None,
+        since: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Wait up to ``timeout`` seconds for a device with a USB ID in
+        ``matches``, or with device node ``devname``, to be added after
+        generation ``since`` (default: now). Returns its device node, or
+        None on timeout.
+        """
+        end = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            if since is None:
+                since = self._generation
+            while True:
+                for gen, name, usb_id in self._added:
+                    if gen <= since or name not in self._devices:
+                        continue
+                    if (
+                        (matches is not None and usb_id in matches) or
+                        (devname is not None and name == devname)
+                    ):
+                        return name
+                remaining = None if end is None else end - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+class UdevDeviceWatcher(DeviceCache, Thread):
+    """
+    :py:class:`~.DeviceCache` of USB tty devices kept up to date by a udev
+    monitor. Existing devices are enumerated once at startup; after that
+    add and remove events update the cache as they happen, with no
+    rescanning. Use :py:func:`~.get_watcher` to get the shared instance.
+    """
+
+    #: seconds to wait before polling again after a monitor error; doubled
+    #: for each consecutive error, up to :py:attr:`~.error_backoff_max`
+    error_backoff: float = 1.0
+
+    #: maximum seconds to wait before polling again after a monitor error
+    error_backoff_max: float = 60.0
+
+    def __init__(self):
+        DeviceCache.__init__(self)
+        Thread.__init__(self, name='UdevDeviceWatcher', daemon=True)
+        from pyudev import Context, Monitor
+        self._context = Context()
+        self._monitor = Monitor.from_netlink(self._context)
+        self._monitor.filter_by('tty')
+        # start receiving events before enumerating, so none are missed
+        self._monitor.start()
+        for device in self._context.list_devices(subsystem='tty'):
+            self._handle('add', device)
+
+    @staticmethod
+    def _usb_id(device) -> Optional[UsbId]:
+        props = device.properties
+        if props.get('ID_BUS') != 'usb':
+            return None
+        return (
+            props.get('ID_VENDOR_ID'), props.get('ID_MODEL_ID'),
+            props.get('ID_REVISION')
+        )
+
+    def _handle(self, action: str, device):
+        devname = device.device_node
+        if devname is None:
+            return
+        if action == 'remove':
+            self.remove(devname)
+            return
+        if action != 'add':
+            return
+        usb_id = self._usb_id(device)
+        if usb_id is not None:
+            self.add(devname, usb_id)
+
+    def run(self):
+        errors = 0
+        while True:
+            try:
+                device = self._monitor.poll()
+            except Exception:
+                errors += 1
+                delay = min(
+                    self.error_backoff * (2 ** (errors - 1)),
+                    self.error_backoff_max
+                )
+                logger.error(
+                    'Error polling udev monitor (%d consecutive); retrying '
+                    'in %ss', errors, delay, exc_info=True
+                )
+                sleep(delay)
+                continue
+            errors = 0
+            if device is not None:
+                self._handle(device.action, device)
+
+
+_watcher: Optional[UdevDeviceWatcher] = None
+_watcher_lock: Lock = Lock()
+
+
+def get_watcher() -> UdevDeviceWatcher:
+    """
+    Return the process-wide :py:class:`~.UdevDeviceWatcher`, creating and
+    starting it on first use.
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = UdevDeviceWatcher()
+            _watcher.start()
+        return _watcher
@@ -0,0 +1,325 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import logging
+import time
+from multiprocessing.process import BaseProcess
+from multiprocessing.connection import Connection
+from threading import Event
+from typing import Dict, List, Optional, Tuple, Union
+
+from pizero_gpslog.extradata.base import BaseExtraDataProvider
+from pizero_gpslog.utils import (
+    import_classes, init_child_logging, process_context
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _provider_process(
+    modname: str, clsname: str, conn: Connection, tick_sec: float,
+    log_level: int
+):
+    """
+    Entry point of the child process used by :py:class:`~.IsolatedProvider`.
+    Imports, constructs and starts the provider, then every ``tick_sec`` sends every
+    sample added to its buffer since the last tick (or its data, for
+    providers that set ``_data`` directly) on ``conn`` as a
+    ``('data', sample_time, data)`` tuple, or a ``('heartbeat',)`` tuple if
+    there are none. Returns, ending the process, when the pipe is closed or
+    the provider thread exits.
+    """
+    init_child_logging(log_level)
+    try:
+        conn.send(('heartbeat',))
+        cls = import_classes([(modname, clsname)])[0]
+        if cls.namespace not in (None, clsname.lower()):
+            logger.warning(
+                'Extra data provider %s:%s namespace %r is ignored when '
+                'isolated; its data is stored under %r', modname, clsname,
+                cls.namespace, clsname.lower()
+            )
+        provider = cls()
+        provider.start()
+    except (BrokenPipeError, EOFError):
+        return
+    last_time: Optional[float] = None
+    last_data: Optional[dict] = None
+    while True:
+        with provider._buffer_lock:
+            samples = list(provider._buffer)
+        new = [x for x in samples if last_time is None or x[0] > last_time]
+        try:
+            if new:
+                for sample_time, data in new:
+                    conn.send(('data', sample_time, data))
+                last_time, last_data = new[-1]
+            elif not samples and provider.data is not last_data:
+                last_data = provider.data
+                conn.send(('data', None, last_data))
+            else:
+                conn.send(('heartbeat',))
+        except (BrokenPipeError, OSError):
+            return
+        if not provider.is_alive():
+            logger.error('Extra data provider %s:%s exited', modname, clsname)
+            return
+        time.sleep(tick_sec)
+
+
+class IsolatedProvider(BaseExtraDataProvider):
+    """
+    Stand-in for an extra data provider that runs the real provider in a
+    child process, so that a provider blocking in C code, holding the GIL or
+    sleeping inline can't add latency to reading gpsd and writing the log.
+
+    This thread receives the provider's samples over a pipe into its own
+    buffer, and acts as a watchdog: if the child process exits, or nothing
+    (not even a heartbeat) is received from it for ``watchdog_sec`` seconds
+    (default: the ``EXTRA_DATA_WATCHDOG_SEC`` environment variable, or 30),
+    it is killed and restarted after ``restart_delay`` seconds. The last
+    data received is kept while the child is restarting.
+
+    The child is started with :py:func:`~pizero_gpslog.utils.process_context`
+    and the provider class is only imported there, never in this process;
+    so :py:attr:`~.namespace` is always the lower-cased class name.
+
+    :param modname: module name of the provider class
+    :param clsname: name of the provider class
+    """
+
+    #: seconds between checks for new samples (and heartbeats) in the child
+    tick_sec: float = 0.5
+
+    #: seconds to wait before restarting the child
+    restart_delay: float = 5.0
+
+    def __init__(
+        self, modname: str, clsname: str,
+        watchdog_sec: Optional[float] = None
+    ):
+        super().__init__()
+        self.namespace = clsname.lower()
+        self.name = f'IsolatedProvider-{clsname}'
+        self._modname: str = modname
+        self._clsname: str = clsname
+        if watchdog_sec is None:
+            watchdog_sec = float(
+                os.environ.get('EXTRA_DATA_WATCHDOG_SEC', '30')
+            )
+        self._watchdog_sec: float = watchdog_sec
+        self._process: Optional[BaseProcess] = None
+        self._conn: Optional[Connection] = None
+        self._stop_event: Event = Event()
+        #: number of times the child process has been restarted
+        self.restarts: int = 0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._spawn()
+            self._receive()
+            self._kill()
+            if self._stop_event.is_set():
+                break
+            self.restarts += 1
+            logger.warning(
+                'Restarting extra data provider %s:%s in %ss (restart %d)',
+                self._modname, self._clsname, self.restart_delay,
+                self.restarts
+            )
+            self._stop_event.wait(self.restart_delay)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _spawn(self):
+        ctx = process_context()
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        self._conn = parent_conn
+        self._process = ctx.Process(
+            target=_provider_process, name=self.name, daemon=True,
+            args=(
+                self._modname, self._clsname, child_conn, self.tick_sec,
+                logging.getLogger().getEffectiveLevel()
+            )
+        )
+        self._process.start()
+        child_conn.close()
+        logger.info(
+            'Started extra data provider %s:%s in process %d',
+            self._modname, self._clsname, self._process.pid
+        )
+
+    def _receive(self):
+        """
+        Receive samples from the child until it exits, the watchdog expires,
+        or :py:meth:`~.stop` is called.
+        """
+        last = time.monotonic()
+        while not self._stop_event.is_set():
+            if self._conn.poll(self.tick_sec):
+                try:
+                    msg = self._conn.recv()
+                except EOFError:
+                    logger.error(
+                        'Extra data provider %s:%s process exited',
+                        self._modname, self._clsname
+                    )
+                    return
+                last = time.monotonic()
+                if msg[0] == 'data':
+                    self._set_data(msg[2], msg[1])
+            elif time.monotonic() - last > self._watchdog_sec:
+                logger.error(
+                    'Nothing received from extra data provider %s:%s for %ss',
+                    self._modname, self._clsname, self._watchdog_sec
+                )
+                return
+
+    def _kill(self):
+        self._conn.close()
+        self._process.terminate()
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join(1)
+
+
+class ExtraDataManager:
+    """
+    Run one or more extra data providers, each on its own thread with its own
+    poll period, and combine their data.
+
+    With a single provider, :py:attr:`~.data` and :py:meth:`~.sample_at`
+    return exactly what the provider does. With more than one, the ``data``
+    of each provider is stored in the combined ``data`` dict under the
+    provider's namespace (see
+    :py:attr:`~pizero_gpslog.extradata.base.BaseExtraDataProvider.namespace`)
+    and the messages of all providers are joined with ``" | "``. Reading the
+    combined data only takes each provider's latest snapshot, so a slow
+    provider never delays the others.
+
+    If ``isolate`` is True (default: True if the ``EXTRA_DATA_PROCESS``
+    environment variable is set to ``true``), each provider runs in its own
+    child process, and the provider classes are not imported in this
+    process; see :py:class:`~.IsolatedProvider`.
+
+    :param classes: list of (module name, class name) tuples of the provider
+      classes to use; see :py:func:`~pizero_gpslog.utils.parse_class_list`
+    :param isolate: whether to run each provider in a child process
+    """
+
+    def __init__(
+        self, classes: List[Tuple[str, str]], isolate: Optional[bool] = None
+    ):
+        if isolate is None:
+            isolate = os.environ.get('EXTRA_DATA_PROCESS', 'false') == 'true'
+        self._providers: Dict[str, BaseExtraDataProvider] = {}
+        for modname, clsname in classes:
+            if isolate:
+                provider = IsolatedProvider(modname, clsname)
+            else:
+                provider = import_classes([(modname, clsname)])[0]()
+            ns = provider.namespace or type(provider).__name__.lower()
+            key = ns
+            i = 1
+            while key in self._providers:
+                i += 1
+                key = f'{ns}_{i}'
+            self._providers[key] = provider
+
+    @property
+    def providers(self) -> Dict[str, BaseExtraDataProvider]:
+        return self._providers
+
+    def start(self):
+        for ns, provider in self._providers.items():
+            logger.debug('Starting extra data provider %s', ns)
+            provider.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the providers that can be stopped (those run in a child process
+        by :py:class:`~.IsolatedProvider`), waiting up to ``timeout`` seconds
+        for each. Other providers are daemon threads, which exit with this
+        process.
+        """
+        stoppable = [
+            p for p in self._providers.values() if isinstance(p, IsolatedProvider)
+        ]
+        for provider in stoppable:
+            provider.stop()
+        for provider in stoppable:
+            if provider.is_alive():
+                provider.join(timeout)
+
+    @property
+    def data(self) -> dict:
+        if len(self._providers) == 1:
+            return next(iter(self._providers.values())).data
+        return self._merge(
+            {ns: p.data for ns, p in self._providers.items()}
+        )
+
+    def sample_at(
+        self, t: float, interpolate: bool = False
+    ) -> Tuple[dict, Union[None, float, Dict[str, Optional[float]]]]:
+        """
+        Return the combined sample of all providers for timestamp ``t``, as
+        with :py:meth:`BaseExtraDataProvider.sample_at`. With more than one
+        provider, the offset is a dict of each provider's offset by
+        namespace.
+        """
+        if len(self._providers) == 1:
+            return next(iter(self._providers.values())).sample_at(
+                t, interpolate=interpolate
+            )
+        samples = {}
+        offsets = {}
+        for ns, p in self._providers.items():
+            samples[ns], offsets[ns] = p.sample_at(t, interpolate=interpolate)
+        return self._merge(samples), offsets
+
+    def _merge(self, items: Dict[str, dict]) -> dict:
+        return {
+            'message': ' | '.join(
+                x.get('message', '') for x in items.values()
+                if x.get('message', '')
+            ),
+            'data': {ns: x.get('data') for ns, x in items.items()}
+        }
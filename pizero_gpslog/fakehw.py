@@ -0,0 +1,494 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import time
+import logging
+from types import ModuleType
+from typing import Callable, Dict, List, Optional
+from threading import Condition, Event, Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+#: Default number of seconds that the e-Paper BUSY pin stays asserted after
+#: each command byte; keys are command bytes. These approximate the Waveshare
+#: 2.13 inch (B) panel: POWER_ON, REFRESH and POWER_OFF.
+EPD_BUSY_SECONDS: Dict[int, float] = {
+    0x04: 0.1,
+    0x12: 15.0,
+    0x02: 0.1,
+}
+
+#: The :py:class:`~.FakeHardware` instance that the fake modules currently
+#: dispatch to; set by :py:meth:`~.FakeHardware.install`.
+_active: Optional['FakeHardware'] = None
+
+#: The most recently installed :py:class:`~.FakeHardware`. Calls made while
+#: no instance is installed (e.g. from a driver's ``__del__`` after
+#: :py:meth:`~.FakeHardware.uninstall`) are sent here.
+_last: Optional['FakeHardware'] = None
+
+
+def _hw() -> 'FakeHardware':
+    if _active is not None:
+        return _active
+    if _last is not None:
+        return _last
+    raise RuntimeError('ERROR: FakeHardware is not installed')
+
+
+class BusStats(object):
+    """
+    Counters for the bus traffic seen by a :py:class:`~.FakeHardware`.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        #: bytes written over SPI
+        self.spi_bytes: int = 0
+        #: number of SPI transfers
+        self.spi_transactions: int = 0
+        #: bytes written over I2C
+        self.i2c_bytes: int = 0
+        #: number of I2C transfers
+        self.i2c_transactions: int = 0
+        #: number of GPIO output writes
+        self.gpio_writes: int = 0
+        #: number of GPIO output writes that changed the pin level
+        self.gpio_toggles: int = 0
+        #: number of GPIO input reads
+        self.gpio_reads: int = 0
+        #: total seconds the BUSY pin was asserted
+        self.busy_seconds: float = 0.0
+        #: number of GPIO edge waits and edge detections added
+        self.gpio_edge_waits: int = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+
+class FakeHardware(object):
+    """
+    In-process stand-ins for the ``spidev``, ``RPi.GPIO``, ``board``,
+    ``busio``, ``digitalio`` and ``adafruit_ssd1305`` modules, so that the
+    real display drivers can be imported, exercised and profiled on a normal
+    Linux machine.
+
+    All bus traffic is counted in :py:attr:`~.stats`. Writing one of the
+    command bytes in ``busy_seconds`` over SPI (while the D/C pin is low)
+    asserts the BUSY pin (reads as 0) for the given number of seconds,
+    multiplied by ``busy_scale``. Rising edges of the BUSY pin can be waited
+    for with the fake ``RPi.GPIO.wait_for_edge``, or detected with
+    ``add_event_detect``, which calls its callback from another thread. If
+    ``edge_detection`` is False, both raise RuntimeError like a GPIO backend
+    without interrupt support.
+
+    Call :py:meth:`~.install` *before* importing a driver module, or use the
+    instance as a context manager.
+    """
+
+    def __init__(
+        self, busy_pin: int = 24, dc_pin: int = 25,
+        busy_seconds: Optional[Dict[int, float]] = None,
+        busy_scale: float = 1.0, edge_detection: bool = True
+    ):
+        self.busy_pin: int = busy_pin
+        self.edge_detection: bool = edge_detection
+        self.dc_pin: int = dc_pin
+        if busy_seconds is None:
+            busy_seconds = EPD_BUSY_SECONDS
+        self.busy_seconds: Dict[int, float] = {
+            k: v * busy_scale for k, v in busy_seconds.items()
+        }
+        self.stats: BusStats = BusStats()
+        #: current output level of each GPIO pin
+        self.pins: Dict[int, int] = {}
+        #: every command byte written over SPI, in order
+        self.spi_commands: List[int] = []
+        self._busy_until: float = 0.0
+        self._lock: Lock = Lock()
+        # notified when the BUSY pin is asserted or an edge detection removed
+        self._busy_changed: Condition = Condition(self._lock)
+        # stop events of the threads of added edge detections, by pin
+        self._edge_detects: Dict[int, Event] = {}
+        # used to sleep in wait_for_edge; unaffected by patching time.sleep
+        self._timer: Event = Event()
+        self._saved_modules: Dict[str, Optional[ModuleType]] = {}
+        self._previous: Optional[FakeHardware] = None
+
+    def install(self):
+        """
+        Make this instance the active fake hardware and insert the fake
+        modules into ``sys.modules``.
+        """
+        global _active, _last
+        if _active is not self:
+            self._previous = _active
+        _active = self
+        _last = self
+        for name, mod in _fake_modules().items():
+            if name not in self._saved_modules:
+                self._saved_modules[name] = sys.modules.get(name)
+            sys.modules[name] = mod
+        logger.debug('Installed fake hardware modules')
+
+    def uninstall(self):
+        """
+        Restore the modules that were replaced by :py:meth:`~.install`.
+        """
+        global _active
+        for name, mod in self._saved_modules.items():
+            if mod is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = mod
+        self._saved_modules = {}
+        if _active is self:
+            _active = self._previous
+            self._previous = None
+        logger.debug('Uninstalled fake hardware modules')
+
+    def __enter__(self) -> 'FakeHardware':
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+    @property
+    def is_busy(self) -> bool:
+        return time.monotonic() < self._busy_until
+
+    def spi_write(self, data: List[int]):
+        with self._lock:
+            self.stats.spi_bytes += len(data)
+            self.stats.spi_transactions += 1
+            if self.pins.get(self.dc_pin, 1) != 0:
+                return
+            for b in data:
+                self.spi_commands.append(b)
+                if b in self.busy_seconds and self.busy_seconds[b] > 0:
+                    self._busy_until = time.monotonic() + self.busy_seconds[b]
+                    self.stats.busy_seconds += self.busy_seconds[b]
+                    self._busy_changed.notify_all()
+
+    def i2c_write(self, data: bytes):
+        with self._lock:
+            self.stats.i2c_bytes += len(data)
+            self.stats.i2c_transactions += 1
+
+    def gpio_output(self, pin: int, value: int):
+        value = 1 if value else 0
+        with self._lock:
+            self.stats.gpio_writes += 1
+            if self.pins.get(pin) != value:
+                self.stats.gpio_toggles += 1
+            self.pins[pin] = value
+
+    def gpio_input(self, pin: int) -> int:
+        self.stats.gpio_reads += 1
+        if pin == self.busy_pin:
+            return 0 if self.is_busy else 1
+        return self.pins.get(pin, 0)
+
+    def gpio_wait_for_edge(
+        self, pin: int, edge: int, timeout: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Emulate ``RPi.GPIO.wait_for_edge``; only rising edges of the BUSY
+        pin are simulated. ``timeout`` is in milliseconds. Returns ``pin`` if
+        the edge happened, or None on timeout.
+        """
+        if not self.edge_detection:
+            raise RuntimeError('Failed to add edge detection')
+        self.stats.gpio_edge_waits += 1
+        end = None if timeout is None else time.monotonic() + timeout / 1000
+        if pin != self.busy_pin or edge == _GPIO_FALLING:
+            if end is not None:
+                self._timer.wait(max(0.0, end - time.monotonic()))
+            return None
+        until = self._busy_until
+        if end is not None and end < until:
+            self._timer.wait(max(0.0, end - time.monotonic()))
+            return None
+        self._timer.wait(max(0.0, until - time.monotonic()))
+        return pin
+
+    def gpio_add_event_detect(
+        self, pin: int, edge: int, callback: Optional[Callable] = None
+    ):
+        """
+        Emulate ``RPi.GPIO.add_event_detect``; ``callback`` is called with
+        ``pin`` from another thread on each simulated rising edge of the
+        BUSY pin (when it stops being asserted) until
+        :py:meth:`~.gpio_remove_event_detect` is called.
+        """
+        if not self.edge_detection:
+            raise RuntimeError('Failed to add edge detection')
+        with self._lock:
+            if pin in self._edge_detects:
+                raise RuntimeError(
+                    'Conflicting edge detection already enabled for this '
+                    'GPIO channel'
+                )
+            stop = Event()
+            self._edge_detects[pin] = stop
+            self.stats.gpio_edge_waits += 1
+        if pin != self.busy_pin or edge == _GPIO_FALLING or callback is None:
+            return
+        Thread(
+            target=self._edge_thread, args=(pin, callback, stop),
+            name='FakeGpioEdge', daemon=True
+        ).start()
+
+    def gpio_remove_event_detect(self, pin: int):
+        with self._lock:
+            stop = self._edge_detects.pop(pin, None)
+            if stop is not None:
+                stop.set()
+                self._busy_changed.notify_all()
+
+    def _edge_thread(self, pin: int, callback: Callable, stop: Event):
+        with self._lock:
+            while not stop.is_set():
+                remaining = self._busy_until - time.monotonic()
+                if remaining <= 0:
+                    self._busy_changed.wait()
+                    continue
+                self._busy_changed.wait(remaining)
+                if stop.is_set() or time.monotonic() < self._busy_until:
+                    continue
+                self._lock.release()
+                try:
+                    callback(pin)
+                finally:
+                    self._lock.acquire()
+
+
+class _FakeSpiDev(object):
+
+    def __init__(self, bus: int = 0, device: int = 0):
+        self.bus: int = bus
+        self.device: int = device
+        self.max_speed_hz: int = 0
+        self.mode: int = 0
+
+    def writebytes(self, data: List[int]):
+        _hw().spi_write(data)
+
+    def writebytes2(self, data: List[int]):
+        _hw().spi_write(list(data))
+
+    def xfer2(self, data: List[int]) -> List[int]:
+        _hw().spi_write(data)
+        return [0] * len(data)
+
+    def close(self):
+        pass
+
+
+class _FakePin(object):
+
+    def __init__(self, pin_id: int):
+        self.id: int = pin_id
+
+    def __repr__(self):
+        return '<FakePin %d>' % self.id
+
+
+class _FakeDigitalInOut(object):
+
+    def __init__(self, pin: _FakePin):
+        self._pin: _FakePin = pin
+        self.direction = None
+        self._value: bool = False
+
+    def switch_to_output(self, value: bool = False, **kwargs):
+        self.value = value
+
+    @property
+    def value(self) -> bool:
+        return self._value
+
+    @value.setter
+    def value(self, val: bool):
+        self._value = val
+        _hw().gpio_output(self._pin.id, int(val))
+
+
+class _FakeI2C(object):
+
+    def __init__(self, scl: _FakePin, sda: _FakePin, frequency: int = 100000):
+        self.frequency: int = frequency
+
+    def try_lock(self) -> bool:
+        return True
+
+    def unlock(self):
+        pass
+
+    def writeto(self, address: int, buffer: bytes, start: int = 0,
+                end: Optional[int] = None):
+        _hw().i2c_write(buffer[start:end])
+
+
+class _FakeSSD1305_I2C(object):
+    """
+    Minimal stand-in for ``adafruit_ssd1305.SSD1305_I2C``. :py:meth:`~.show`
+    writes the same amount of I2C traffic as the real driver: one command
+    transaction per addressing byte, then the whole framebuffer.
+    """
+
+    def __init__(self, width: int, height: int, i2c: _FakeI2C,
+                 addr: int = 0x3C, reset: Optional[_FakeDigitalInOut] = None):
+        self.width: int = width
+        self.height: int = height
+        self._i2c: _FakeI2C = i2c
+        self.addr: int = addr
+        self.buffer: bytearray = bytearray(width * height // 8)
+        if reset is not None:
+            reset.switch_to_output(value=False)
+            reset.value = True
+
+    def fill(self, color: int):
+        val = 0xFF if color else 0x00
+        for i in range(len(self.buffer)):
+            self.buffer[i] = val
+
+    def image(self, img):
+        if img.mode != '1':
+            raise ValueError('Image must be in mode 1.')
+        if img.size != (self.width, self.height):
+            raise ValueError('Image must be same dimensions as display')
+        data = img.tobytes()
+        self.buffer[:len(data)] = data
+
+    def show(self):
+        for cmd in (0x21, 0, self.width - 1, 0x22, 0, self.height // 8 - 1):
+            self._i2c.writeto(self.addr, bytes([0x80, cmd]))
+        self._i2c.writeto(self.addr, bytes([0x40]) + bytes(self.buffer))
+
+
+_GPIO_RISING: int = 31
+_GPIO_FALLING: int = 32
+_GPIO_BOTH: int = 33
+
+
+def _gpio_module() -> ModuleType:
+    gpio = ModuleType('RPi.GPIO')
+    gpio.BCM = 11
+    gpio.BOARD = 10
+    gpio.OUT = 0
+    gpio.IN = 1
+    gpio.LOW = 0
+    gpio.HIGH = 1
+    gpio.PUD_OFF = 20
+    gpio.PUD_DOWN = 21
+    gpio.PUD_UP = 22
+    gpio.RISING = _GPIO_RISING
+    gpio.FALLING = _GPIO_FALLING
+    gpio.BOTH = _GPIO_BOTH
+    gpio.setmode = lambda mode: None
+    gpio.setwarnings = lambda flag: None
+    gpio.setup = lambda channel, direction, **kwargs: None
+    gpio.output = lambda channel, value: _hw().gpio_output(channel, value)
+    gpio.input = lambda channel: _hw().gpio_input(channel)
+    gpio.wait_for_edge = lambda channel, edge, timeout=None, **kwargs: (
+        _hw().gpio_wait_for_edge(channel, edge, timeout=timeout)
+    )
+    gpio.add_event_detect = lambda channel, edge, callback=None, **kwargs: (
+        _hw().gpio_add_event_detect(channel, edge, callback=callback)
+    )
+    gpio.remove_event_detect = lambda channel: (
+        _hw().gpio_remove_event_detect(channel)
+    )
+    gpio.cleanup = lambda *args: None
+    return gpio
+
+
+_modules: Dict[str, ModuleType] = {}
+
+
+def install_fake_hardware(**kwargs) -> FakeHardware:
+    """
+    Construct a :py:class:`~.FakeHardware` with ``kwargs`` and install it.
+    Being a module-level function, this (or a :py:func:`functools.partial`
+    of it) can be passed as ``child_init`` to
+    :py:class:`~pizero_gpslog.displaymanager.DisplayManager`, to install the
+    fakes in an isolated display process.
+    """
+    hw = FakeHardware(**kwargs)
+    hw.install()
+    return hw
+
+
+def _fake_modules() -> Dict[str, ModuleType]:
+    """
+    Build (once) and return the fake modules, keyed by module name. The
+    modules are built only once and dispatch to the active
+    :py:class:`~.FakeHardware`, so driver modules that were imported against
+    a previous instance keep working.
+    """
+    if _modules:
+        return _modules
+    spidev = ModuleType('spidev')
+    spidev.SpiDev = _FakeSpiDev
+    gpio = _gpio_module()
+    rpi = ModuleType('RPi')
+    rpi.GPIO = gpio
+    board = ModuleType('board')
+    for name, num in [('SCL', 3), ('SDA', 2), ('D4', 4), ('D17', 17),
+                      ('D24', 24), ('D25', 25), ('CE0', 8)]:
+        setattr(board, name, _FakePin(num))
+    busio = ModuleType('busio')
+    busio.I2C = _FakeI2C
+    digitalio = ModuleType('digitalio')
+    digitalio.DigitalInOut = _FakeDigitalInOut
+    ssd1305 = ModuleType('adafruit_ssd1305')
+    ssd1305.SSD1305_I2C = _FakeSSD1305_I2C
+    _modules.update({
+        'spidev': spidev,
+        'RPi': rpi,
+        'RPi.GPIO': gpio,
+        'board': board,
+        'busio': busio,
+        'digitalio': digitalio,
+        'adafruit_ssd1305': ssd1305,
+    })
+    return _modules
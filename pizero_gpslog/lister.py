@@ -0,0 +1,474 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+The ``pizero-gpslog-ls`` command: a quick overview of a directory of
+pizero-gpslog files, showing the start and end time, duration, number of
+fixes and bounding box of each.
+
+Rather than reading whole files, each log is summarized by reading a few
+lines from its start, until the first fix, and seeking to its end and
+reading backwards to the last complete line with a fix. The number of fixes
+is estimated from the size of the file between those two and the density
+of fixes in the lines read. Exact counts and bounding boxes are only found
+with ``--exact``, which reads whole files; the results are cached (by
+default in ``.pizero-gpslog-ls.json`` in the directory) and reused while a
+file is unchanged, and if a file has only grown since, only the lines added
+are read.
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+from pizero_gpslog.logreader import (
+    FixReader, FixRecord, decode_fix, log_files_in
+)
+from pizero_gpslog.utils import parse_gps_time
+
+#: Name of the cache of exact summaries, in each directory
+CACHE_FILENAME = '.pizero-gpslog-ls.json'
+
+#: Version of the cache file format; caches of other versions are ignored
+CACHE_VERSION = 1
+
+#: Size of the blocks read backwards from the end of a file
+BLOCK_SIZE = 64 * 1024
+
+#: Give up looking for the first or last fix after this many bytes
+MAX_SCAN = 4 * 1024 * 1024
+
+#: Number of lines after the first fix and before the last fix to sample
+SAMPLE_LINES = 20
+
+#: Files no bigger than this are always read in full
+SMALL_SIZE = 2 * BLOCK_SIZE
+
+#: Bounding box as ``(min_lat, min_lon, max_lat, max_lon)``
+BBox = Tuple[float, float, float, float]
+
+
+class LogSummary(NamedTuple):
+    """Overview of a single log file."""
+
+    #: path to the log file
+    path: str
+
+    #: size of the file in bytes
+    size: int
+
+    #: GPS time of the first fix in the file, or None if it has none
+    start: Optional[str]
+
+    #: GPS time of the last fix in the file, or None if it has none
+    end: Optional[str]
+
+    #: number of fixes in the file
+    points: int
+
+    #: whether ``points`` (and ``bbox``) are exact, or ``points`` is estimated
+    exact: bool
+
+    #: bounding box of the fixes, if known
+    bbox: Optional[BBox] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Seconds between the first and last fix, if there are any."""
+        if self.start is None or self.end is None:
+            return None
+        return parse_gps_time(self.end) - parse_gps_time(self.start)
+
+
+def _decode(raw: bytes) -> Optional[FixRecord]:
+    """
+    Decode a raw line to a fix, or None (including if it is invalid JSON, or
+    valid JSON that isn't a complete log line).
+    """
+    line = raw.decode('utf-8', errors='ignore').strip()
+    if len(line) == 0:
+        return None
+    try:
+        return decode_fix(line, 0, 0.0, errors=None)
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def _scan_head(fh: BinaryIO) -> Tuple[Optional[FixRecord], int, int, int]:
+    """
+    Read from the start of ``fh`` to its first fix and up to
+    :py:data:`~.SAMPLE_LINES` complete lines after it. Return the first fix,
+    the byte offset of its line, and the number of fixes and bytes in the
+    lines sampled from the first fix on.
+    """
+    fh.seek(0)
+    offset = 0
+    first: Optional[FixRecord] = None
+    first_offset = 0
+    fixes = nbytes = lines = 0
+    for raw in fh:
+        if not raw.endswith(b'\n'):
+            break
+        offset += len(raw)
+        rec = _decode(raw)
+        if first is None:
+            if rec is None:
+                if offset > MAX_SCAN:
+                    break
+                continue
+            first = rec
+            first_offset = offset - len(raw)
+        nbytes += len(raw)
+        fixes += rec is not None
+        lines += 1
+        if lines > SAMPLE_LINES:
+            break
+    return first, first_offset, fixes, nbytes
+
+
+def _scan_tail(
+    fh: BinaryIO, size: int, stop: int
+) -> Tuple[Optional[FixRecord], int, int, int]:
+    """
+    Seek to the end of ``fh`` and read complete lines backwards, no further
+    back than byte offset ``stop`` (which must be the start of a line), to
+    the last fix and up to :py:data:`~.SAMPLE_LINES` lines before it.
+    Return the last fix, the byte offset just after its line, and the number
+    of fixes and bytes in the lines sampled up to the last fix.
+    """
+    last: Optional[FixRecord] = None
+    last_end = 0
+    fixes = nbytes = lines = 0
+    pos = size
+    buf = b''
+    line_end: Optional[int] = None
+    while pos > stop and size - pos < MAX_SCAN:
+        count = min(BLOCK_SIZE, pos - stop)
+        pos -= count
+        fh.seek(pos)
+        buf = fh.read(count) + buf
+        if line_end is None:
+            # anything after the last newline may still be being written
+            nl = buf.rfind(b'\n')
+            if nl < 0:
+                continue
+            line_end = pos + nl + 1
+            buf = buf[:nl]
+        parts = buf.split(b'\n')
+        # the first part may be the end of a line that started before pos
+        buf = parts.pop(0) if pos > stop else b''
+        for raw in reversed(parts):
+            end = line_end
+            line_end -= len(raw) + 1
+            rec = _decode(raw)
+            if last is None:
+                if rec is None:
+                    continue
+                last = rec
+                last_end = end
+            nbytes += len(raw) + 1
+            fixes += rec is not None
+            lines += 1
+            if lines > SAMPLE_LINES:
+                return last, last_end, fixes, nbytes
+    return last, last_end, fixes, nbytes
+
+
+def quick_summary(path: str) -> LogSummary:
+    """
+    Summarize the log at ``path`` from its first and last complete lines
+    with fixes, estimating the number of fixes in it from the density of
+    fixes in the lines read near them. Files of up to
+    :py:data:`~.SMALL_SIZE` bytes are read in full instead.
+    """
+    size = os.stat(path).st_size
+    if size <= SMALL_SIZE:
+        return exact_summary(path)
+    with open(path, 'rb') as fh:
+        first, first_offset, head_fixes, head_bytes = _scan_head(fh)
+        if first is None:
+            return LogSummary(path, size, None, None, 0, False)
+        last, last_end, tail_fixes, tail_bytes = _scan_tail(
+            fh, size, first_offset
+        )
+    if last is None:
+        # the first fix was more than MAX_SCAN bytes before the end
+        return LogSummary(path, size, first.time, None, head_fixes, False)
+    density = (head_fixes + tail_fixes) / (head_bytes + tail_bytes)
+    points = max(int(round((last_end - first_offset) * density)), 1)
+    return LogSummary(path, size, first.time, last.time, points, False)
+
+
+def _new_entry() -> dict:
+    """A cache entry for a file that hasn't been read yet."""
+    return {
+        'offset': 0, 'lineno': 0, 'prev_alt': 0.0, 'points': 0,
+        'start': None, 'end': None, 'bbox': None
+    }
+
+
+def exact_summary(
+    path: str, entry: Optional[dict] = None
+) -> LogSummary:
+    """
+    Summarize the log at ``path`` by reading every complete line of it. If
+    ``entry`` is a :py:class:`~.SummaryCache` entry for the file, it is read
+    from where that left off, and ``entry`` is updated.
+    """
+    if entry is None:
+        entry = _new_entry()
+    reader = FixReader(
+        path, offset=entry['offset'], lineno=entry['lineno'],
+        prev_alt=entry['prev_alt'], errors=None
+    )
+    bbox = entry['bbox']
+    if bbox is None:
+        min_lat = min_lon = float('inf')
+        max_lat = max_lon = float('-inf')
+    else:
+        min_lat, min_lon, max_lat, max_lon = bbox
+    points = entry['points']
+    start = entry['start']
+    end = entry['end']
+    for fix in reader.fixes(complete_only=True):
+        if start is None:
+            start = fix.time
+        end = fix.time
+        points += 1
+        min_lat = min(min_lat, fix.lat)
+        max_lat = max(max_lat, fix.lat)
+        min_lon = min(min_lon, fix.lon)
+        max_lon = max(max_lon, fix.lon)
+    if points > 0:
+        bbox = (min_lat, min_lon, max_lat, max_lon)
+    entry.update(
+        offset=reader.offset, lineno=reader.lineno, prev_alt=reader.prev_alt,
+        points=points, start=start, end=end, bbox=bbox
+    )
+    return LogSummary(
+        path, os.stat(path).st_size, start, end, points, True,
+        None if bbox is None else tuple(bbox)
+    )
+
+
+class SummaryCache(object):
+    """
+    Cache of exact :py:class:`~.LogSummary` results for the files in one
+    directory, with the state needed to carry on reading each file if it
+    grows, stored as JSON.
+    """
+
+    def __init__(self, fpath: str):
+        #: path to the cache file
+        self.fpath: str = fpath
+        #: cache entries by file name
+        self.entries: Dict[str, dict] = {}
+        self._changed: bool = False
+        try:
+            with open(fpath, 'r') as fh:
+                data = json.load(fh)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = data['files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def summary(self, path: str, exact: bool = False) -> LogSummary:
+        """
+        Summarize the log at ``path``. A cached exact summary is used if the
+        file is unchanged. Otherwise, if ``exact`` is True the file is read
+        (from where the cached entry left off, if it has only grown) and the
+        result cached; if not, :py:func:`~.quick_summary` is used.
+        """
+        name = os.path.basename(path)
+        st = os.stat(path)
+        entry = self.entries.get(name)
+        if entry is not None and entry['inode'] == st.st_ino:
+            if entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+                bbox = entry['bbox']
+                return LogSummary(
+                    path, st.st_size, entry['start'], entry['end'],
+                    entry['points'], True, None if bbox is None else tuple(bbox)
+                )
+            if entry['size'] > st.st_size:
+                entry = None
+        else:
+            entry = None
+        if not exact:
+            return quick_summary(path)
+        if entry is None:
+            entry = _new_entry()
+        res = exact_summary(path, entry)
+        entry.update(inode=st.st_ino, size=st.st_size, mtime=st.st_mtime)
+        self.entries[name] = entry
+        self._changed = True
+        return res
+
+    def save(self):
+        """Write the cache out, if it has changed, replacing it atomically."""
+        if not self._changed:
+            return
+        tmp = self.fpath + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'version': CACHE_VERSION, 'files': self.entries}, fh)
+        os.replace(tmp, self.fpath)
+        self._changed = False
+
+
+def summarize(
+    paths: List[str], exact: bool = False, use_cache: bool = True
+) -> List[LogSummary]:
+    """
+    Summarize the log files and directories of log files (see
+    :py:func:`pizero_gpslog.logreader.log_files_in`) in ``paths``, sorted
+    by path, using and updating each directory's
+    :py:data:`~.CACHE_FILENAME` if ``use_cache`` is True.
+    """
+    by_dir: Dict[str, List[str]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            by_dir.setdefault(path, []).extend(log_files_in(path))
+        else:
+            by_dir.setdefault(os.path.dirname(path), []).append(path)
+    result = []
+    for directory, files in by_dir.items():
+        if not use_cache:
+            summ = exact_summary if exact else quick_summary
+            result.extend(summ(f) for f in files)
+            continue
+        cache = SummaryCache(os.path.join(directory, CACHE_FILENAME))
+        result.extend(cache.summary(f, exact=exact) for f in files)
+        try:
+            cache.save()
+        except OSError as ex:
+            sys.stderr.write(
+                'WARNING: unable to write %s: %s\n' % (cache.fpath, ex)
+            )
+    return sorted(set(result), key=lambda s: s.path)
+
+
+def format_time(s: Optional[str]) -> str:
+    """Format a GPS time string for the table, to the second."""
+    if s is None:
+        return '-'
+    return datetime.fromtimestamp(
+        parse_gps_time(s), timezone.utc
+    ).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def format_duration(secs: Optional[float]) -> str:
+    """Format a number of seconds as ``H:MM:SS``."""
+    if secs is None:
+        return '-'
+    m, s = divmod(int(round(secs)), 60)
+    h, m = divmod(m, 60)
+    return '%d:%02d:%02d' % (h, m, s)
+
+
+def format_table(summaries: List[LogSummary]) -> str:
+    """
+    Format ``summaries`` as a table, with a total line. Estimated fix
+    counts are prefixed with ``~``; bounding boxes are in the same form as
+    ``pizero-gpslog-query --bbox``.
+    """
+    dirs = set(os.path.dirname(s.path) for s in summaries)
+    rows = [('FILE', 'START', 'END', 'DURATION', 'POINTS', 'BBOX')]
+    total_secs = 0.0
+    total_points = 0
+    for s in summaries:
+        name = os.path.basename(s.path) if len(dirs) == 1 else s.path
+        rows.append((
+            name, format_time(s.start), format_time(s.end),
+            format_duration(s.duration),
+            ('%d' if s.exact else '~%d') % s.points,
+            '-' if s.bbox is None else '%.5f,%.5f,%.5f,%.5f' % s.bbox
+        ))
+        total_secs += s.duration or 0.0
+        total_points += s.points
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    lines = []
+    for r in rows:
+        lines.append('  '.join([
+            r[0].ljust(widths[0]), r[1].ljust(widths[1]),
+            r[2].ljust(widths[2]), r[3].rjust(widths[3]),
+            r[4].rjust(widths[4]), r[5]
+        ]).rstrip())
+    lines.append('%d files, %s%d points, %s logged' % (
+        len(summaries),
+        '' if all(s.exact for s in summaries) else '~',
+        total_points, format_duration(total_secs)
+    ))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=sys.argv[1:]):
+    args = parse_args(argv)
+    for path in args.PATH:
+        if not os.path.exists(path):
+            raise SystemExit('ERROR: no such file or directory: %s' % path)
+    sys.stdout.write(format_table(
+        summarize(args.PATH, exact=args.exact, use_cache=args.cache)
+    ))
+
+
+def parse_args(argv):
+    """parse arguments/options"""
+    p = argparse.ArgumentParser(
+        description='List pizero-gpslog output files with the start and end '
+                    'time, duration, number of fixes and bounding box of '
+                    'each, reading only the start and end of each file.'
+    )
+    p.add_argument('-x', '--exact', dest='exact', action='store_true',
+                   default=False,
+                   help='read whole files (only the parts not already read, '
+                        'if cached) to count fixes exactly and find bounding '
+                        'boxes, instead of estimating the counts')
+    p.add_argument('-C', '--no-cache', dest='cache', action='store_false',
+                   default=True,
+                   help='neither use nor update the %s cache of exact '
+                        'summaries in each directory' % CACHE_FILENAME)
+    p.add_argument('PATH', nargs='*',
+                   default=[os.environ.get('OUT_DIR', os.getcwd())],
+                   help='log files, and/or directories of *.json log files '
+                        '(except *.gmc.json) '
+                        '(default: OUT_DIR environment variable, or current '
+                        'directory)')
+    args = p.parse_args(argv)
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+Persistent, incrementally-updated index of a directory of pizero-gpslog
+files, and the ``pizero-gpslog-query`` command that uses it to find the
+fixes logged in a time range, or in an area, without reading whole files.
+
+For each file, the index keeps a sparse list of time entries: every
+``every`` fixes, the latest GPS time seen so far and the byte offset, line
+number and fallback altitude to start reading at to get that fix next. A
+query finds the files overlapping its time range, looks up the entries
+bounding the range in each (using SQLite's B-tree indexes) and reads only
+the bytes between them. Because entries hold the latest time so far, a fix
+logged out of order is never missed at the start of a range; the end of a
+range assumes that times don't go backwards.
+
+For spatial queries, the world is divided into a grid of cells
+``cell_deg`` degrees square, and each run of consecutive fixes in the same
+cell is recorded as a range of the file (a run that the track returns to
+shortly after leaving is extended, so jitter across a cell boundary doesn't
+add a range per fix). A bounding box or radius query
+looks up the ranges in the cells it overlaps (with the ``(cell_y,
+cell_x)`` index), merges the ranges of each file and reads only those.
+
+The index is stored in a SQLite database (by default
+``.pizero-gpslog-index.sqlite`` in the directory). Updating it only reads
+complete lines added to each file since the last update, so it is cheap to
+update before every query, even while ``pizero-gpslog`` is appending to the
+current file.
+"""
+
+import os
+import sys
+import argparse
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from math import cos, floor, radians
+from typing import (
+    Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+)
+
+from gpxpy.geo import ONE_DEGREE, distance
+
+from pizero_gpslog.converter import EXPORTERS
+from pizero_gpslog.logreader import FixReader, FixRecord, log_files_in
+from pizero_gpslog.utils import parse_gps_time, set_log_debug, set_log_info
+
+logger = logging.getLogger(__name__)
+
+#: default index database file name, in the indexed directory
+INDEX_FILENAME = '.pizero-gpslog-index.sqlite'
+
+#: default grid cell size in degrees, for new indexes
+CELL_DEG = 0.01
+
+#: version of the index database schema; an index with a different version
+#: is discarded and rebuilt
+SCHEMA_VERSION = 2
+
+_TABLES = ['files', 'time_entries', 'cell_ranges', 'meta']
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)',
+    'CREATE TABLE IF NOT EXISTS files ('
+    ' id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, inode INTEGER,'
+    ' offset INTEGER NOT NULL, lineno INTEGER NOT NULL,'
+    ' prev_alt REAL NOT NULL, count INTEGER NOT NULL,'
+    ' first_time REAL, last_time REAL, run_id INTEGER)',
+    'CREATE TABLE IF NOT EXISTS time_entries ('
+    ' file_id INTEGER NOT NULL, time REAL NOT NULL, offset INTEGER NOT NULL,'
+    ' lineno INTEGER NOT NULL, prev_alt REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS time_entries_file_time'
+    ' ON time_entries (file_id, time)',
+    'CREATE TABLE IF NOT EXISTS cell_ranges ('
+    ' id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL,'
+    ' cell_x INTEGER NOT NULL, cell_y INTEGER NOT NULL,'
+    ' offset INTEGER NOT NULL, lineno INTEGER NOT NULL,'
+    ' prev_alt REAL NOT NULL, end_offset INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cell_ranges_cell'
+    ' ON cell_ranges (cell_y, cell_x)',
+    'CREATE INDEX IF NOT EXISTS cell_ranges_file ON cell_ranges (file_id)',
+]
+
+
+class ReadPosition(NamedTuple):
+    """Where to start reading a file to get a particular fix next."""
+
+    offset: int
+    lineno: int
+    prev_alt: float
+
+
+class FileRange(NamedTuple):
+    """A byte range of an indexed file to read for a query."""
+
+    path: str
+    start: ReadPosition
+
+    #: byte offset to stop reading at
+    end: int
+
+
+class LogIndex(object):
+    """
+    Index of the pizero-gpslog files directly in ``directory`` (see
+    :py:func:`pizero_gpslog.logreader.log_files_in`), stored in the SQLite
+    database at ``db_path`` (default: :py:data:`~.INDEX_FILENAME` in
+    ``directory``), with a time entry every ``every`` fixes. ``cell_deg`` is
+    the spatial grid cell size for a new index; an existing index keeps the
+    size it was created with.
+
+    When a track returns to a grid cell within ``merge_gap`` bytes of the
+    end of its previous run in that cell (as GPS jitter across a cell
+    boundary does on every fix), that run is extended instead of adding a
+    row, so a query of the cell may read up to ``merge_gap`` extra bytes
+    per run but the index doesn't grow by a row per fix.
+    """
+
+    def __init__(
+        self, directory: str, db_path: Optional[str] = None, every: int = 100,
+        cell_deg: float = CELL_DEG, merge_gap: int = 16384
+    ):
+        self._dir: str = directory
+        self._every: int = every
+        self._merge_gap: int = merge_gap
+        if db_path is None:
+            db_path = os.path.join(directory, INDEX_FILENAME)
+        self._db: sqlite3.Connection = sqlite3.connect(db_path)
+        with self._db:
+            version = self._db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                logger.info('Rebuilding index with old schema %d', version)
+                for table in _TABLES:
+                    self._db.execute('DROP TABLE IF EXISTS %s' % table)
+                self._db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+            for stmt in _SCHEMA:
+                self._db.execute(stmt)
+            self._db.execute(
+                'INSERT OR IGNORE INTO meta (key, value) VALUES '
+                '(\'cell_deg\', ?)', (cell_deg,)
+            )
+        #: spatial grid cell size in degrees
+        self.cell_deg: float = self._db.execute(
+            'SELECT value FROM meta WHERE key=\'cell_deg\''
+        ).fetchone()[0]
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Return the ``(x, y)`` grid cell containing a point."""
+        return floor(lon / self.cell_deg), floor(lat / self.cell_deg)
+
+    def close(self):
+        self._db.close()
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the files in the directory: index
+        new lines of growing files and all of new files, re-index files that
+        were replaced or truncated, and drop files that were removed.
+        Returns the number of fixes newly indexed.
+        """
+        names = set(os.path.basename(x) for x in log_files_in(self._dir))
+        total = 0
+        with self._db:
+            for file_id, name in self._db.execute(
+                'SELECT id, name FROM files'
+            ).fetchall():
+                if name not in names:
+                    logger.info('Removing %s from index', name)
+                    self._forget(file_id)
+            for name in sorted(names):
+                total += self._update_file(name)
+        return total
+
+    def _forget(self, file_id: int):
+        self._db.execute('DELETE FROM files WHERE id=?', (file_id,))
+        self._db.execute('DELETE FROM time_entries WHERE file_id=?', (file_id,))
+        self._db.execute('DELETE FROM cell_ranges WHERE file_id=?', (file_id,))
+
+    def _update_file(self, name: str) -> int:
+        path = os.path.join(self._dir, name)
+        st = os.stat(path)
+        row = self._db.execute(
+            'SELECT id, inode, offset, lineno, prev_alt, count, first_time, '
+            'last_time, run_id FROM files WHERE name=?', (name,)
+        ).fetchone()
+        if row is not None and (row[1] != st.st_ino or row[2] > st.st_size):
+            logger.info('%s was replaced or truncated; re-indexing', name)
+            self._forget(row[0])
+            row = None
+        if row is None:
+            file_id = self._db.execute(
+                'INSERT INTO files (name, inode, offset, lineno, prev_alt, '
+                'count) VALUES (?, ?, 0, 0, 0.0, 0)', (name, st.st_ino)
+            ).lastrowid
+            offset, lineno, prev_alt, count = 0, 0, 0.0, 0
+            first_time = last_time = run_id = None
+        else:
+            file_id, _, offset, lineno, prev_alt, count, first_time, \
+                last_time, run_id = row
+            if offset == st.st_size:
+                return 0
+        # the run of fixes in one grid cell that the last fix was part of
+        run_cell = None
+        if run_id is not None:
+            run_cell = self._db.execute(
+                'SELECT cell_x, cell_y FROM cell_ranges WHERE id=?', (run_id,)
+            ).fetchone()
+        # the runs ended within merge_gap bytes, by cell, to extend if the
+        # track returns to that cell
+        recent: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for rid, cell_x, cell_y, end in self._db.execute(
+            'SELECT id, cell_x, cell_y, end_offset FROM cell_ranges WHERE '
+            'file_id=? AND end_offset >= ? ORDER BY end_offset',
+            (file_id, offset - self._merge_gap)
+        ):
+            if rid != run_id:
+                recent[(cell_x, cell_y)] = (rid, end)
+        reader = FixReader(
+            path, offset=offset, lineno=lineno, prev_alt=prev_alt,
+            errors=None
+        )
+        pos = ReadPosition(reader.offset, reader.lineno, reader.prev_alt)
+        entries = []
+        new = 0
+        for fix in reader.fixes(complete_only=True):
+            t = parse_gps_time(fix.time)
+            if first_time is None:
+                first_time = last_time = t
+            first_time = min(first_time, t)
+            last_time = max(last_time, t)
+            if count % self._every == 0:
+                entries.append((file_id, last_time) + tuple(pos))
+            cell = self.cell(fix.lat, fix.lon)
+            if cell != run_cell:
+                if run_id is not None:
+                    self._end_run(run_id, pos.offset)
+                    recent[run_cell] = (run_id, pos.offset)
+                run_id = self._start_run(file_id, cell, pos, recent)
+                run_cell = cell
+            count += 1
+            new += 1
+            pos = ReadPosition(reader.offset, reader.lineno, reader.prev_alt)
+        if run_id is not None:
+            self._end_run(run_id, reader.offset)
+        self._db.executemany(
+            'INSERT INTO time_entries (file_id, time, offset, lineno, '
+            'prev_alt) VALUES (?, ?, ?, ?, ?)', entries
+        )
+        self._db.execute(
+            'UPDATE files SET offset=?, lineno=?, prev_alt=?, count=?, '
+            'first_time=?, last_time=?, run_id=? WHERE id=?', (
+                reader.offset, reader.lineno, reader.prev_alt, count,
+                first_time, last_time, run_id, file_id
+            )
+        )
+        logger.debug('Indexed %d new fixes in %s', new, name)
+        return new
+
+    def _start_run(
+        self, file_id: int, cell: Tuple[int, int], pos: ReadPosition,
+        recent: Dict[Tuple[int, int], Tuple[int, int]]
+    ) -> int:
+        """
+        Return the id of the run of fixes in ``cell`` starting at ``pos``:
+        the cell's run in ``recent`` if it ended within ``merge_gap`` bytes,
+        otherwise a new one. Runs that ended too long ago are removed from
+        ``recent``.
+        """
+        for k in [
+            k for k, v in recent.items()
+            if pos.offset - v[1] > self._merge_gap
+        ]:
+            del recent[k]
+        if cell in recent:
+            return recent.pop(cell)[0]
+        return self._db.execute(
+            'INSERT INTO cell_ranges (file_id, cell_x, cell_y, offset, '
+            'lineno, prev_alt, end_offset) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (file_id,) + cell + tuple(pos) + (pos.offset,)
+        ).lastrowid
+
+    def _end_run(self, run_id: int, offset: int):
+        self._db.execute(
+            'UPDATE cell_ranges SET end_offset=? WHERE id=?', (offset, run_id)
+        )
+
+    def time_ranges(self, start: float, end: float) -> List[FileRange]:
+        """
+        Return the byte ranges of indexed files that contain all of the
+        fixes with times from ``start`` to ``end`` (inclusive), in time
+        order.
+        """
+        result = []
+        for file_id, name, offset in self._db.execute(
+            'SELECT id, name, offset FROM files WHERE first_time <= ? AND '
+            'last_time >= ? ORDER BY first_time, name', (end, start)
+        ).fetchall():
+            row = self._db.execute(
+                'SELECT offset, lineno, prev_alt FROM time_entries WHERE '
+                'file_id=? AND time < ? ORDER BY time DESC, offset DESC '
+                'LIMIT 1', (file_id, start)
+            ).fetchone()
+            first = ReadPosition(*row) if row else ReadPosition(0, 0, 0.0)
+            row = self._db.execute(
+                'SELECT offset FROM time_entries WHERE file_id=? AND time > ? '
+                'ORDER BY time, offset LIMIT 1', (file_id, end)
+            ).fetchone()
+            result.append(FileRange(
+                os.path.join(self._dir, name), first,
+                row[0] if row else offset
+            ))
+        return result
+
+    def fixes_between(
+        self, start: float, end: float
+    ) -> Iterator[Tuple[str, FixRecord]]:
+        """
+        Yield ``(file path, fix)`` for every indexed fix with a time from
+        ``start`` to ``end`` (inclusive), reading only the ranges found by
+        :py:meth:`~.time_ranges`.
+        """
+        return self.read_ranges(
+            self.time_ranges(start, end),
+            lambda fix: start <= parse_gps_time(fix.time) <= end
+        )
+
+    def bbox_ranges(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> List[FileRange]:
+        """
+        Return the byte ranges of indexed files that contain all of the
+        fixes inside a bounding box, merged and in file and offset order.
+        """
+        min_x, min_y = self.cell(min_lat, min_lon)
+        max_x, max_y = self.cell(max_lat, max_lon)
+        result: List[FileRange] = []
+        for name, offset, lineno, prev_alt, end in self._db.execute(
+            'SELECT f.name, c.offset, c.lineno, c.prev_alt, c.end_offset '
+            'FROM cell_ranges c JOIN files f ON f.id = c.file_id WHERE '
+            'c.cell_y BETWEEN ? AND ? AND c.cell_x BETWEEN ? AND ? '
+            'ORDER BY f.name, c.offset', (min_y, max_y, min_x, max_x)
+        ):
+            path = os.path.join(self._dir, name)
+            if result and result[-1].path == path and \
+                    offset <= result[-1].end:
+                result[-1] = result[-1]._replace(end=max(end, result[-1].end))
+                continue
+            result.append(
+                FileRange(path, ReadPosition(offset, lineno, prev_alt), end)
+            )
+        return result
+
+    def fixes_in_bbox(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> Iterator[Tuple[str, FixRecord]]:
+        """
+        Yield ``(file path, fix)`` for every indexed fix inside a bounding
+        box, reading only the ranges found by :py:meth:`~.bbox_ranges`.
+        """
+        return self.read_ranges(
+            self.bbox_ranges(min_lat, min_lon, max_lat, max_lon),
+            lambda fix: min_lat <= fix.lat <= max_lat and
+            min_lon <= fix.lon <= max_lon
+        )
+
+    def fixes_near(
+        self, lat: float, lon: float, radius: float
+    ) -> Iterator[Tuple[str, FixRecord]]:
+        """
+        Yield ``(file path, fix)`` for every indexed fix within ``radius``
+        metres of a point, reading only the ranges of the bounding box
+        around the circle.
+        """
+        return self.read_ranges(
+            self.bbox_ranges(*radius_bbox(lat, lon, radius)),
+            lambda fix: distance(
+                lat, lon, None, fix.lat, fix.lon, None, haversine=True
+            ) <= radius
+        )
+
+    def read_ranges(
+        self, ranges: List[FileRange],
+        predicate: Callable[[FixRecord], bool] = lambda fix: True
+    ) -> Iterator[Tuple[str, FixRecord]]:
+        """
+        Yield ``(file path, fix)`` for each fix in ``ranges`` for which
+        ``predicate`` is True.
+        """
+        for rng in ranges:
+            reader = FixReader(
+                rng.path, offset=rng.start.offset, lineno=rng.start.lineno,
+                prev_alt=rng.start.prev_alt, errors=None, end=rng.end
+            )
+            for fix in reader.fixes():
+                if predicate(fix):
+                    yield rng.path, fix
+
+
+def radius_bbox(
+    lat: float, lon: float, radius: float
+) -> Tuple[float, float, float, float]:
+    """
+    Return the ``(min_lat, min_lon, max_lat, max_lon)`` bounding box of the
+    circle of ``radius`` metres around a point.
+    """
+    dlat = radius / ONE_DEGREE
+    coslat = cos(radians(min(abs(lat) + dlat, 90.0)))
+    dlon = 180.0 if coslat < 1e-9 else min(180.0, dlat / coslat)
+    return (
+        max(-90.0, lat - dlat), max(-180.0, lon - dlon),
+        min(90.0, lat + dlat), min(180.0, lon + dlon)
+    )
+
+
+def parse_point(s: str, count: int) -> List[float]:
+    """Parse ``count`` comma-separated numbers, for argparse."""
+    try:
+        values = [float(x) for x in s.split(',')]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise argparse.ArgumentTypeError(
+            'expected %d comma-separated numbers: %s' % (count, s)
+        )
+    return values
+
+
+def parse_time(s: str) -> float:
+    """
+    Parse an ISO8601 date and time (e.g. ``2020-09-11T14:00`` or
+    ``2020-09-11 14:00:00``) to a timestamp; naive times are UTC.
+    """
+    dt = datetime.fromisoformat(s.rstrip('Z'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def main(argv=sys.argv[1:]):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING, format='[%(asctime)s %(levelname)s] %(message)s'
+    )
+    if args.verbose > 1:
+        set_log_debug(logging.getLogger())
+    elif args.verbose == 1:
+        set_log_info(logging.getLogger())
+    if args.format not in EXPORTERS:
+        raise SystemExit('ERROR: unknown output format: %s' % args.format)
+    index = LogIndex(
+        args.directory, db_path=args.index, every=args.every,
+        cell_deg=args.cell_deg
+    )
+    try:
+        if args.update:
+            count = index.update()
+            logger.info('Indexed %d new fixes', count)
+        by_time = args.start is not None or args.end is not None
+        if not by_time and args.bbox is None and args.near is None:
+            return
+        start = parse_time(args.start) if args.start else float('-inf')
+        end = parse_time(args.end) if args.end else float('inf')
+        if args.near is not None:
+            results = index.fixes_near(args.near[0], args.near[1], args.radius)
+        elif args.bbox is not None:
+            results = index.fixes_in_bbox(*args.bbox)
+        else:
+            results = index.fixes_between(start, end)
+            by_time = False
+        if by_time:
+            results = (
+                (path, fix) for path, fix in results
+                if start <= parse_gps_time(fix.time) <= end
+            )
+        if args.files:
+            counts: Dict[str, int] = {}
+            for path, _ in results:
+                counts[path] = counts.get(path, 0) + 1
+            for path, count in counts.items():
+                print('%s\t%d' % (path, count))
+            return
+        out = sys.stdout if args.output is None else open(args.output, 'w')
+        try:
+            writer = EXPORTERS[args.format](out, 'pizero-gpslog-query')
+            count = 0
+            for _, fix in results:
+                writer.write_point(fix)
+                count += 1
+            writer.close()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        sys.stderr.write('%d matching fixes\n' % count)
+    finally:
+        index.close()
+
+
+def parse_args(argv):
+    """parse arguments/options"""
+    p = argparse.ArgumentParser(
+        description='Update the index of a directory of pizero-gpslog output '
+                    'files, and find the fixes logged in a time range and/or '
+                    'area using it.'
+    )
+    p.add_argument('-d', '--directory', dest='directory', action='store',
+                   type=str, default=os.environ.get('OUT_DIR', os.getcwd()),
+                   help='directory of log files (default: OUT_DIR '
+                        'environment variable, or current directory)')
+    p.add_argument('-i', '--index', dest='index', action='store', type=str,
+                   default=None,
+                   help='index database path (default: %s in the '
+                        'directory)' % INDEX_FILENAME)
+    p.add_argument('-U', '--no-update', dest='update', action='store_false',
+                   default=True,
+                   help='query the index without updating it first')
+    p.add_argument('-e', '--every', dest='every', action='store', type=int,
+                   default=100,
+                   help='when indexing, add a time entry every this many '
+                        'fixes (default: 100)')
+    p.add_argument('-c', '--cell-deg', dest='cell_deg', action='store',
+                   type=float, default=CELL_DEG,
+                   help='when creating the index, the spatial grid cell size '
+                        'in degrees (default: %s)' % CELL_DEG)
+    p.add_argument('-s', '--start', dest='start', action='store', type=str,
+                   default=None,
+                   help='find fixes at or after this ISO8601 time (UTC unless '
+                        'an offset is given), e.g. 2020-09-11T14:00')
+    p.add_argument('-E', '--end', dest='end', action='store', type=str,
+                   default=None,
+                   help='find fixes at or before this ISO8601 time')
+    p.add_argument('-b', '--bbox', dest='bbox', action='store',
+                   type=lambda x: parse_point(x, 4), default=None,
+                   metavar='MIN_LAT,MIN_LON,MAX_LAT,MAX_LON',
+                   help='find fixes inside this bounding box (which must not '
+                        'cross the antimeridian)')
+    p.add_argument('-n', '--near', dest='near', action='store',
+                   type=lambda x: parse_point(x, 2), default=None,
+                   metavar='LAT,LON',
+                   help='find fixes within --radius of this point')
+    p.add_argument('-r', '--radius', dest='radius', action='store',
+                   type=float, default=100.0,
+                   help='radius in metres for --near (default: 100)')
+    p.add_argument('-l', '--files', dest='files', action='store_true',
+                   default=False,
+                   help='only list the files with matching fixes, and the '
+                        'number of matching fixes in each')
+    p.add_argument('-f', '--format', dest='format', action='store', type=str,
+                   default='csv',
+                   help='output format for matching fixes; one of the '
+                        'pizero-gpslog-convert formats (default: csv)')
+    p.add_argument('-o', '--output', dest='output', action='store', type=str,
+                   default=None,
+                   help='write matching fixes to this file (default: STDOUT)')
+    p.add_argument('-v', '--verbose', dest='verbose', action='count',
+                   default=0,
+                   help='verbose output. specify twice for debug-level '
+                        'output.')
+    args = p.parse_args(argv)
+    return args
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,503 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Lazy, constant-memory reading of pizero-gpslog output files.
+
+Fixes are read with a field-projecting decoder by default: instead of
+decoding each whole line (including the large ``sky.satellites`` array),
+only the flat TPV, SKY and (if needed) GST objects are sliced out of the
+line and decoded, and lines without a 2D or 3D fix are rejected after
+decoding only their TPV. Anything the projection doesn't expect falls back
+to decoding the full line. If `orjson <https://github.com/ijl/orjson>`_ is
+installed it is used to decode the projected objects.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from math import isnan
+from typing import (
+    Any, BinaryIO, Callable, Deque, Iterator, List, NamedTuple, Optional,
+    TextIO, Tuple
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from pizero_gpslog.utils import process_context
+
+#: JSON decoding function used by default by the projecting decoder
+default_loads: Callable[[str], Any] = json.loads if orjson is None \
+    else orjson.loads
+
+_TPV_RE = re.compile(r'"tpv":\s*\[\s*\{')
+_SKY_RE = re.compile(r'"sky":\s*\[\s*\{')
+_GST_RE = re.compile(r'"gst":\s*\[\s*\{')
+_SATS_RE = re.compile(r'"satellites":\s*\[')
+
+
+class FixRecord(NamedTuple):
+    """The fields of one logged fix that the converter uses."""
+
+    #: 1-based line number in the log file
+    lineno: int
+
+    #: gpsd ISO8601 UTC time string of the fix
+    time: str
+
+    lat: float
+    lon: float
+
+    #: altitude in metres; from the TPV, else the GST, else the previous fix
+    alt: float
+
+    #: speed in metres per second
+    speed: float
+
+    #: 2 or 3; see :py:class:`pizero_gpslog.utils.FixType`
+    mode: int
+
+    hdop: Optional[float] = None
+    vdop: Optional[float] = None
+    pdop: Optional[float] = None
+
+    #: number of satellites in the SKY report, if present
+    satellites: Optional[int] = None
+
+
+#: suffixes of ``*.json`` files that are written next to logs but are not
+#: logs to list, index or convert, such as the output of
+#: ``pizero-gpslog-gmc-history``, which has a copy of every fix in its log
+NOT_LOG_SUFFIXES: Tuple[str, ...] = ('.gmc.json',)
+
+
+def log_files_in(directory: str) -> List[str]:
+    """
+    Return the sorted paths of the pizero-gpslog files directly in
+    ``directory``: the ``*.json`` files, except those ending with one of
+    :py:data:`~.NOT_LOG_SUFFIXES`.
+    """
+    return sorted(
+        x for x in glob(os.path.join(directory, '*.json'))
+        if not x.endswith(NOT_LOG_SUFFIXES)
+    )
+
+
+def iter_records(
+    fpath: str, errors: Optional[TextIO] = sys.stderr
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Lazily yield ``(line number, decoded dict)`` for each non-empty line of
+    the log at ``fpath``, reading one line at a time. Lines that are not
+    valid JSON are skipped, with a message written to ``errors`` (if not
+    None).
+    """
+    for lineno, line, _ in _iter_lines(fpath):
+        item = _decode_line(line, lineno, json.loads, errors)
+        if item is not None:
+            yield lineno, item
+
+
+def _iter_lines(
+    fpath: str, offset: int = 0, lineno: int = 0, complete_only: bool = False,
+    end: Optional[int] = None
+) -> Iterator[Tuple[int, str, int]]:
+    """
+    Yield ``(line number, stripped line, end offset)`` for non-empty lines,
+    starting at byte ``offset`` (which is at the start of line ``lineno +
+    1``); end offset is the byte offset just after the line. If
+    ``complete_only`` is True, stop at a final line without a newline, as
+    it may still be being written. If ``end`` is given, the file is memory
+    mapped and only lines starting before that offset are read.
+    """
+    with open(fpath, 'rb') as fh:
+        if end is not None:
+            yield from _iter_mapped_lines(fh, offset, lineno, end)
+            return
+        fh.seek(offset)
+        for raw in fh:
+            if complete_only and not raw.endswith(b'\n'):
+                return
+            offset += len(raw)
+            lineno += 1
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if len(line) != 0:
+                yield lineno, line, offset
+
+
+def _iter_mapped_lines(
+    fh: BinaryIO, offset: int, lineno: int, end: int
+) -> Iterator[Tuple[int, str, int]]:
+    """:py:func:`~._iter_lines` for a byte range of a memory-mapped file."""
+    if offset >= end:
+        return
+    with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = min(end, len(mm))
+        while offset < end:
+            stop = mm.find(b'\n', offset, end) + 1 or end
+            raw = mm[offset:stop]
+            offset = stop
+            lineno += 1
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if len(line) != 0:
+                yield lineno, line, offset
+
+
+def _decode_line(
+    line: str, lineno: int, loads: Callable[[str], Any],
+    errors: Optional[TextIO]
+) -> Optional[dict]:
+    """Decode a whole line, or return None and report it if invalid."""
+    try:
+        return loads(line)
+    except ValueError as ex:
+        if errors is not None:
+            errors.write(
+                'Unable to decode JSON on line %s; skipping. '
+                '(ERROR: %s)\n' % (lineno, ex)
+            )
+    return None
+
+
+def is_fix(record: dict) -> bool:
+    """Whether a decoded log line has a 2D or 3D fix."""
+    return 'tpv' in record and record['tpv'][0].get('mode', 0) >= 2
+
+
+def fix_record(lineno: int, item: dict, prev_alt: float) -> FixRecord:
+    """
+    Build a :py:class:`~.FixRecord` from a fully-decoded log line with a
+    fix; ``prev_alt`` is used if neither the TPV nor GST has an altitude.
+    """
+    tpv = item['tpv'][0]
+    sky = item['sky'][0]
+    return FixRecord(
+        lineno=lineno,
+        time=tpv['time'],
+        lat=tpv['lat'],
+        lon=tpv['lon'],
+        alt=tpv.get('alt', item['gst'][0].get('alt', prev_alt)),
+        speed=tpv['speed'],
+        mode=tpv['mode'],
+        hdop=sky.get('hdop', None),
+        vdop=sky.get('vdop', None),
+        pdop=sky.get('pdop', None),
+        satellites=(
+            len(sky['satellites']) if 'satellites' in sky else None
+        )
+    )
+
+
+def _flat_object(line: str, start: int, loads: Callable[[str], Any]) -> dict:
+    """
+    Decode the object starting at index ``start`` of ``line``, which must
+    not contain any nested objects.
+    """
+    return loads(line[start:line.index('}', start) + 1])
+
+
+def project_fix(
+    line: str, lineno: int, prev_alt: float,
+    loads: Callable[[str], Any] = default_loads
+) -> Optional[FixRecord]:
+    """
+    Build a :py:class:`~.FixRecord` from a log line, decoding only the
+    parts of it that are needed. Returns None if the line has no 2D or 3D
+    fix. Raises ValueError if the line isn't in the form that this expects
+    (including if it appears truncated), in which case the caller should
+    decode the whole line instead.
+    """
+    if not line.endswith('}'):
+        raise ValueError('Line appears truncated')
+    m = _TPV_RE.search(line)
+    if m is None:
+        if '"tpv"' in line:
+            raise ValueError('Unexpected TPV format')
+        return None
+    tpv = _flat_object(line, m.end() - 1, loads)
+    if tpv.get('mode', 0) < 2:
+        return None
+    m = _SKY_RE.search(line)
+    if m is None:
+        raise ValueError('No SKY object found')
+    start = m.end() - 1
+    sats = _SATS_RE.search(line, start)
+    if sats is not None and sats.start() < line.index('}', start):
+        # decode the SKY with an empty satellites list; just count them
+        close = line.index(']', sats.end())
+        num_sats = line.count('{', sats.end(), close)
+        sky = loads(
+            line[start:sats.end()] + line[close:line.index('}', close) + 1]
+        )
+    else:
+        num_sats = None
+        sky = _flat_object(line, start, loads)
+    if 'alt' in tpv:
+        alt = tpv['alt']
+    else:
+        m = _GST_RE.search(line)
+        if m is None:
+            raise ValueError('No GST object found')
+        alt = _flat_object(line, m.end() - 1, loads).get('alt', prev_alt)
+    return FixRecord(
+        lineno=lineno,
+        time=tpv['time'],
+        lat=tpv['lat'],
+        lon=tpv['lon'],
+        alt=alt,
+        speed=tpv['speed'],
+        mode=tpv['mode'],
+        hdop=sky.get('hdop', None),
+        vdop=sky.get('vdop', None),
+        pdop=sky.get('pdop', None),
+        satellites=num_sats
+    )
+
+
+def decode_fix(
+    line: str, lineno: int, prev_alt: float,
+    loads: Callable[[str], Any] = default_loads,
+    errors: Optional[TextIO] = None, fast: bool = True
+) -> Optional[FixRecord]:
+    """
+    Build a :py:class:`~.FixRecord` from a single log line, or return None if
+    it has no 2D or 3D fix or (after reporting it to ``errors``) isn't valid
+    JSON. If ``fast`` is True, :py:func:`~.project_fix` is tried first.
+    """
+    if fast:
+        try:
+            return project_fix(line, lineno, prev_alt, loads=loads)
+        except ValueError:
+            pass
+    item = _decode_line(line, lineno, loads, errors)
+    if item is None or not is_fix(item):
+        return None
+    return fix_record(lineno, item, prev_alt)
+
+
+class FixReader(object):
+    """
+    Read the fixes in a log from a byte offset onwards, keeping track of the
+    state needed to carry on reading from where it left off later: the
+    :py:attr:`~.offset` and :py:attr:`~.lineno` of the end of the last line
+    read, and the altitude used for fixes with none (:py:attr:`~.prev_alt`).
+
+    If ``fast`` is True, lines are read with :py:func:`~.project_fix`,
+    falling back to decoding the full line if it can't be projected;
+    otherwise every line is fully decoded. ``loads`` is the JSON decoding
+    function to use (by default, :py:data:`~.default_loads` if ``fast``,
+    else :py:func:`json.loads`). If ``end`` is given, the file is memory
+    mapped and reading stops at that byte offset.
+    """
+
+    def __init__(
+        self, fpath: str, offset: int = 0, lineno: int = 0,
+        prev_alt: float = 0.0, errors: Optional[TextIO] = sys.stderr,
+        fast: bool = True, loads: Optional[Callable[[str], Any]] = None,
+        end: Optional[int] = None
+    ):
+        self._fpath: str = fpath
+        self._end: Optional[int] = end
+        self._errors: Optional[TextIO] = errors
+        self._fast: bool = fast
+        if loads is None:
+            loads = default_loads if fast else json.loads
+        self._loads: Callable[[str], Any] = loads
+        self.offset: int = offset
+        self.lineno: int = lineno
+        self.prev_alt: float = prev_alt
+
+    def fixes(self, complete_only: bool = False) -> Iterator[FixRecord]:
+        """
+        Lazily yield a :py:class:`~.FixRecord` for each line with a 2D or 3D
+        fix from the current offset on. If ``complete_only`` is True, a
+        final line with no newline is left unread.
+        """
+        errors = self._errors
+        loads = self._loads
+        for lineno, line, offset in _iter_lines(
+            self._fpath, self.offset, self.lineno, complete_only, self._end
+        ):
+            self.lineno = lineno
+            self.offset = offset
+            try:
+                rec = decode_fix(
+                    line, lineno, self.prev_alt, loads=loads, errors=errors,
+                    fast=self._fast
+                )
+            except Exception:
+                if errors is not None:
+                    errors.write('Exception loading line %d:\n' % lineno)
+                raise
+            if rec is None:
+                continue
+            self.prev_alt = rec.alt
+            yield rec
+
+
+def iter_fixes(
+    fpath: str, errors: Optional[TextIO] = sys.stderr, fast: bool = True,
+    loads: Optional[Callable[[str], Any]] = None
+) -> Iterator[FixRecord]:
+    """
+    Lazily yield a :py:class:`~.FixRecord` for each line of the log at
+    ``fpath`` with a 2D or 3D fix. Missing altitudes are resolved as they
+    are read, so only the previous fix's altitude is kept in memory. See
+    :py:class:`~.FixReader` for ``fast`` and ``loads``.
+    """
+    yield from FixReader(fpath, errors=errors, fast=fast, loads=loads).fixes()
+
+
+#: default size in bytes of the chunks decoded in parallel by
+#: :py:func:`~.iter_fixes_parallel`
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def chunk_bounds(fpath: str, chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split the file at ``fpath`` into ``(start, end)`` byte ranges of about
+    ``chunk_size`` bytes, each ending just after a newline (or at the end of
+    the file), found by memory mapping the file.
+    """
+    size = os.path.getsize(fpath)
+    result = []
+    if size == 0:
+        return result
+    with open(fpath, 'rb') as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + max(chunk_size, 1), size)
+            if end < size:
+                end = mm.find(b'\n', end - 1) + 1 or size
+            result.append((start, end))
+            start = end
+    return result
+
+
+def _count_lines(fpath: str, start: int, end: int) -> int:
+    """Count the newlines in a byte range of ``fpath``, by memory mapping."""
+    count = 0
+    with open(fpath, 'rb') as fh, \
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for pos in range(start, end, CHUNK_SIZE):
+            count += mm[pos:min(pos + CHUNK_SIZE, end)].count(b'\n')
+    return count
+
+
+def _read_chunk(
+    fpath: str, start: int, end: int, lineno: int, fast: bool
+) -> Tuple[List[FixRecord], str, Optional[Exception]]:
+    """
+    Read the fixes in one chunk in a worker process. Altitudes that would
+    come from a previous chunk are NaN, for the caller to fill in. Returns
+    the fixes, any error messages, and the exception that stopped reading
+    (if any).
+    """
+    errors = io.StringIO()
+    reader = FixReader(
+        fpath, offset=start, lineno=lineno, prev_alt=float('nan'),
+        errors=errors, fast=fast, end=end
+    )
+    fixes: List[FixRecord] = []
+    try:
+        for fix in reader.fixes():
+            fixes.append(fix)
+    except Exception as ex:
+        return fixes, errors.getvalue(), ex
+    return fixes, errors.getvalue(), None
+
+
+def iter_fixes_parallel(
+    fpath: str, jobs: Optional[int] = None, errors: Optional[TextIO] = sys.stderr,
+    fast: bool = True, chunk_size: int = CHUNK_SIZE
+) -> Iterator[FixRecord]:
+    """
+    Like :py:func:`~.iter_fixes`, but split the file into newline-aligned
+    chunks (see :py:func:`~.chunk_bounds`) that are decoded from memory maps
+    in a pool of ``jobs`` processes (default: one per CPU core). Newlines in
+    the chunks are counted first so each one starts at the right line
+    number; results (and error messages) are then yielded in file order,
+    with at most two chunks per process in flight at once, so memory use is
+    bounded regardless of the size of the file. The workers are started
+    with :py:func:`~pizero_gpslog.utils.process_context`.
+    """
+    bounds = chunk_bounds(fpath, chunk_size)
+    if not bounds:
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=process_context()
+    ) as executor:
+        counts = list(executor.map(
+            _count_lines, [fpath] * len(bounds), *zip(*bounds)
+        ))
+        linenos = [0]
+        for count in counts[:-1]:
+            linenos.append(linenos[-1] + count)
+        todo = iter(zip(bounds, linenos))
+        pending: Deque = deque()
+
+        def submit():
+            for (start, end), lineno in todo:
+                pending.append(executor.submit(
+                    _read_chunk, fpath, start, end, lineno, fast
+                ))
+                return
+
+        for _ in range(2 * jobs):
+            submit()
+        prev_alt = 0.0
+        while pending:
+            fixes, messages, ex = pending.popleft().result()
+            submit()
+            if errors is not None:
+                errors.write(messages)
+            for fix in fixes:
+                if isnan(fix.alt):
+                    fix = fix._replace(alt=prev_alt)
+                prev_alt = fix.alt
+                yield fix
+            if ex is not None:
+                raise ex
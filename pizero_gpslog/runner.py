@@ -37,19 +37,24 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import os
 import logging
+import signal
 import time
 import json
-from typing import Optional
+from typing import Optional, Tuple
 from _io import TextIOWrapper
-from importlib import import_module
 
 from pizero_gpslog.gpsd import (
     GpsClient, NoActiveGpsError, NoFixError, GpsResponse
 )
+from pizero_gpslog.logreader import fix_record, is_fix
+from pizero_gpslog.tripstats import RunningStats, summary_path, write_summary
 from pizero_gpslog.version import VERSION, PROJECT_URL
-from pizero_gpslog.utils import set_log_info, set_log_debug, FixType
+from pizero_gpslog.utils import (
+    set_log_info, set_log_debug, FixType, parse_class_list, LatencyStats,
+    parse_gps_time
+)
 from pizero_gpslog.displaymanager import DisplayManager
-from pizero_gpslog.extradata.base import BaseExtraDataProvider
+from pizero_gpslog.extradatamanager import ExtraDataManager
 
 if 'LED_PIN_RED' in os.environ and 'LED_PIN_GREEN' in os.environ:
     from gpiozero import LED
@@ -58,6 +63,9 @@ else:
 
 logger = logging.getLogger(__name__)
 
+#: Metres per odometer unit, for each ``DISPLAY_ODOMETER`` value
+ODOMETER_UNITS = {'km': 1000.0, 'mi': 1609.344}
+
 
 class EmptyExtraData:
 
@@ -67,6 +75,12 @@ class EmptyExtraData:
     def start(self):
         pass
 
+    def stop(self):
+        pass
+
+    def sample_at(self, t: float, interpolate: bool = False):
+        return self.data, None
+
 
 class GpsLogger(object):
 
@@ -91,38 +105,107 @@ class GpsLogger(object):
         )
         logger.debug('Writing logs in: %s', self.outdir)
         self._fh: Optional[TextIOWrapper] = None
+        self._outfile: Optional[str] = None
+        self._packet_received: float = 0.0
+        self._pending: Optional[Tuple[dict, float]] = None
+        self._extra_data_align: str = os.environ.get(
+            'EXTRA_DATA_ALIGN', 'nearest'
+        )
+        if self._extra_data_align not in ['latest', 'nearest', 'interpolate']:
+            raise RuntimeError(
+                'Invalid EXTRA_DATA_ALIGN value: %s' % self._extra_data_align
+            )
+        self._sleep_latency: LatencyStats = LatencyStats()
+        self._loop_latency: LatencyStats = LatencyStats()
+        self._latency_log_interval: int = int(
+            os.environ.get('LATENCY_LOG_INTERVAL', '60')
+        )
+        #: trip statistics for the fixes written to the current file
+        self._stats: RunningStats = RunningStats()
+        self._prev_alt: float = 0.0
+        self._summary_interval: int = int(
+            os.environ.get('SUMMARY_INTERVAL', '60')
+        )
+        self._odometer: str = os.environ.get('DISPLAY_ODOMETER', '')
+        if self._odometer not in ['', 'none'] + list(ODOMETER_UNITS):
+            raise RuntimeError(
+                'Invalid DISPLAY_ODOMETER value: %s' % self._odometer
+            )
         self._display: Optional[DisplayManager] = None
         if 'DISPLAY_CLASS' in os.environ:
-            modname, clsname = os.environ['DISPLAY_CLASS'].split(':')
-            self._display = DisplayManager(modname, clsname)
+            self._display = DisplayManager(
+                parse_class_list(os.environ['DISPLAY_CLASS'])
+            )
             self._display.set_fix_type(FixType.NO_GPS)
             self._display.start()
         if 'EXTRA_DATA_CLASS' in os.environ:
-            modname, clsname = os.environ['EXTRA_DATA_CLASS'].split(':')
-            logger.debug('Import %s:%s', modname, clsname)
-            mod = import_module(modname)
-            extra_cls: BaseExtraDataProvider.__class__ = getattr(
-                mod, clsname
+            self._extra_data_instance = ExtraDataManager(
+                parse_class_list(os.environ['EXTRA_DATA_CLASS'])
             )
-            self._extra_data_instance = extra_cls()
             self._extra_data_instance.start()
         else:
             self._extra_data_instance = EmptyExtraData()
 
     def run(self):
         self.LED2.off()
-        while True:
-            time.sleep(self.interval_sec)
-            logger.debug('Reading current position from gpsd')
-            try:
-                packet = self.gps.current_fix
-            except NoActiveGpsError:
-                packet = GpsResponse()
-                packet.mode = 0
-            except NoFixError:
-                packet = GpsResponse()
-                packet.mode = 1
-            self._handle_packet(packet)
+        try:
+            while True:
+                start = time.monotonic()
+                time.sleep(self.interval_sec)
+                woke = time.monotonic()
+                self._sleep_latency.add(
+                    max(0.0, woke - start - self.interval_sec)
+                )
+                logger.debug('Reading current position from gpsd')
+                try:
+                    packet = self.gps.current_fix
+                    self._packet_received = time.time()
+                except NoActiveGpsError:
+                    packet = GpsResponse()
+                    packet.mode = 0
+                except NoFixError:
+                    packet = GpsResponse()
+                    packet.mode = 1
+                self._handle_packet(packet)
+                self._loop_latency.add(time.monotonic() - woke)
+                self._log_latency()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Write out any deferred fix and the final trip summary, close the
+        current output file, and stop the display and extra data providers.
+        """
+        if self._fh is not None:
+            logger.info('Closing output file: %s', self._outfile)
+            self._write_pending()
+            self._write_summary(closed=True)
+            self._fh.close()
+            self._fh = None
+        if self._display is not None:
+            self._display.stop()
+            self._display = None
+        self._extra_data_instance.stop()
+
+    def _log_latency(self):
+        """
+        Every ``LATENCY_LOG_INTERVAL`` iterations, log how late the main loop
+        woke up from sleep and how long reading and handling each position
+        took, then reset the counters.
+        """
+        if (
+            self._latency_log_interval < 1 or
+            self._loop_latency.count < self._latency_log_interval
+        ):
+            return
+        logger.info(
+            'Main loop latency over %d iterations: sleep overshoot %s; '
+            'read and handle position %s', self._loop_latency.count,
+            self._sleep_latency, self._loop_latency
+        )
+        self._sleep_latency.reset()
+        self._loop_latency.reset()
 
     def _handle_waiting_gps(self, packet: GpsResponse):
         logger.warning(
@@ -132,18 +215,18 @@ class GpsLogger(object):
         if not self.LED1.is_lit:
             self.LED1.on()
         if self._display is not None:
-            self._display.set_fix_type(FixType.NO_GPS)
-            self._display.set_extradata(
-                self._extra_data_instance.data.get('message', '')
+            self._display.update(
+                fix_type=FixType.NO_GPS,
+                extradata=self._display_message()
             )
 
     def _handle_no_fix(self, packet: GpsResponse):
         logger.warning('No GPS fix yet - %s', packet)
         self.LED1.blink(on_time=0.1, off_time=0.1, n=3)
         if self._display is not None:
-            self._display.set_fix_type(FixType.NO_FIX)
-            self._display.set_extradata(
-                self._extra_data_instance.data.get('message', '')
+            self._display.update(
+                fix_type=FixType.NO_FIX,
+                extradata=self._display_message()
             )
 
     def _ensure_file_open(self, packet: GpsResponse):
@@ -159,27 +242,112 @@ class GpsLogger(object):
         )
         logger.info('Writing output to: %s', outfile)
         self._fh = open(outfile, 'w', buffering=1)
+        self._outfile = outfile
+        self._stats = RunningStats()
+        self._prev_alt = 0.0
 
     def _handle_fix(self, packet: GpsResponse):
         logger.info(packet)
+        fix_type: FixType = FixType.NO_FIX
         if packet.mode == 2:
             self.LED1.blink(on_time=0.5, off_time=0.25, n=2)
-            if self._display is not None:
-                self._display.set_fix_type(FixType.FIX_2D)
+            fix_type = FixType.FIX_2D
         elif packet.mode == 3:
             self.LED1.blink(on_time=0.5, off_time=0.25, n=1)
-            if self._display is not None:
-                self._display.set_fix_type(FixType.FIX_3D)
+            fix_type = FixType.FIX_3D
         if self._display is not None:
-            self._display.set_fix_precision(packet.position_precision())
             lat, lon = packet.position()
-            self._display.set_lat(lat)
-            self._display.set_lon(lon)
-            self._display.set_extradata(
-                self._extra_data_instance.data.get('message', '')
+            self._display.update(
+                fix_type=fix_type,
+                fix_precision=packet.position_precision(),
+                lat=lat, lon=lon,
+                extradata=self._display_message()
+            )
+
+    def _fix_system_time(self, packet: GpsResponse) -> float:
+        """
+        Return the system time at which the fix in ``packet`` was computed:
+        the time we received the packet, less the age of the fix when gpsd
+        answered the poll.
+        """
+        try:
+            age = parse_gps_time(packet.raw_packet['time']) - \
+                parse_gps_time(packet.time)
+        except (KeyError, ValueError):
+            return self._packet_received
+        return self._packet_received - max(0.0, age)
+
+    def _write_pending(self):
+        """
+        Write out the fix deferred from the previous iteration, attaching
+        the extra data sample nearest to (or interpolated at) its time, and
+        the sample's offset from the fix time in seconds.
+        """
+        if self._pending is None:
+            return
+        raw, fix_time = self._pending
+        self._pending = None
+        data, offset = self._extra_data_instance.sample_at(
+            fix_time, interpolate=self._extra_data_align == 'interpolate'
+        )
+        raw['_extra_data'] = data
+        if offset is not None:
+            raw['_extra_data_offset'] = offset
+        self._write_line(raw)
+
+    def _write_line(self, raw: dict):
+        self._fh.write('%s\n' % json.dumps(raw))
+        if self.flush_file:
+            self._fh.flush()
+        self.LED2.blink(on_time=0.25, off_time=0.25, n=1)
+        self._update_stats(raw)
+
+    def _update_stats(self, raw: dict):
+        """
+        Add the fix in a line just written to the trip statistics, reading
+        it the same way as ``pizero-gpslog-convert`` will, and write the
+        summary every ``SUMMARY_INTERVAL`` fixes.
+        """
+        if not is_fix(raw):
+            return
+        try:
+            fix = fix_record(0, raw, self._prev_alt)
+            self._stats.add(
+                parse_gps_time(fix.time), fix.lat, fix.lon, fix.alt
             )
+        except (KeyError, TypeError, ValueError):
+            logger.warning('Unable to add fix to trip stats', exc_info=True)
+            return
+        self._prev_alt = fix.alt
+        if (
+            self._summary_interval > 0 and
+            self._stats.num_points % self._summary_interval == 0
+        ):
+            self._write_summary()
+
+    def _write_summary(self, closed: bool = False):
+        """Write the trip statistics to the current file's summary file."""
+        if self._outfile is None:
+            return
+        fpath = summary_path(self._outfile)
+        try:
+            write_summary(fpath, self._stats, closed=closed)
+        except OSError:
+            logger.error('Unable to write %s', fpath, exc_info=True)
+
+    def _display_message(self) -> str:
+        """
+        Return the extra data message to display, preceded by the distance
+        logged to the current file if ``DISPLAY_ODOMETER`` is set.
+        """
+        message = self._extra_data_instance.data.get('message', '')
+        if self._odometer not in ODOMETER_UNITS:
+            return message
+        dist = self._stats.distance_2d / ODOMETER_UNITS[self._odometer]
+        return ('%.2f%s %s' % (dist, self._odometer, message)).rstrip()
 
     def _handle_packet(self, packet: GpsResponse):
+        self._write_pending()
         if packet.mode == 0:
             return self._handle_waiting_gps(packet)
         if self.LED1.is_lit:
@@ -190,12 +358,18 @@ class GpsLogger(object):
         self._ensure_file_open(packet)
         if packet.mode in [2, 3]:
             self._handle_fix(packet)
-        if self._extra_data_instance is not None:
-            packet.raw_packet['_extra_data'] = self._extra_data_instance.data
-        self._fh.write('%s\n' % json.dumps(packet.raw_packet))
-        if self.flush_file:
-            self._fh.flush()
-        self.LED2.blink(on_time=0.25, off_time=0.25, n=1)
+        if self._extra_data_align != 'latest':
+            # defer writing until the next iteration, so that samples taken
+            # after the fix can be considered too
+            self._pending = (packet.raw_packet, self._fix_system_time(packet))
+            return
+        packet.raw_packet['_extra_data'] = self._extra_data_instance.data
+        self._write_line(packet.raw_packet)
+
+
+def _handle_sigterm(signum, frame):
+    """Exit cleanly on SIGTERM, so the output file is closed properly."""
+    raise SystemExit(0)
 
 
 def main():
@@ -209,6 +383,7 @@ def main():
         set_log_debug(logger)
     elif os.environ.get('LOG_LEVEL', None) == 'INFO':
         set_log_info(logger)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
     GpsLogger().run()
 
 
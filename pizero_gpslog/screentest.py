@@ -38,18 +38,38 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import os
+import sys
+import argparse
 import logging
 import time
 from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 from pizero_gpslog.displaymanager import DisplayManager
-from pizero_gpslog.utils import set_log_debug
+from pizero_gpslog.displays.layouts import LAYOUTS
+from pizero_gpslog.fakehw import FakeHardware, install_fake_hardware
+from pizero_gpslog.utils import (
+    set_log_debug, FixType, parse_class_list, LatencyStats
+)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger()
-set_log_debug(logger)
 
 
-def main():
+def set_sample_data(dm: DisplayManager, i: int):
+    """
+    Set sample data on ``dm`` for iteration number ``i``, cycling through
+    each fix type.
+    """
+    dm.update(
+        fix_type=FixType(i % 4),
+        fix_precision=(1.23456789 * i, 9.87654321 * i),
+        lat=38.8976763 + (i / 10000.0),
+        lon=-77.0365298 - (i / 10000.0),
+        extradata=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+
+def screentest():
     if 'DISPLAY_CLASS' not in os.environ:
         logger.warning(
             'DISPLAY_CLASS environment variable not set; using default dummy'
@@ -57,20 +77,174 @@ def main():
         os.environ[
             'DISPLAY_CLASS'
         ] = 'pizero_gpslog.displays.dummy:DummyDisplay'
-    modname, clsname = os.environ['DISPLAY_CLASS'].split(':')
-    dm = DisplayManager(modname, clsname)
+    dm = DisplayManager(parse_class_list(os.environ['DISPLAY_CLASS']))
     dm.start()
     for i in range(0, 10):
         logger.info('OUTER sleep 5s')
         time.sleep(5)
         logger.info('OUTER set display')
-        dm.set_heading(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        dm.set_status('A' + (f'{i}' * 19))
-        dm.set_lat('B' + (f'{i}' * 19))
-        dm.set_lon('C' + (f'{i}' * 19))
-        dm.set_extradata('D' + (f'{i}' * 19))
+        set_sample_data(dm, i)
     logger.info('OUTER Finished display-setting loop')
 
 
+def benchmark_one(
+    classes: List[Tuple[str, str]], rate: float, duration: float,
+    isolate: bool = False, child_init: Optional[Callable[[], object]] = None
+) -> Dict[str, float]:
+    """
+    Drive a :py:class:`~.DisplayManager` for the ``classes`` display drivers
+    at a fixed update rate of ``rate`` Hz for ``duration`` seconds, and
+    return its render statistics plus the elapsed time and the latency of
+    the driving loop (how late it woke up from each sleep), which stands in
+    for the main loop of ``pizero-gpslog``. ``child_init`` is passed to
+    the :py:class:`~.DisplayManager`.
+    """
+    dm = DisplayManager(classes, isolate=isolate, child_init=child_init)
+    dm.start(refresh_sec=1.0 / rate)
+    latency = LatencyStats()
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < duration:
+        set_sample_data(dm, i)
+        i += 1
+        target = start + (i / rate)
+        t = target - time.perf_counter()
+        if t > 0:
+            time.sleep(t)
+        latency.add(max(0.0, time.perf_counter() - target))
+    elapsed = time.perf_counter() - start
+    dm.stop(timeout=duration)
+    stats = dm.stats
+    stats['elapsed'] = elapsed
+    stats['loop_late_mean'] = latency.mean
+    stats['loop_late_max'] = latency.maximum
+    return stats
+
+
+def benchmark(
+    layouts: List[str], rate: float, duration: float,
+    display_class: Optional[str] = None, busy_scale: float = 1.0,
+    isolate: bool = False
+):
+    """
+    Benchmark the display pipeline and print render time, frames per second
+    and CPU time per frame.
+
+    If ``display_class`` is None, benchmark each of ``layouts`` using
+    :py:class:`~pizero_gpslog.displays.headless.HeadlessDisplay`. Otherwise,
+    benchmark the comma-separated ``module:Class`` display drivers in
+    ``display_class`` together, running against
+    :py:class:`~pizero_gpslog.fakehw.FakeHardware` (installed in the child
+    process too, if ``isolate``), and also print the bus
+    traffic per frame (only when not ``isolate``, as the bus traffic then
+    happens in the child process).
+
+    For each target, also print how late the driving loop woke up, on
+    average and at most; comparing runs with and without ``isolate`` shows
+    how much the display drivers delay the main loop.
+    """
+    results = []
+    hw: Optional[FakeHardware] = None
+    child_init: Optional[Callable[[], object]] = None
+    if display_class is None:
+        targets = [
+            (name, [('pizero_gpslog.displays.headless', 'HeadlessDisplay')],
+             name)
+            for name in layouts
+        ]
+    else:
+        hw = FakeHardware(busy_scale=busy_scale)
+        hw.install()
+        if isolate:
+            # the child process needs its own fakes
+            child_init = partial(install_fake_hardware, busy_scale=busy_scale)
+        classes = parse_class_list(display_class)
+        targets = [('+'.join(x[1] for x in classes), classes, None)]
+    for label, classes, layout in targets:
+        logger.warning('Benchmarking %s for %s seconds', label, duration)
+        if layout is not None:
+            os.environ['HEADLESS_LAYOUT'] = layout
+        if hw is not None:
+            hw.stats.reset()
+        stats = benchmark_one(
+            classes, rate, duration, isolate=isolate, child_init=child_init
+        )
+        frames = max(stats['frames'], 1)
+        results.append((
+            label, stats['frames'], stats['frames'] / stats['elapsed'],
+            1000.0 * stats['render_seconds'] / frames,
+            1000.0 * stats['cpu_seconds'] / frames,
+            stats['cache_hits'], 1000.0 * stats['loop_late_mean'],
+            1000.0 * stats['loop_late_max']
+        ))
+    print('%-16s %8s %8s %12s %12s %8s %12s %12s' % (
+        'Target', 'Frames', 'FPS', 'Render ms/f', 'CPU ms/f', 'Shared',
+        'Late ms avg', 'Late ms max'
+    ))
+    for r in results:
+        print('%-16s %8d %8.2f %12.3f %12.3f %8d %12.3f %12.3f' % r)
+    if hw is not None:
+        hw.uninstall()
+    if hw is not None and not isolate:
+        frames = max(results[0][1], 1)
+        bus = hw.stats.as_dict()
+        print('Bus traffic per frame (including driver initialization):')
+        for k in sorted(bus.keys()):
+            print('  %-18s %12.2f' % (k, bus[k] / frames))
+
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(
+        description='Test a display with sample data, or benchmark the '
+                    'display rendering pipeline.'
+    )
+    p.add_argument('-b', '--benchmark', dest='benchmark', action='store_true',
+                   default=False,
+                   help='benchmark rendering of each layout with the '
+                        'headless display driver instead of testing '
+                        'DISPLAY_CLASS')
+    p.add_argument('-l', '--layout', dest='layouts', action='append',
+                   choices=sorted(LAYOUTS.keys()), default=None,
+                   help='layout to benchmark; may be specified multiple '
+                        'times (default: all layouts)')
+    p.add_argument('-r', '--rate', dest='rate', action='store', type=float,
+                   default=10.0,
+                   help='benchmark update rate in Hz (default: 10)')
+    p.add_argument('-d', '--duration', dest='duration', action='store',
+                   type=float, default=10.0,
+                   help='benchmark duration per layout in seconds '
+                        '(default: 10)')
+    p.add_argument('-c', '--display-class', dest='display_class',
+                   action='store', type=str, default=None,
+                   help='with --benchmark, benchmark this comma-separated '
+                        'list of module:Class display drivers together, '
+                        'against fake in-process SPI/GPIO/I2C hardware, '
+                        'instead of the headless layouts')
+    p.add_argument('--busy-scale', dest='busy_scale', action='store',
+                   type=float, default=1.0,
+                   help='with --display-class, multiply the simulated '
+                        'e-Paper BUSY times by this factor; 0 disables them '
+                        '(default: 1.0)')
+    p.add_argument('-I', '--isolate', dest='isolate', action='store_true',
+                   default=False,
+                   help='with --benchmark, run the displays in a separate '
+                        'process, as with DISPLAY_PROCESS=true')
+    return p.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]):
+    logging.basicConfig(level=logging.DEBUG)
+    args = parse_args(argv)
+    if not args.benchmark:
+        set_log_debug(logger)
+        return screentest()
+    logger.setLevel(logging.WARNING)
+    benchmark(
+        args.layouts or sorted(LAYOUTS.keys()), args.rate, args.duration,
+        display_class=args.display_class, busy_scale=args.busy_scale,
+        isolate=args.isolate
+    )
+
+
 if __name__ == "__main__":
     main()
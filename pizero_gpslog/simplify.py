@@ -0,0 +1,239 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+Line simplification of tracks held in NumPy arrays, to make small exports
+of very large tracks that stay within a given distance of the original.
+
+Points are first projected to a local plane in metres (equirectangular,
+about the track's mean latitude, as ``gpxpy.geo.distance()`` does for
+nearby points). :py:func:`~.douglas_peucker` keeps every point needed for
+the simplified line to stay within ``tolerance`` metres of every original
+point; rather than recursing, it splits all of the segments at each level
+at once. :py:func:`~.visvalingam` removes the points that form the smallest
+triangles with their neighbours, until none is smaller than ``tolerance``
+squared, using a heap; its removal loop runs at Python speed. Both always
+keep the first and last points, and return the indices of the points kept.
+"""
+
+import heapq
+from array import array
+from typing import Callable, Dict, Iterable, Tuple
+
+import numpy as np
+from gpxpy.geo import ONE_DEGREE
+
+from pizero_gpslog.logreader import FixRecord
+
+
+def project(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Project latitudes and longitudes to x and y in metres from the first
+    point, on a plane tangent at the mean latitude. Longitudes are unwrapped,
+    so tracks crossing the antimeridian stay continuous.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.degrees(np.unwrap(np.radians(np.asarray(lon, dtype=float))))
+    if len(lat) == 0:
+        return lat, lon
+    x = (lon - lon[0]) * ONE_DEGREE * np.cos(np.radians(lat.mean()))
+    y = (lat - lat[0]) * ONE_DEGREE
+    return x, y
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Return the sorted indices of the points of the line ``(x, y)`` kept by
+    the Douglas-Peucker algorithm: no point removed is more than
+    ``tolerance`` from the simplified line (measured to the nearest point of
+    the segment that replaced it).
+
+    Instead of recursing into one segment at a time, every segment still
+    to be split is processed together: the distances of all of their
+    interior points are computed at once, then each segment whose furthest
+    point is beyond ``tolerance`` is split there. The number of NumPy
+    passes is the depth of the recursion, not the number of points kept.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    while len(starts):
+        counts = ends - starts - 1
+        # point indices, and the start and end of their segment, for every
+        # interior point of every segment
+        offsets = np.cumsum(counts) - counts
+        seg = np.repeat(np.arange(len(starts)), counts)
+        idx = np.arange(counts.sum()) + np.repeat(starts + 1 - offsets, counts)
+        s = starts[seg]
+        e = ends[seg]
+        px = x[idx] - x[s]
+        py = y[idx] - y[s]
+        dx = x[e] - x[s]
+        dy = y[e] - y[s]
+        length_sq = dx * dx + dy * dy
+        t = np.clip(
+            (px * dx + py * dy) / np.where(length_sq == 0, 1.0, length_sq),
+            0.0, 1.0
+        )
+        dists = np.hypot(px - t * dx, py - t * dy)
+        # first point at each segment's maximum distance
+        maxes = np.maximum.reduceat(dists, offsets)
+        _, first = np.unique(
+            seg[dists == maxes[seg]], return_index=True
+        )
+        split = maxes > tolerance
+        mids = idx[np.flatnonzero(dists == maxes[seg])[first]][split]
+        keep[mids] = True
+        starts = np.concatenate([starts[split], mids])
+        ends = np.concatenate([mids, ends[split]])
+        interior = ends - starts > 1
+        starts = starts[interior]
+        ends = ends[interior]
+    return np.flatnonzero(keep)
+
+
+def _areas(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Areas of the triangles formed by each interior point and its neighbours."""
+    return np.abs(
+        (x[:-2] - x[2:]) * (y[1:-1] - y[:-2]) -
+        (x[:-2] - x[1:-1]) * (y[2:] - y[:-2])
+    ) / 2.0
+
+
+def visvalingam(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Return the sorted indices of the points of the line ``(x, y)`` kept by
+    the Visvalingam-Whyatt algorithm: repeatedly remove the point whose
+    triangle with its current neighbours has the smallest area, until every
+    remaining one is at least ``tolerance`` squared (in square metres).
+
+    The initial areas, and the heap of points below the threshold, are
+    built with NumPy. Removing points is inherently sequential (each removal
+    changes its neighbours' areas), so that loop runs at Python speed over
+    plain lists, which index much faster than NumPy arrays one element at a
+    time; its cost is O(r log r) for r points removed.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    threshold = tolerance * tolerance
+    xs, ys = x.tolist(), y.tolist()
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    areas = np.zeros(n)
+    areas[1:-1] = _areas(x, y)
+    candidates = np.flatnonzero(areas[1:-1] < threshold) + 1
+    # a list sorted by (area, index) is already a valid heap
+    candidates = candidates[np.argsort(areas[candidates], kind='stable')]
+    heap = list(zip(areas[candidates].tolist(), candidates.tolist()))
+    area = areas.tolist()
+    removed = bytearray(n)
+    last = n - 1
+    pop, push = heapq.heappop, heapq.heappush
+    while heap:
+        a, i = pop(heap)
+        if removed[i] or a != area[i]:
+            # stale entry, superseded when a neighbour was removed
+            continue
+        removed[i] = 1
+        p = prev[i]
+        q = nxt[i]
+        nxt[p] = q
+        prev[q] = p
+        # a point's area never drops below that of a point removed before
+        # it, so removal order follows significance
+        if p != 0:
+            r = prev[p]
+            new = abs(
+                (xs[r] - xs[q]) * (ys[p] - ys[r]) -
+                (xs[r] - xs[p]) * (ys[q] - ys[r])
+            ) / 2.0
+            new = a if new < a else new
+            area[p] = new
+            if new < threshold:
+                push(heap, (new, p))
+        if q != last:
+            r = nxt[q]
+            new = abs(
+                (xs[p] - xs[r]) * (ys[q] - ys[p]) -
+                (xs[p] - xs[q]) * (ys[r] - ys[p])
+            ) / 2.0
+            new = a if new < a else new
+            area[q] = new
+            if new < threshold:
+                push(heap, (new, q))
+    return np.flatnonzero(np.frombuffer(bytes(removed), dtype=np.uint8) == 0)
+
+
+#: Simplification functions by name, for :py:func:`~.simplify`
+METHODS: Dict[str, Callable[[np.ndarray, np.ndarray, float], np.ndarray]] = {
+    'dp': douglas_peucker,
+    'vw': visvalingam,
+}
+
+
+def simplify(
+    lat: np.ndarray, lon: np.ndarray, tolerance: float, method: str = 'dp'
+) -> np.ndarray:
+    """
+    Return the sorted indices of the points of a track to keep, simplifying
+    it to within ``tolerance`` metres with one of :py:data:`~.METHODS`.
+    """
+    x, y = project(lat, lon)
+    return METHODS[method](x, y, tolerance)
+
+
+def fixes_to_keep(
+    fixes: Iterable[FixRecord], tolerance: float, method: str = 'dp'
+) -> np.ndarray:
+    """
+    Return a boolean array that is True for each of ``fixes`` kept by
+    :py:func:`~.simplify`. ``fixes`` may be an iterator; only their
+    latitudes and longitudes are kept in memory, at 16 bytes per fix.
+    """
+    lat = array('d')
+    lon = array('d')
+    for f in fixes:
+        lat.append(f.lat)
+        lon.append(f.lon)
+    keep = np.zeros(len(lat), dtype=bool)
+    keep[simplify(
+        np.frombuffer(lat, dtype=float), np.frombuffer(lon, dtype=float),
+        tolerance, method=method
+    )] = True
+    return keep
@@ -0,0 +1,102 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import ast
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def log_path(tmpdir):
+    """
+    Write a pizero-gpslog file made from the recorded gpsd responses in
+    ``data/``, with a corrupt line and a missing altitude added.
+    """
+    path = str(tmpdir.join('log.json'))
+    fname = os.path.join(DATA_DIR, 'bu353s4-cold-to-stillfix.gpsd-responses')
+    with open(fname) as fh, open(path, 'w') as out:
+        for lineno, line in enumerate(fh):
+            if not line.strip():
+                continue
+            response = ast.literal_eval(line)['response']
+            if lineno == 200:
+                del response['tpv'][0]['alt']
+                response['tpv'][0]['time'] = '2018-03-01T20:16:00.25Z'
+            out.write(json.dumps(response) + '\n')
+            if lineno == 100:
+                out.write('{"tpv": [{"mode": 3, \n')
+    return path
+
+
+@pytest.fixture
+def moving_log_path(tmpdir):
+    """
+    A random walk with varying speeds, stops, zero and missing altitudes, a
+    jump of more than 0.2 degrees, and irregular fix intervals.
+    """
+    rnd = random.Random(1234)
+    path = str(tmpdir.join('moving.json'))
+    t = datetime(2020, 9, 11, 12, 0, 0, tzinfo=timezone.utc)
+    lat, lon, alt = 33.6, -83.9, 250.0
+    with open(path, 'w') as fh:
+        for i in range(3000):
+            t += timedelta(seconds=rnd.choice([1, 1, 2, 5, 0.5]))
+            if rnd.random() < 0.7:
+                lat += rnd.gauss(0, 0.0002)
+                lon += rnd.gauss(0, 0.0002)
+                alt += rnd.gauss(0, 2)
+            if i == 1500:
+                lat += 0.3
+            tpv = {
+                'mode': 3, 'lat': lat, 'lon': lon, 'speed': rnd.random(),
+                'time': t.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+            }
+            if i % 50 == 7:
+                tpv['alt'] = 0.0
+            elif i % 70 != 3:
+                tpv['alt'] = alt
+            fh.write(json.dumps({
+                'tpv': [tpv], 'gst': [{'alt': 0.0}],
+                'sky': [{'hdop': 1.0}]
+            }) + '\n')
+    return path
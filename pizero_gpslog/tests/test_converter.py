@@ -0,0 +1,469 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import pytest
+
+from pizero_gpslog.converter import (
+    GpxConverter, IncrementalConverter, benchmark_decode, checkpoint_path,
+    checkpoint_stats_path, convert_batch, convert_file, find_inputs,
+    gpx_time, main
+)
+from pizero_gpslog import converter, logreader
+from pizero_gpslog.logreader import (
+    chunk_bounds, iter_fixes, iter_fixes_parallel, project_fix
+)
+from pizero_gpslog.tests.test_tripstats import assert_same_stats
+
+
+class TestStreamingConverter(object):
+
+    def test_gpx_time(self):
+        assert gpx_time('2018-03-01T20:14:18.000Z') == '2018-03-01T20:14:18Z'
+        assert gpx_time('2018-03-01T20:14:18Z') == '2018-03-01T20:14:18Z'
+        assert gpx_time('2018-03-01T20:14:18.25Z') == \
+            '2018-03-01T20:14:18.250000Z'
+
+    def test_iter_fixes(self, log_path):
+        fixes = list(iter_fixes(log_path, errors=None))
+        assert len(fixes) == 175
+        assert all(x.mode == 3 for x in fixes)
+        missing = [x for x in fixes if x.time.endswith('.25Z')][0]
+        previous = fixes[fixes.index(missing) - 1]
+        # no altitude in the TPV; the GST's (0.0) is used
+        assert missing.alt == 0.0
+        assert previous.alt != 0.0
+
+    def test_same_as_gpxpy(self, log_path):
+        conv = GpxConverter(log_path)
+        gpx = conv.convert()
+        out = io.StringIO()
+        stats = conv.convert_stream(out)
+        assert out.getvalue() == gpx.to_xml()
+        full = conv.stats_for_gpx(gpx)
+        for k in ['num_points', 'track_start', 'track_end', 'duration_sec']:
+            assert stats[k] == full[k]
+        assert stats['2d_horizontal_distance'] == pytest.approx(
+            full['2d_horizontal_distance']
+        )
+        assert '175 points in track' in conv.stats_text(stats)
+
+    def test_empty(self, tmpdir):
+        path = str(tmpdir.join('empty.json'))
+        with open(path, 'w') as fh:
+            fh.write('\n')
+        conv = GpxConverter(path)
+        out = io.StringIO()
+        assert conv.convert_stream(out) == {
+            'num_points': 0, '2d_horizontal_distance': 0.0
+        }
+        assert out.getvalue() == conv.convert().to_xml()
+
+
+class TestProjectingDecoder(object):
+
+    line = {
+        'gst': [{'class': 'GST', 'alt': 12.5}],
+        'time': '2018-03-01T20:14:18.000Z',
+        'tpv': [{
+            'class': 'TPV', 'mode': 3, 'time': '2018-03-01T20:14:18.000Z',
+            'lat': 1.5, 'lon': -2.25, 'alt': 10.0, 'speed': 0.5
+        }],
+        'sky': [{
+            'class': 'SKY', 'hdop': 1.1, 'satellites': [
+                {'PRN': 1, 'used': True}, {'PRN': 2, 'used': False}
+            ], 'pdop': 2.2
+        }],
+        '_extra_data': {'sky': [{'satellites': []}]}
+    }
+
+    def test_same_as_full(self, log_path):
+        full = list(iter_fixes(log_path, errors=None, fast=False))
+        for loads in [json.loads, None]:
+            assert list(
+                iter_fixes(log_path, errors=None, loads=loads)
+            ) == full
+
+    def test_project(self):
+        rec = project_fix(json.dumps(self.line), 7, 0.0)
+        assert rec.lineno == 7
+        assert (rec.lat, rec.lon, rec.alt, rec.speed) == (1.5, -2.25, 10.0, 0.5)
+        assert (rec.hdop, rec.vdop, rec.pdop) == (1.1, None, 2.2)
+        assert rec.satellites == 2
+        compact = json.dumps(self.line, separators=(',', ':'))
+        assert project_fix(compact, 7, 0.0) == rec
+
+    def test_gst_alt_and_no_satellites(self):
+        line = json.loads(json.dumps(self.line))
+        del line['tpv'][0]['alt']
+        del line['sky'][0]['satellites']
+        rec = project_fix(json.dumps(line), 1, 3.0)
+        assert rec.alt == 12.5
+        assert rec.satellites is None
+
+    def test_no_fix(self):
+        line = json.loads(json.dumps(self.line))
+        line['tpv'][0]['mode'] = 1
+        assert project_fix(json.dumps(line), 1, 0.0) is None
+        assert project_fix('{"class": "POLL"}', 1, 0.0) is None
+
+    def test_fallback(self, tmpdir):
+        path = str(tmpdir.join('log.json'))
+        line = json.dumps(self.line)
+        with open(path, 'w') as fh:
+            fh.write(line[:-40] + '\n')
+            fh.write(line + '\n')
+        with pytest.raises(ValueError):
+            project_fix(line[:-40], 1, 0.0)
+        errors = io.StringIO()
+        fixes = list(iter_fixes(path, errors=errors))
+        assert [x.lineno for x in fixes] == [2]
+        assert 'Unable to decode JSON on line 1' in errors.getvalue()
+
+    def test_truncated_before_tpv(self, tmpdir):
+        path = str(tmpdir.join('log.json'))
+        line = json.dumps(self.line)
+        truncated = line[:line.index('"tpv"')]
+        with open(path, 'w') as fh:
+            fh.write(truncated + '\n')
+            fh.write(line + '\n')
+        with pytest.raises(ValueError):
+            project_fix(truncated, 1, 0.0)
+        errors = io.StringIO()
+        fixes = list(iter_fixes(path, errors=errors))
+        assert [x.lineno for x in fixes] == [2]
+        assert 'Unable to decode JSON on line 1' in errors.getvalue()
+
+    def test_benchmark(self, log_path):
+        res = benchmark_decode([log_path])
+        assert len(res) >= 2
+        assert set(x[1] for x in res) == {175}
+        assert all(x[2] > 0 for x in res)
+
+
+class TestParallelDecoding(object):
+
+    def test_chunk_bounds(self, log_path):
+        with open(log_path, 'rb') as fh:
+            data = fh.read()
+        bounds = chunk_bounds(log_path, 10000)
+        assert bounds[0][0] == 0
+        assert bounds[-1][1] == len(data)
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            assert end == start
+            assert data[end - 1:end] == b'\n'
+
+    @pytest.mark.parametrize('chunk_size', [1, 50000])
+    def test_same_as_serial(self, log_path, chunk_size):
+        serial_errors = io.StringIO()
+        serial = list(iter_fixes(log_path, errors=serial_errors))
+        errors = io.StringIO()
+        fixes = list(iter_fixes_parallel(
+            log_path, jobs=2, errors=errors, chunk_size=chunk_size
+        ))
+        # chunk_size=1 puts the fix with no altitude at the start of a chunk
+        assert fixes == serial
+        assert errors.getvalue() == serial_errors.getvalue()
+        assert 'line 101' in errors.getvalue()
+
+    def test_spawn_context(self, log_path, tmpdir, monkeypatch):
+        contexts = []
+
+        class RecordingExecutor(ProcessPoolExecutor):
+
+            def __init__(self, *args, **kwargs):
+                contexts.append(kwargs.get('mp_context'))
+                super().__init__(*args, **kwargs)
+
+        monkeypatch.setattr(logreader, 'ProcessPoolExecutor', RecordingExecutor)
+        assert len(list(iter_fixes_parallel(log_path, jobs=2, errors=None))) \
+            == 175
+        assert [x.get_start_method() for x in contexts] == ['spawn']
+        # as does batch conversion
+        monkeypatch.setattr(converter, 'ProcessPoolExecutor', RecordingExecutor)
+        path = str(tmpdir.join('a.json'))
+        shutil.copy(log_path, path)
+        res = convert_batch([path], ['gpx'], jobs=1, out=io.StringIO())
+        assert res['converted'] == [path]
+        assert [x.get_start_method() for x in contexts] == ['spawn'] * 2
+
+    def test_converter(self, log_path, monkeypatch):
+        expected = GpxConverter(log_path).convert().to_xml()
+        monkeypatch.setattr(converter, 'PARALLEL_MIN_SIZE', 0)
+        monkeypatch.setattr(converter, 'iter_fixes', None)
+        assert GpxConverter(log_path, jobs=2).convert().to_xml() == expected
+
+    def test_exception(self, tmpdir):
+        path = str(tmpdir.join('bad.json'))
+        tmpdir.join('bad.json').write(
+            '\n{"tpv": [{"mode": 3, "time": "2018-03-01T20:14:18.000Z", '
+            '"lat": 1.0, "lon": 2.0, "speed": 0.0}]}\n'
+        )
+        errors = io.StringIO()
+        with pytest.raises(KeyError):
+            list(iter_fixes_parallel(path, jobs=2, errors=errors))
+        assert errors.getvalue() == 'Exception loading line 2:\n'
+
+
+class TestExporters(object):
+
+    def test_all_formats_one_read(self, log_path, tmpdir, monkeypatch, capsys):
+        reads = []
+
+        def counting_iter_fixes(fpath, **kwargs):
+            reads.append(fpath)
+            return iter_fixes(fpath, **kwargs)
+
+        monkeypatch.setattr(converter, 'iter_fixes', counting_iter_fixes)
+        main(['-f', 'gpx,geojson', '-f', 'kml', '-f', 'csv', log_path])
+        assert reads == [log_path]
+        assert 'Moving time' in capsys.readouterr().out
+        base = log_path.rsplit('.', 1)[0]
+        fixes = list(iter_fixes(log_path, errors=None))
+        with open(base + '.gpx') as fh:
+            assert fh.read() == GpxConverter(log_path).convert().to_xml()
+        with open(base + '.geojson') as fh:
+            geo = json.load(fh)
+        feature = geo['features'][0]
+        assert geo['type'] == 'FeatureCollection'
+        assert feature['geometry']['type'] == 'LineString'
+        assert feature['geometry']['coordinates'][0] == [
+            fixes[0].lon, fixes[0].lat, fixes[0].alt
+        ]
+        assert feature['properties']['coordTimes'] == [x.time for x in fixes]
+        ns = {
+            'kml': 'http://www.opengis.net/kml/2.2',
+            'gx': 'http://www.google.com/kml/ext/2.2'
+        }
+        track = ElementTree.parse(base + '.kml').getroot().find(
+            'kml:Document/kml:Placemark/gx:Track', ns
+        )
+        assert [x.text for x in track.findall('kml:when', ns)] == [
+            x.time for x in fixes
+        ]
+        coords = track.findall('gx:coord', ns)
+        assert len(coords) == 175
+        assert coords[-1].text == '%r %r %r' % (
+            fixes[-1].lon, fixes[-1].lat, fixes[-1].alt
+        )
+        with open(base + '.csv') as fh:
+            rows = list(csv.reader(fh))
+        assert rows[0][:3] == ['time', 'lat', 'lon']
+        assert len(rows) == 176
+        assert float(rows[1][1]) == fixes[0].lat
+
+    def test_empty(self, tmpdir):
+        path = str(tmpdir.join('empty.json'))
+        tmpdir.join('empty.json').write('\n')
+        main(['-S', '-f', 'geojson', '-o', str(tmpdir.join('out')), path])
+        with open(str(tmpdir.join('out'))) as fh:
+            geo = json.load(fh)
+        assert geo['features'][0]['geometry']['coordinates'] == []
+
+    def test_bad_options(self, log_path):
+        with pytest.raises(SystemExit):
+            main(['-f', 'shp', log_path])
+        with pytest.raises(SystemExit):
+            main(['-f', 'gpx,csv', '-o', 'out', log_path])
+
+
+class TestIncrementalConverter(object):
+
+    formats = ['gpx', 'geojson', 'kml', 'csv']
+
+    def outputs(self, tmpdir, prefix):
+        return {f: str(tmpdir.join('%s.%s' % (prefix, f))) for f in self.formats}
+
+    def assert_same(self, a, b):
+        for fmt in self.formats:
+            with open(a[fmt]) as fa, open(b[fmt]) as fb:
+                assert fa.read() == fb.read(), fmt
+
+    def test_resume(self, log_path, tmpdir, monkeypatch):
+        with open(log_path, 'rb') as fh:
+            data = fh.read()
+        path = str(tmpdir.join('live.json'))
+        # the first chunk ends part way through a line
+        cut = data.index(b'\n', len(data) // 2) + 200
+        with open(path, 'wb') as fh:
+            fh.write(data[:cut])
+        outputs = self.outputs(tmpdir, 'inc')
+        inc = IncrementalConverter(path, outputs)
+        assert not inc.resumed
+        first = inc.update()
+        assert 0 < first < 175
+        assert inc.update() == 0
+        with open(path, 'ab') as fh:
+            fh.write(data[cut:])
+        offsets = []
+
+        class RecordingReader(converter.FixReader):
+
+            def __init__(self, fpath, offset=0, **kwargs):
+                offsets.append(offset)
+                super().__init__(fpath, offset=offset, **kwargs)
+
+        monkeypatch.setattr(converter, 'FixReader', RecordingReader)
+        inc = IncrementalConverter(path, outputs)
+        assert inc.resumed
+        assert inc.stats.num_points == first
+        assert inc.update() == 175 - first
+        # the stats are loaded, not rebuilt from the start of the input
+        assert len(offsets) == 1 and offsets[0] > 0
+        full = self.outputs(tmpdir, 'full')
+        full_stats = convert_file(log_path, full)
+        self.assert_same(outputs, full)
+        assert inc.stats.num_points == 175
+        assert_same_stats(inc.stats.stats(), full_stats)
+        with open(checkpoint_path(path)) as fh:
+            ckpt = json.load(fh)
+        assert ckpt['offset'] == len(data)
+        assert ckpt['last_fix']['time'] == '2018-03-01T20:17:12.000Z'
+
+    def test_same_stats(self, moving_log_path, tmpdir):
+        with open(moving_log_path, 'rb') as fh:
+            data = fh.read()
+        path = str(tmpdir.join('live.json'))
+        outputs = self.outputs(tmpdir, 'inc')
+        for frac in (0.2, 0.6, 1.0):
+            with open(path, 'wb') as fh:
+                fh.write(data[:int(len(data) * frac)])
+            inc = IncrementalConverter(path, outputs)
+            inc.update()
+        assert inc.resumed
+        full = self.outputs(tmpdir, 'full')
+        assert_same_stats(
+            inc.stats.stats(), convert_file(moving_log_path, full)
+        )
+        self.assert_same(outputs, full)
+
+    def test_start_over(self, log_path, tmpdir):
+        path = str(tmpdir.join('live.json'))
+        shutil.copy(log_path, path)
+        outputs = self.outputs(tmpdir, 'inc')
+        assert IncrementalConverter(path, outputs).update() == 175
+        # changed outputs invalidate the checkpoint
+        with open(outputs['csv'], 'a') as fh:
+            fh.write('x\n')
+        inc = IncrementalConverter(path, outputs)
+        assert not inc.resumed
+        assert inc.update() == 175
+        # as does changing the saved stats
+        with open(checkpoint_stats_path(checkpoint_path(path)), 'ab') as fh:
+            fh.write(b'x')
+        inc = IncrementalConverter(path, outputs)
+        assert not inc.resumed
+        assert inc.update() == 175
+        # as does changing the last fix before the checkpoint offset
+        with open(path, 'r+b') as fh:
+            data = fh.read()
+            pos = data.rindex(b'"time": "2018-03-01T20:17:12')
+            fh.seek(pos + len(b'"time": "2018-03-01T20:17:1'))
+            fh.write(b'3')
+        inc = IncrementalConverter(path, outputs)
+        assert not inc.resumed
+        assert inc.stats.num_points == 0
+        assert inc.update() == 175
+        # as does truncating the input
+        with open(log_path, 'rb') as fh:
+            data = fh.read()
+        with open(path, 'r+b') as fh:
+            fh.truncate(data.index(b'\n', len(data) // 2) + 1)
+        assert IncrementalConverter(path, outputs).update() < 175
+
+    def test_follow(self, log_path, tmpdir, capsys):
+        path = str(tmpdir.join('live.json'))
+        shutil.copy(log_path, path)
+        outputs = self.outputs(tmpdir, 'inc')
+        out = io.StringIO()
+        IncrementalConverter(path, outputs).follow(
+            interval=0.01, out=out, max_updates=2
+        )
+        assert out.getvalue().startswith('175 new points; 175 total')
+        main(['-c', '-f', 'gpx', path])
+        assert '175 points in track' in capsys.readouterr().out
+
+
+class TestBatch(object):
+
+    def test_batch(self, log_path, tmpdir):
+        indir = tmpdir.mkdir('logs')
+        for name in ['a.json', 'b.json']:
+            shutil.copy(log_path, str(indir.join(name)))
+        # a fix with no SKY report can't be converted
+        indir.join('bad.json').write(
+            '{"tpv": [{"mode": 3, "time": "2018-03-01T20:14:18.000Z", '
+            '"lat": 1.0, "lon": 2.0, "speed": 0.0}]}\n'
+        )
+        indir.join('notes.txt').write('not a log')
+        paths = find_inputs([str(indir)])
+        assert [os.path.basename(x) for x in paths] == [
+            'a.json', 'b.json', 'bad.json'
+        ]
+        out = io.StringIO()
+        res = convert_batch(paths, ['gpx'], jobs=2, out=out)
+        assert sorted(res['converted']) == paths[:2]
+        assert res['failed'] == [paths[2]]
+        assert res['stats']['num_points'] == 350
+        assert 'ERROR converting %s: KeyError' % paths[2] in out.getvalue()
+        single = GpxConverter(log_path)
+        expected = single.stats_for_gpx(single.convert())
+        assert res['stats']['max_speed_ms'] == expected['max_speed_ms']
+        assert res['stats']['moving_distance'] == pytest.approx(
+            expected['moving_distance'] * 2
+        )
+        with open(str(indir.join('a.gpx'))) as fh:
+            assert fh.read() == single.convert().to_xml()
+        res = convert_batch(paths, ['gpx'], jobs=2, out=io.StringIO())
+        assert sorted(res['skipped']) == paths[:2]
+        assert res['converted'] == []
+
+    def test_main_batch(self, log_path, tmpdir, capsys):
+        other = str(tmpdir.join('other.json'))
+        shutil.copy(log_path, other)
+        main(['--stream', '-j', '1', log_path, other])
+        assert os.path.exists(str(tmpdir.join('other.gpx')))
+        captured = capsys.readouterr()
+        assert 'Totals for 2 converted files' in captured.out
+        assert '350 points in track' in captured.out
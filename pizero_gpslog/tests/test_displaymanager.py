@@ -0,0 +1,225 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from functools import partial
+from typing import ClassVar
+
+from pizero_gpslog.displaymanager import DisplayManager
+from pizero_gpslog.displays.base import BaseDisplay
+from pizero_gpslog.displays.layouts import Adafruit4567Layout, RenderCache
+from pizero_gpslog.utils import AtomicState, DisplayState, FixType
+
+
+class RecordingDisplay(BaseDisplay):
+
+    min_refresh_seconds: ClassVar[int] = 0
+
+    #: list of (lat, lon, should_clear) for every update_display call
+    calls = []
+
+    def update_display(self, fix_type, lat, lon, extradata, fix_precision,
+                       dt, should_clear):
+        self.calls.append((lat, lon, should_clear))
+
+    def clear(self):
+        pass
+
+    def __del__(self):
+        pass
+
+
+class HangingDisplay(RecordingDisplay):
+
+    def update_display(self, *args, **kwargs):
+        time.sleep(300)
+
+
+def touch(path):
+    open(path, 'w').close()
+
+
+def wait_for(func, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if func():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestAtomicState(object):
+
+    def test_update(self):
+        state = AtomicState()
+        assert state.get() == DisplayState()
+        s = state.update(lat=1.0, lon=2.0, fix_type=FixType.FIX_3D)
+        assert s.version == 1
+        assert (s.lat, s.lon, s.fix_type) == (1.0, 2.0, FixType.FIX_3D)
+        assert state.get() is s
+
+    def test_wait_for_newer_timeout(self):
+        state = AtomicState()
+        assert state.wait_for_newer(0, timeout=0.01).version == 0
+
+
+class TestDisplayManager(object):
+
+    def setup_method(self):
+        RecordingDisplay.calls = []
+        self.dm = DisplayManager([
+            ('pizero_gpslog.tests.test_displaymanager', 'RecordingDisplay')
+        ])
+
+    def teardown_method(self):
+        self.dm.stop(timeout=5)
+
+    def test_skips_unchanged_versions(self):
+        self.dm.update(lat=1.0, lon=-1.0)
+        self.dm.start(refresh_sec=0)
+        assert wait_for(lambda: len(RecordingDisplay.calls) == 1)
+        time.sleep(0.1)
+        assert RecordingDisplay.calls == [(1.0, -1.0, True)]
+        self.dm.update(lat=2.0, lon=-2.0)
+        assert wait_for(lambda: len(RecordingDisplay.calls) == 2)
+        assert RecordingDisplay.calls[1] == (2.0, -2.0, False)
+        assert self.dm.stats['frames'] == 2
+
+    def test_no_torn_state(self):
+        self.dm.start(refresh_sec=0)
+        for i in range(1, 500):
+            self.dm.update(lat=float(i), lon=float(-i))
+        assert wait_for(lambda: RecordingDisplay.calls[-1][0] == 499.0)
+        for lat, lon, _ in RecordingDisplay.calls:
+            assert lon == -lat
+
+    def test_multiple_displays(self):
+        self.dm.stop()
+        self.dm = DisplayManager([
+            ('pizero_gpslog.tests.test_displaymanager', 'RecordingDisplay'),
+            ('pizero_gpslog.tests.test_displaymanager', 'RecordingDisplay')
+        ])
+        self.dm.update(lat=1.0, lon=-1.0)
+        self.dm.start(refresh_sec=0)
+        assert wait_for(lambda: len(RecordingDisplay.calls) == 2)
+        assert RecordingDisplay.calls == [(1.0, -1.0, True)] * 2
+
+    def test_isolated(self):
+        self.dm.stop()
+        self.dm = DisplayManager([
+            ('pizero_gpslog.tests.test_displaymanager', 'RecordingDisplay')
+        ], isolate=True)
+        self.dm.update(lat=1.0, lon=-1.0)
+        self.dm.start(refresh_sec=0)
+        time.sleep(0.5)
+        self.dm.update(lat=2.0, lon=-2.0)
+        time.sleep(0.5)
+        self.dm.stop(timeout=5)
+        # the display ran in the child process, not here
+        assert RecordingDisplay.calls == []
+        assert self.dm.stats['frames'] == 2
+
+    def test_isolated_stop_timeout(self):
+        self.dm.stop()
+        self.dm = DisplayManager([
+            ('pizero_gpslog.tests.test_displaymanager', 'HangingDisplay')
+        ], isolate=True)
+        self.dm.start(refresh_sec=0)
+        time.sleep(0.5)
+        start = time.monotonic()
+        self.dm.stop(timeout=1)
+        assert time.monotonic() - start < 5
+        assert not self.dm._process.is_alive()
+
+    def test_isolated_child_died(self, caplog):
+        self.dm.stop()
+        self.dm = DisplayManager([('no_such_module', 'Display')], isolate=True)
+        self.dm.start(refresh_sec=0)
+        self.dm._process.join(30)
+        assert not self.dm._process.is_alive()
+        with caplog.at_level(logging.ERROR):
+            for i in range(5):
+                self.dm.update(lat=float(i), lon=float(-i))
+        assert caplog.text.count('Unable to send state') == 1
+        self.dm.stop(timeout=5)
+
+    def test_isolated_child_init(self, tmpdir):
+        self.dm.stop()
+        marker = str(tmpdir.join('init'))
+        self.dm = DisplayManager([
+            ('pizero_gpslog.tests.test_displaymanager', 'RecordingDisplay')
+        ], isolate=True, child_init=partial(touch, marker))
+        self.dm.start(refresh_sec=0)
+        assert wait_for(lambda: os.path.exists(marker), timeout=30)
+        self.dm.stop(timeout=5)
+        assert self.dm.stats['frames'] == 1
+
+
+class TestRenderCache(object):
+
+    def test_frame(self):
+        cache = RenderCache()
+        layout = Adafruit4567Layout()
+        args = (FixType.FIX_3D, 38.1, -77.2, 'extra', (1.5, 2.5))
+        t1 = datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        t2 = datetime(2021, 1, 2, 3, 4, 6, tzinfo=timezone.utc)
+        one = cache.frame(layout, 1, *args, t1)
+        two = cache.frame(layout, 1, *args, t2)
+        assert (cache.hits, cache.misses) == (1, 1)
+        # the clock is drawn per frame, on top of the shared body
+        assert one.tobytes() == layout.render(
+            layout.lines(*args, t1)
+        ).tobytes()
+        assert two.tobytes() == layout.render(
+            layout.lines(*args, t2)
+        ).tobytes()
+        assert one.tobytes() != two.tobytes()
+        cache.frame(layout, 2, FixType.NO_FIX, 0.0, 0.0, '', (0, 0), t2)
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_lines(self):
+        layout = Adafruit4567Layout()
+        dt = datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        assert layout.lines(
+            FixType.FIX_2D, 1.0, 2.0, 'x', (3.0, 4.0), dt
+        ) == ['03:04:05 Z | 2D fix', 'Lat: 1.0', 'Lon: 2.0', 'x']
+        assert layout.lines(
+            FixType.NO_GPS, 1.0, 2.0, 'x', (3.0, 4.0), dt
+        ) == ['03:04:05 Z', 'No GPS yet', '', 'x']
@@ -0,0 +1,228 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from pizero_gpslog.extradata.base import BaseExtraDataProvider
+from pizero_gpslog.extradatamanager import ExtraDataManager, IsolatedProvider
+
+
+class Provider(BaseExtraDataProvider):
+
+    def run(self):
+        pass
+
+
+class Geiger(Provider):
+
+    def run(self):
+        self._set_data({'message': '5 CPS', 'data': {'time': 10.0, 'cps': 5}})
+
+
+class Counter(Provider):
+
+    def run(self):
+        if os.environ.get('STALL_MARKER') and \
+                not os.path.exists(os.environ['STALL_MARKER']):
+            open(os.environ['STALL_MARKER'], 'w').close()
+            os.kill(os.getpid(), signal.SIGSTOP)
+        for i in range(1000):
+            self._set_data({
+                'message': str(i), 'data': {'time': time.time(), 'pid': i}
+            })
+            time.sleep(0.05)
+
+
+class Battery(Provider):
+
+    namespace = 'batt'
+
+    def run(self):
+        self._set_data({'message': '', 'data': {'time': 12.0, 'volts': 3.7}})
+
+
+def sample(t, value):
+    return {'message': f'{value}', 'data': {'time': t, 'value': value,
+                                            'label': f'at {t}'}}
+
+
+class TestSampleAt(object):
+
+    def setup_method(self):
+        self.p = Provider()
+        for t, value in [(10.0, 1), (15.0, 2), (20.0, 4)]:
+            self.p._set_data(sample(t, value))
+
+    def test_latest(self):
+        assert self.p.data == sample(20.0, 4)
+
+    def test_empty(self):
+        p = Provider()
+        p._data = {'message': 'direct'}
+        assert p.sample_at(12.0) == ({'message': 'direct'}, None)
+
+    def test_nearest(self):
+        assert self.p.sample_at(12.0) == (sample(10.0, 1), -2.0)
+        assert self.p.sample_at(13.0) == (sample(15.0, 2), 2.0)
+        assert self.p.sample_at(5.0) == (sample(10.0, 1), 5.0)
+        assert self.p.sample_at(21.0) == (sample(20.0, 4), -1.0)
+
+    def test_interpolate(self):
+        data, offset = self.p.sample_at(16.0, interpolate=True)
+        assert offset == 0.0
+        assert data['message'] == '2'
+        assert data['data'] == {
+            'time': 16.0, 'value': pytest.approx(2.4), 'label': 'at 15.0'
+        }
+        assert self.p.sample_at(25.0, interpolate=True) == (
+            sample(20.0, 4), -5.0
+        )
+
+    def test_buffer_bounded(self, monkeypatch):
+        monkeypatch.setenv('EXTRA_DATA_BUFFER', '2')
+        p = Provider()
+        for t in range(5):
+            p._set_data(sample(float(t), t))
+        assert p.sample_at(0.0) == (sample(3.0, 3), 3.0)
+
+
+class TestExtraDataManager(object):
+
+    def classes(self, *names):
+        return [('pizero_gpslog.tests.test_extradata', x) for x in names]
+
+    def test_single(self):
+        m = ExtraDataManager(self.classes('Geiger'))
+        m.start()
+        for p in m.providers.values():
+            p.join()
+        assert m.data == {
+            'message': '5 CPS', 'data': {'time': 10.0, 'cps': 5}
+        }
+        assert m.sample_at(11.0)[1] == -1.0
+
+    def test_multiple(self):
+        m = ExtraDataManager(self.classes('Geiger', 'Battery', 'Geiger'))
+        assert list(m.providers.keys()) == ['geiger', 'batt', 'geiger_2']
+        m.start()
+        for p in m.providers.values():
+            p.join()
+        assert m.data == {
+            'message': '5 CPS | 5 CPS',
+            'data': {
+                'geiger': {'time': 10.0, 'cps': 5},
+                'batt': {'time': 12.0, 'volts': 3.7},
+                'geiger_2': {'time': 10.0, 'cps': 5}
+            }
+        }
+        data, offsets = m.sample_at(11.0)
+        assert data == m.data
+        assert offsets == {'geiger': -1.0, 'batt': 1.0, 'geiger_2': -1.0}
+
+
+def wait_for(func, timeout=10.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if func():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestIsolatedProvider(object):
+
+    def setup_method(self):
+        self.p = None
+
+    def teardown_method(self):
+        if self.p is not None:
+            self.p.stop()
+            self.p.join(5)
+
+    def start(self, clsname, watchdog_sec=30.0):
+        self.p = IsolatedProvider(
+            'pizero_gpslog.tests.test_extradata', clsname,
+            watchdog_sec=watchdog_sec
+        )
+        self.p.tick_sec = 0.1
+        self.p.restart_delay = 0.1
+        self.p.start()
+        return self.p
+
+    def test_not_imported(self):
+        m = ExtraDataManager([('no_such_module', 'Battery')], isolate=True)
+        p = m.providers['battery']
+        assert isinstance(p, IsolatedProvider)
+        assert 'no_such_module' not in sys.modules
+
+    def test_samples(self):
+        p = self.start('Counter')
+        assert p.namespace == 'counter'
+        assert wait_for(lambda: len(p._buffer) >= 5)
+        values = [x[1]['data']['pid'] for x in p._buffer]
+        assert values == list(range(values[0], values[0] + len(values)))
+        assert p.data['message'] == str(values[-1])
+        assert p.restarts == 0
+
+    def test_restart_on_exit(self):
+        p = self.start('Geiger')
+        assert wait_for(lambda: p.restarts >= 1)
+        assert p.data['message'] == '5 CPS'
+
+    def test_restart_on_stall(self, tmpdir, monkeypatch):
+        monkeypatch.setenv('STALL_MARKER', str(tmpdir.join('stalled')))
+        p = self.start('Counter', watchdog_sec=1.0)
+        assert wait_for(lambda: p.restarts == 1 and len(p._buffer) > 0)
+        assert p.restarts == 1
+
+    def test_manager_stop(self):
+        m = ExtraDataManager(
+            [('pizero_gpslog.tests.test_extradata', 'Counter')], isolate=True
+        )
+        self.p = m.providers['counter']
+        self.p.tick_sec = 0.1
+        m.start()
+        assert wait_for(lambda: len(self.p._buffer) > 0)
+        process = self.p._process
+        m.stop()
+        assert not self.p.is_alive()
+        assert not process.is_alive()
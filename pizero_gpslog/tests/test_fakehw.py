@@ -0,0 +1,157 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+from datetime import datetime, timezone
+from importlib import import_module
+from unittest.mock import patch
+
+from pizero_gpslog.fakehw import FakeHardware
+from pizero_gpslog.utils import FixType
+
+DT = datetime(2020, 9, 11, 12, 34, 56, tzinfo=timezone.utc)
+
+
+class TestFakeHardware(object):
+
+    def setup_method(self):
+        self.hw = FakeHardware(busy_scale=0)
+        self.hw.install()
+
+    def teardown_method(self):
+        self.hw.uninstall()
+
+    def test_gpio_toggles(self):
+        gpio = import_module('RPi.GPIO')
+        gpio.output(17, 1)
+        gpio.output(17, 1)
+        gpio.output(17, 0)
+        assert self.hw.stats.gpio_writes == 3
+        assert self.hw.stats.gpio_toggles == 2
+        assert gpio.input(17) == 0
+
+    def test_busy_pin(self):
+        hw = FakeHardware(busy_seconds={0x12: 60})
+        hw.install()
+        gpio = import_module('RPi.GPIO')
+        spi = import_module('spidev').SpiDev(0, 0)
+        assert gpio.input(24) == 1
+        gpio.output(25, 1)
+        spi.writebytes([0x12])
+        assert gpio.input(24) == 1
+        gpio.output(25, 0)
+        spi.writebytes([0x12])
+        assert gpio.input(24) == 0
+        assert hw.spi_commands == [0x12]
+        assert hw.stats.busy_seconds == 60
+        hw.uninstall()
+
+    @patch('time.sleep')
+    def test_epd2in13bc(self, mock_sleep):
+        mod = import_module('pizero_gpslog.displays.epd2in13bc')
+        epd = mod.EPD2in13bc()
+        self.hw.stats.reset()
+        self.hw.spi_commands = []
+        epd.update_display(
+            fix_type=FixType.FIX_3D, lat=38.8976763, lon=-77.0365298,
+            extradata='foo', fix_precision=(1.5, 2.5), dt=DT,
+            should_clear=False
+        )
+        # one command byte per data byte of the black framebuffer, plus
+        # DATA_START_TRANSMISSION_1, DATA_STOP and REFRESH
+        assert self.hw.stats.spi_bytes == (104 * 212 // 8) + 3
+        assert self.hw.stats.spi_transactions == (104 * 212 // 8) + 3
+        assert self.hw.spi_commands == [0x10, 0x92, 0x12]
+        del epd
+
+    def _epd_busy_refresh(self, hw):
+        mod = import_module('pizero_gpslog.displays.epd2in13bc')
+        with patch('time.sleep'):
+            epd = mod.EPD2in13bc()
+        hw.stats.reset()
+        epd.update_display(
+            fix_type=FixType.NO_GPS, lat=0.0, lon=0.0, extradata='',
+            fix_precision=(0.0, 0.0), dt=DT, should_clear=False
+        )
+        last_busy = epd.last_busy_seconds
+        hw.busy_seconds = {}
+        del epd
+        return last_busy
+
+    def test_epd2in13bc_busy_edge(self):
+        hw = FakeHardware(busy_seconds={0x12: 0.3})
+        hw.install()
+        last_busy = self._epd_busy_refresh(hw)
+        assert 0.25 < last_busy < 0.35
+        assert hw.stats.gpio_edge_waits >= 1
+        assert hw.stats.gpio_reads < 10
+        hw.uninstall()
+
+    def test_epd2in13bc_busy_edge_missed(self, monkeypatch):
+        # an edge that is never reported only delays noticing the end of
+        # BUSY until the next check of the pin
+        hw = FakeHardware(busy_seconds={0x12: 0.3})
+        monkeypatch.setattr(hw, '_edge_thread', lambda *args: None)
+        hw.install()
+        mod = import_module('pizero_gpslog.displays.epd2in13bc')
+        monkeypatch.setattr(mod.EPD2in13bc, 'edge_check_sec', 0.1)
+        last_busy = self._epd_busy_refresh(hw)
+        assert 0.25 < last_busy < 0.45
+        assert hw._edge_detects == {}
+        hw.uninstall()
+
+    def test_epd2in13bc_busy_poll_fallback(self):
+        hw = FakeHardware(busy_seconds={0x12: 0.3}, edge_detection=False)
+        hw.install()
+        last_busy = self._epd_busy_refresh(hw)
+        assert 0.25 < last_busy < 0.5
+        assert hw.stats.gpio_edge_waits == 0
+        assert hw.stats.gpio_reads >= 3
+        hw.uninstall()
+
+    @patch('time.sleep')
+    def test_adafruit4567(self, mock_sleep):
+        mod = import_module('pizero_gpslog.displays.adafruit4567')
+        disp = mod.Adafruit4567()
+        self.hw.stats.reset()
+        disp.update_display(
+            fix_type=FixType.NO_FIX, lat=0.0, lon=0.0, extradata='',
+            fix_precision=(0.0, 0.0), dt=DT, should_clear=False
+        )
+        assert self.hw.stats.i2c_transactions == 7
+        assert self.hw.stats.i2c_bytes == (6 * 2) + 1 + (128 * 32 // 8)
+        assert any(x != 0 for x in disp._disp.buffer)
+        del disp
@@ -0,0 +1,192 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import json
+import logging
+import struct
+from calendar import timegm
+
+import pytest
+
+from pizero_gpslog.extradata.gmc_history import HistoryJoiner
+from pizero_gpslog.extradata.gmc_protocol import (
+    BATCH_QUERIES, BatchedGMC, HistorySample, batch_command,
+    parse_batch_response, parse_history, read_flash, spir_command
+)
+
+T0 = timegm((2020, 9, 11, 12, 0, 0))
+
+
+def timestamp_record(yy, mo, dd, hh, mi, ss, mode):
+    return bytes([0x55, 0xAA, 0, yy, mo, dd, hh, mi, ss, 0x55, 0xAA, mode])
+
+
+class FakeSerial(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.written = b''
+        self.resets = 0
+
+    def reset_input_buffer(self):
+        self.resets += 1
+
+    def write(self, data):
+        self.written += data
+
+    def flush(self):
+        pass
+
+    def read(self, size):
+        data = b''.join(self.responses[x] for x in self.written_commands())
+        return data[:size]
+
+    def written_commands(self):
+        return [
+            x + b'>>' for x in self.written.split(b'>>') if x
+        ]
+
+
+class TestGmcProtocol(object):
+
+    def test_batch_command(self):
+        assert batch_command() == (
+            b'<GETCPS>><GETCPSL>><GETCPSH>><GETCPM>><GETCPML>><GETCPMH>>'
+            b'<GETMAXCPS>>'
+        )
+
+    def test_parse(self):
+        buf = struct.pack('>7I', 0xC0000005, 1, 2, 300, 4, 5, 0x40000006)
+        assert parse_batch_response(buf) == {
+            'cps': 5, 'cpsl': 1, 'cpsh': 2, 'cpm': 300, 'cpml': 4,
+            'cpmh': 5, 'maxcps': 6
+        }
+
+    def test_parse_short(self):
+        with pytest.raises(ValueError):
+            parse_batch_response(b'\x00' * 27)
+
+    def test_batched_read(self):
+        responses = {
+            cmd: struct.pack('>I', i + 1)
+            for i, (_, cmd, _) in enumerate(BATCH_QUERIES)
+        }
+        port = FakeSerial(responses)
+        values, t, latency = BatchedGMC(port).read()
+        assert port.resets == 1
+        assert port.written == batch_command()
+        assert values['cps'] == 1
+        assert values['maxcps'] == 7
+        assert latency >= 0
+        assert t > 0
+
+
+class TestHistory(object):
+
+    def test_spir_command(self):
+        assert spir_command(0x012345, 4096) == \
+            b'<SPIR\x01\x23\x45\x10\x00>>'
+        with pytest.raises(ValueError):
+            spir_command(0, 4097)
+
+    def test_read_flash_stops_at_blank(self):
+
+        class Port(FakeSerial):
+
+            def read(self, size):
+                cmd = self.written[-12:]
+                address = int.from_bytes(cmd[5:8], 'big')
+                if address < 8:
+                    return bytes(range(address, address + size))
+                return b'\xff' * size
+
+        data = read_flash(Port({}), size=32, chunk_size=4)
+        assert data == bytes(range(8))
+
+    def test_parse(self):
+        buf = (
+            b'\x01\x02' +
+            timestamp_record(20, 9, 11, 14, 0, 0, 1) +
+            b'\x05\x06' +
+            b'\x55\xaa\x01\x01\x2c' +
+            b'\x55\xaa\x02\x03abc' +
+            b'\x07' +
+            timestamp_record(20, 9, 11, 13, 0, 0, 2) +
+            b'\x55\xaa\x04\x00\x01\x00\x00' +
+            b'\xff' * 20
+        )
+        assert parse_history(buf, utc_offset=2) == [
+            HistorySample(T0 - 3600, 65536, 'CPM', 60),
+            HistorySample(T0, 5, 'CPS', 1),
+            HistorySample(T0 + 1, 6, 'CPS', 1),
+            HistorySample(T0 + 2, 300, 'CPS', 1),
+            HistorySample(T0 + 3, 7, 'CPS', 1),
+        ]
+
+    def test_join(self, tmpdir, caplog):
+        samples = [HistorySample(T0 + i, i, 'CPS', 1) for i in range(10)]
+        lines = [
+            {'tpv': [{'mode': 3, 'time': '2020-09-11T12:00:03.400Z'}]},
+            {'tpv': [{'mode': 1, 'time': '2020-09-11T12:00:04.000Z'}]},
+            {'tpv': [{'mode': 2, 'time': '2020-09-11T12:01:00.000Z'}]},
+        ]
+        in_path = str(tmpdir.join('in.json'))
+        out_path = str(tmpdir.join('out.json'))
+        tail = [b'{corrupt\n', b'\n', b'{"tpv": ["\xff\xfe"]}\r\n', b'{"tpv": ["x"]}']
+        with open(in_path, 'wb') as fh:
+            for line in lines:
+                fh.write(json.dumps(line).encode('utf-8') + b'\n')
+            fh.write(b''.join(tail))
+        with caplog.at_level(logging.WARNING):
+            counts = HistoryJoiner(samples).join_file(in_path, out_path)
+        assert counts == {'lines': 7, 'fixes': 2, 'joined': 1}
+        assert 'Unable to decode JSON on line 4' in caplog.text
+        assert 'Unable to decode JSON on line 6' in caplog.text
+        with open(in_path, 'rb') as fh:
+            in_data = fh.read()
+        with open(out_path, 'rb') as fh:
+            out_data = fh.read()
+        # everything but the joined fix is copied byte for byte
+        assert out_data.splitlines(True)[1:] == in_data.splitlines(True)[1:]
+        out_lines = out_data.decode('utf-8', 'replace').splitlines()
+        result = [json.loads(x) for x in out_lines[:3]]
+        assert result[0]['_gmc_history'] == {
+            'time': T0 + 3, 'count': 3, 'unit': 'CPS',
+            'offset': pytest.approx(-0.4)
+        }
+        assert '_gmc_history' not in result[1]
+        assert '_gmc_history' not in result[2]
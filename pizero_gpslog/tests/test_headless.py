@@ -0,0 +1,153 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+from PIL import Image
+
+from pizero_gpslog.displays.headless import HeadlessDisplay
+from pizero_gpslog.displays.layouts import (
+    LAYOUTS, Adafruit4567Layout, EPD2in13bcLayout, RenderCache
+)
+from pizero_gpslog.screentest import benchmark
+from pizero_gpslog.utils import FixType
+
+DT = datetime(2020, 9, 11, 12, 34, 56, tzinfo=timezone.utc)
+
+#: (fix_type, lat, lon, extradata, fix_precision) for each kind of frame
+VALUES = [
+    (FixType.NO_GPS, 0.0, 0.0, '', (0.0, 0.0)),
+    (FixType.NO_FIX, 0.0, 0.0, 'extra', (0.0, 0.0)),
+    (FixType.FIX_2D, 38.8976763, -77.0365298, '', (1.5, 2.5)),
+    (FixType.FIX_3D, 38.8976763, -77.0365298, '5 CPS', (1.5, 2.5)),
+]
+
+
+def update(display, values, should_clear=False):
+    fix_type, lat, lon, extradata, fix_precision = values
+    display.update_display(
+        fix_type=fix_type, lat=lat, lon=lon, extradata=extradata,
+        fix_precision=fix_precision, dt=DT, should_clear=should_clear
+    )
+
+
+class TestLayouts(object):
+
+    def test_epd2in13bc_lines(self):
+        layout = EPD2in13bcLayout()
+        assert layout.lines(*VALUES[0], DT) == [
+            '12:34:56 UTC', 'No GPS yet', '', '', ''
+        ]
+        assert layout.lines(*VALUES[3], DT) == [
+            '12:34:56 UTC', '3D 1.5,2.5', 'Lat: 38.8976763',
+            'Lon: -77.0365298', '5 CPS'
+        ]
+
+    def test_adafruit4567_lines(self):
+        layout = Adafruit4567Layout()
+        assert layout.lines(*VALUES[1], DT) == [
+            '12:34:56 Z', 'No Fix yet', '', 'extra'
+        ]
+        assert layout.lines(*VALUES[2], DT) == [
+            '12:34:56 Z', '2D fix: 1.5,2.5', 'Lat: 38.8976763',
+            'Lon: -77.0365298'
+        ]
+        assert layout.lines(*VALUES[3], DT)[0] == '12:34:56 Z | 3D fix'
+
+    @pytest.mark.parametrize('name', sorted(LAYOUTS.keys()))
+    def test_render(self, name):
+        layout = LAYOUTS[name]()
+        blank = Image.new(layout.mode, layout.size, layout.background)
+        for values in VALUES:
+            lines = layout.lines(*values, DT)
+            image = layout.render(lines)
+            assert (image.size, image.mode) == (layout.size, layout.mode)
+            assert image.tobytes() != blank.tobytes()
+            # the cached body plus the per-frame clock is the same image
+            assert RenderCache().frame(
+                layout, 1, *values, DT
+            ).tobytes() == image.tobytes()
+
+
+class TestHeadlessDisplay(object):
+
+    @pytest.mark.parametrize('name', sorted(LAYOUTS.keys()))
+    def test_update_display(self, name, monkeypatch):
+        monkeypatch.setenv('HEADLESS_LAYOUT', name)
+        monkeypatch.delenv('HEADLESS_OUTPUT_DIR', raising=False)
+        layout = LAYOUTS[name]()
+        d = HeadlessDisplay()
+        blank = d.image.tobytes()
+        assert (d.image.size, d.image.mode) == (layout.size, layout.mode)
+        for values in VALUES:
+            update(d, values)
+            assert (d.image.size, d.image.mode) == (layout.size, layout.mode)
+            assert d.image.tobytes() == layout.render(
+                layout.lines(*values, DT)
+            ).tobytes()
+        assert d.frame_count == len(VALUES)
+        d.clear()
+        assert d.image.tobytes() == blank
+
+    def test_png_output(self, monkeypatch, tmpdir):
+        monkeypatch.setenv('HEADLESS_LAYOUT', 'adafruit4567')
+        monkeypatch.setenv('HEADLESS_OUTPUT_DIR', str(tmpdir))
+        d = HeadlessDisplay()
+        for values in VALUES[:2]:
+            update(d, values)
+        assert sorted(os.listdir(str(tmpdir))) == [
+            'frame-000001.png', 'frame-000002.png'
+        ]
+        with Image.open(str(tmpdir.join('frame-000002.png'))) as image:
+            assert image.size == Adafruit4567Layout.size
+            assert image.convert('1').tobytes() == d.image.tobytes()
+
+
+class TestBenchmark(object):
+
+    def test_benchmark(self, monkeypatch, capsys):
+        monkeypatch.setenv('HEADLESS_LAYOUT', 'epd2in13bc')
+        monkeypatch.delenv('HEADLESS_OUTPUT_DIR', raising=False)
+        benchmark(['adafruit4567'], rate=20.0, duration=0.3)
+        out = capsys.readouterr().out.splitlines()
+        assert out[0].split()[0] == 'Target'
+        row = out[1].split()
+        assert row[0] == 'adafruit4567'
+        assert int(row[1]) > 0
+        assert float(row[3]) > 0
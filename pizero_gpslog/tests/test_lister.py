@@ -0,0 +1,156 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import json
+import os
+import shutil
+
+from pizero_gpslog import lister
+from pizero_gpslog.lister import (
+    CACHE_FILENAME, exact_summary, main, quick_summary, summarize,
+    SummaryCache
+)
+from pizero_gpslog.logreader import iter_fixes
+
+
+class TestQuickSummary(object):
+
+    def test_estimate(self, moving_log_path):
+        assert os.stat(moving_log_path).st_size > lister.SMALL_SIZE
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        s = quick_summary(moving_log_path)
+        assert not s.exact
+        assert s.bbox is None
+        assert s.start == fixes[0].time
+        assert s.end == fixes[-1].time
+        assert abs(s.points - len(fixes)) < len(fixes) * 0.05
+
+    def test_small_blocks(self, log_path, monkeypatch):
+        monkeypatch.setattr(lister, 'SMALL_SIZE', 0)
+        monkeypatch.setattr(lister, 'BLOCK_SIZE', 1000)
+        exact = exact_summary(log_path)
+        s = quick_summary(log_path)
+        assert not s.exact
+        assert (s.start, s.end) == (exact.start, exact.end)
+        assert abs(s.points - exact.points) < exact.points * 0.25
+        # a final line that is still being written is ignored
+        with open(log_path, 'a') as fh:
+            fh.write('{"tpv": [{"mode": 3, "time": "2018-03-01T21')
+        assert quick_summary(log_path).end == exact.end
+
+    def test_no_fixes(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(lister, 'SMALL_SIZE', 0)
+        path = str(tmpdir.join('nofix.json'))
+        with open(path, 'w') as fh:
+            for _ in range(50):
+                fh.write('{"tpv": [{"mode": 1}], "sky": [], "gst": []}\n')
+        s = quick_summary(path)
+        assert (s.start, s.end, s.points, s.duration) == (None, None, 0, None)
+
+    def test_malformed_lines(self, log_path, tmpdir, monkeypatch):
+        monkeypatch.setattr(lister, 'SMALL_SIZE', 0)
+        path = str(tmpdir.join('malformed.json'))
+        bad = [
+            '{"tpv": [{"class": "TPV", "mode": 3}]}',
+            '{"tpv": [], "sky": []}',
+            '{"tpv": 5}',
+            '{"tpv": ["x"]}',
+            '[1, 2]',
+            '5'
+        ]
+        with open(log_path) as fh:
+            good = fh.readlines()
+        with open(path, 'w') as fh:
+            fh.write('\n'.join(bad) + '\n')
+            fh.writelines(good)
+            fh.write('\n'.join(bad) + '\n')
+        fixes = list(iter_fixes(log_path, errors=None))
+        s = quick_summary(path)
+        assert (s.start, s.end) == (fixes[0].time, fixes[-1].time)
+
+
+class TestExactSummary(object):
+
+    def test_exact(self, log_path):
+        fixes = list(iter_fixes(log_path, errors=None))
+        s = exact_summary(log_path)
+        assert s.exact
+        assert s.points == len(fixes) == 175
+        assert s.start == fixes[0].time
+        assert s.end == fixes[-1].time
+        assert s.bbox == (
+            min(f.lat for f in fixes), min(f.lon for f in fixes),
+            max(f.lat for f in fixes), max(f.lon for f in fixes)
+        )
+
+    def test_cache(self, moving_log_path, tmpdir):
+        logs = tmpdir.mkdir('logs')
+        path = str(logs.join('a.json'))
+        with open(moving_log_path) as fh:
+            lines = fh.readlines()
+        with open(path, 'w') as fh:
+            fh.writelines(lines[:1000])
+        first = summarize([str(logs)], exact=True)
+        assert [s.points for s in first] == [1000]
+        with open(str(logs.join(CACHE_FILENAME))) as fh:
+            assert json.load(fh)['files']['a.json']['points'] == 1000
+        # unchanged files are summarized exactly from the cache
+        assert summarize([str(logs)]) == first
+        with open(path, 'a') as fh:
+            fh.writelines(lines[1000:])
+        cache = SummaryCache(str(logs.join(CACHE_FILENAME)))
+        assert not cache.summary(path).exact
+        assert cache.entries['a.json']['offset'] < os.stat(path).st_size
+        grown = cache.summary(path, exact=True)
+        assert grown == exact_summary(moving_log_path)._replace(path=path)
+
+    def test_main(self, log_path, tmpdir, capsys):
+        logs = tmpdir.mkdir('logs')
+        shutil.copy(log_path, str(logs.join('a.json')))
+        # pizero-gpslog-gmc-history output is not listed
+        shutil.copy(log_path, str(logs.join('a.gmc.json')))
+        main(['-C', '-x', str(logs)])
+        out = capsys.readouterr().out.splitlines()
+        assert out[0].split() == [
+            'FILE', 'START', 'END', 'DURATION', 'POINTS', 'BBOX'
+        ]
+        assert out[1].split()[:6] == [
+            'a.json', '2018-03-01', '20:14:18', '2018-03-01', '20:17:12',
+            '0:02:54'
+        ]
+        assert out[-1] == '1 files, 175 points, 0:02:54 logged'
+        assert not os.path.exists(str(logs.join(CACHE_FILENAME)))
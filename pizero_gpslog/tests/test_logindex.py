@@ -0,0 +1,256 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import csv
+import json
+import os
+import shutil
+import sqlite3
+
+import pytest
+from gpxpy.geo import ONE_DEGREE, distance
+
+from pizero_gpslog.logindex import (
+    LogIndex, main, parse_time, radius_bbox, SCHEMA_VERSION
+)
+from pizero_gpslog.logreader import iter_fixes
+from pizero_gpslog.utils import parse_gps_time
+
+
+def brute_force(paths, start, end):
+    return [
+        (path, fix) for path in paths
+        for fix in iter_fixes(path, errors=None)
+        if start <= parse_gps_time(fix.time) <= end
+    ]
+
+
+class TestLogIndex(object):
+
+    def test_query(self, log_path, tmpdir):
+        logs = tmpdir.mkdir('logs')
+        path = str(logs.join('a.json'))
+        shutil.copy(log_path, path)
+        # pizero-gpslog-gmc-history output is not indexed
+        shutil.copy(log_path, str(logs.join('a.gmc.json')))
+        index = LogIndex(str(logs), every=10)
+        assert index.update() == 175
+        assert index.update() == 0
+        start = parse_time('2018-03-01T20:15:00')
+        end = parse_time('2018-03-01T20:15:30.5')
+        ranges = index.time_ranges(start, end)
+        assert len(ranges) == 1
+        assert 0 < ranges[0].start.offset < ranges[0].end < \
+            os.path.getsize(path)
+        result = list(index.fixes_between(start, end))
+        assert len(result) == 31
+        assert result == brute_force([path], start, end)
+        assert index.time_ranges(0, start - 3600) == []
+        index.close()
+
+    def test_incremental(self, log_path, tmpdir):
+        logs = tmpdir.mkdir('logs')
+        with open(log_path, 'rb') as fh:
+            data = fh.read()
+        cut = data.index(b'\n', len(data) // 2) + 100
+        path = str(logs.join('a.json'))
+        with open(path, 'wb') as fh:
+            fh.write(data[:cut])
+        index = LogIndex(str(logs), every=7)
+        first = index.update()
+        assert 0 < first < 175
+        with open(path, 'ab') as fh:
+            fh.write(data[cut:])
+        shutil.copy(log_path, str(logs.join('b.json')))
+        assert index.update() == 175 - first + 175
+        paths = [path, str(logs.join('b.json'))]
+        result = list(index.fixes_between(0, float('inf')))
+        assert sorted(result) == sorted(brute_force(paths, 0, float('inf')))
+        # includes the fix logged out of order, with its altitude resolved
+        # from before the start of the range
+        start = parse_time('2018-03-01T20:16:00')
+        result = list(index.fixes_between(start, start + 1))
+        assert result == brute_force(paths, start, start + 1)
+        assert result[0][1].time == '2018-03-01T20:16:00.25Z'
+        # truncated and removed files
+        with open(path, 'r+b') as fh:
+            fh.truncate(cut - 99)
+        os.unlink(paths[1])
+        assert index.update() == first
+        assert len(list(index.fixes_between(0, float('inf')))) == first
+        index.close()
+
+    def test_main(self, log_path, tmpdir, capsys):
+        logs = tmpdir.mkdir('logs')
+        shutil.copy(log_path, str(logs.join('a.json')))
+        main([
+            '-d', str(logs), '-s', '2018-03-01 20:15:00',
+            '-E', '2018-03-01T20:15:09Z'
+        ])
+        rows = list(csv.reader(capsys.readouterr().out.splitlines()))
+        assert rows[0][0] == 'time'
+        assert [x[0] for x in rows[1:]] == [
+            '2018-03-01T20:15:0%d.000Z' % i for i in range(10)
+        ]
+        assert os.path.exists(str(logs.join('.pizero-gpslog-index.sqlite')))
+
+
+class TestSpatialIndex(object):
+
+    @pytest.fixture
+    def logs(self, moving_log_path, log_path, tmpdir):
+        logs = tmpdir.mkdir('logs')
+        shutil.copy(moving_log_path, str(logs.join('moving.json')))
+        shutil.copy(log_path, str(logs.join('still.json')))
+        return logs
+
+    def test_bbox(self, logs):
+        index = LogIndex(str(logs), cell_deg=0.001)
+        index.update()
+        paths = [str(logs.join('moving.json')), str(logs.join('still.json'))]
+        centre = list(iter_fixes(paths[0], errors=None))[500]
+        bbox = (
+            centre.lat - 0.002, centre.lon - 0.002, centre.lat + 0.002,
+            centre.lon + 0.002
+        )
+        expected = [
+            (path, fix) for path, fix in brute_force(paths, 0, float('inf'))
+            if bbox[0] <= fix.lat <= bbox[2] and bbox[1] <= fix.lon <= bbox[3]
+        ]
+        assert len(expected) > 10
+        ranges = index.bbox_ranges(*bbox)
+        assert set(x.path for x in ranges) == {paths[0]}
+        assert sum(x.end - x.start.offset for x in ranges) < \
+            os.path.getsize(paths[0]) / 2
+        assert list(index.fixes_in_bbox(*bbox)) == expected
+        index.close()
+
+    def test_near_and_incremental(self, logs):
+        path = str(logs.join('moving.json'))
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        cut = data.index(b'\n', len(data) // 3) + 1
+        with open(path, 'wb') as fh:
+            fh.write(data[:cut])
+        index = LogIndex(str(logs), cell_deg=0.001)
+        index.update()
+        with open(path, 'ab') as fh:
+            fh.write(data[cut:])
+        index.update()
+        fixes = list(iter_fixes(path, errors=None))
+        centre = fixes[len(fixes) // 3]
+        expected = [
+            (path, fix) for fix in fixes if distance(
+                centre.lat, centre.lon, None, fix.lat, fix.lon, None,
+                haversine=True
+            ) <= 50
+        ]
+        assert len(expected) > 1
+        assert list(index.fixes_near(centre.lat, centre.lon, 50)) == expected
+        index.close()
+
+    def test_boundary_jitter(self, tmpdir):
+        logs = tmpdir.mkdir('jitter')
+        path = str(logs.join('a.json'))
+        with open(path, 'w') as fh:
+            for i in range(200):
+                # alternate either side of a cell boundary, then of another
+                lat = 33.001 + (0.00001 if i % 2 else -0.00001)
+                if i >= 150:
+                    lat += 0.01
+                fh.write(json.dumps({
+                    'tpv': [{
+                        'mode': 3, 'lat': lat, 'lon': -83.9005, 'alt': 250.0,
+                        'speed': 0.0,
+                        'time': '2020-09-11T12:%02d:%02d.000Z' % divmod(i, 60)
+                    }],
+                    'gst': [{'alt': 0.0}], 'sky': [{'hdop': 1.0}]
+                }) + '\n')
+        index = LogIndex(str(logs), cell_deg=0.001)
+        assert index.update() == 200
+        rows = index._db.execute('SELECT COUNT(*) FROM cell_ranges').fetchone()
+        assert rows[0] == 4
+        bbox = (33.0, -83.901, 33.001, -83.9)
+        expected = [
+            (path, fix) for path, fix in brute_force([path], 0, float('inf'))
+            if bbox[0] <= fix.lat <= bbox[2] and bbox[1] <= fix.lon <= bbox[3]
+        ]
+        assert len(expected) == 75
+        assert list(index.fixes_in_bbox(*bbox)) == expected
+        index.close()
+        index = LogIndex(
+            str(logs), db_path=str(logs.join('nomerge.sqlite')), cell_deg=0.001,
+            merge_gap=0
+        )
+        index.update()
+        rows = index._db.execute('SELECT COUNT(*) FROM cell_ranges').fetchone()
+        assert rows[0] == 200
+        assert list(index.fixes_in_bbox(*bbox)) == expected
+        index.close()
+
+    def test_radius_bbox(self):
+        min_lat, min_lon, max_lat, max_lon = radius_bbox(60.0, 10.0, 1000.0)
+        assert max_lat - 60.0 == pytest.approx(60.0 - min_lat)
+        assert (max_lat - min_lat) * ONE_DEGREE == pytest.approx(2000)
+        assert (max_lon - min_lon) == pytest.approx(
+            2 * (max_lat - 60.0) / 0.5, rel=1e-2
+        )
+
+    def test_old_schema_rebuilt(self, logs):
+        db_path = str(logs.join('idx.sqlite'))
+        db = sqlite3.connect(db_path)
+        db.execute('CREATE TABLE files (id INTEGER PRIMARY KEY)')
+        db.commit()
+        db.close()
+        index = LogIndex(str(logs), db_path=db_path)
+        assert index.update() == 3175
+        index.close()
+        db = sqlite3.connect(db_path)
+        assert db.execute('PRAGMA user_version').fetchone()[0] == \
+            SCHEMA_VERSION
+        db.close()
+
+    def test_main_files(self, logs, capsys):
+        main([
+            '-d', str(logs), '-l', '-n', '33.62254,-83.98261', '-r', '20',
+            '-s', '2018-03-01T20:15:00'
+        ])
+        out = capsys.readouterr().out.splitlines()
+        assert len(out) == 1
+        path, count = out[0].split('\t')
+        assert path == str(logs.join('still.json'))
+        assert 0 < int(count) < 175
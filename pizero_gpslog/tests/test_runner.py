@@ -0,0 +1,142 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import ast
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from pizero_gpslog import runner
+from pizero_gpslog.gpsd import GpsResponse
+from pizero_gpslog.logreader import iter_fixes
+from pizero_gpslog.track import Track
+from pizero_gpslog.tripstats import summary_path
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class FakeGpsClient(object):
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def recorded_packets():
+    fname = os.path.join(DATA_DIR, 'bu353s4-cold-to-stillfix.gpsd-responses')
+    with open(fname) as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            response = ast.literal_eval(line)['response']
+            if response:
+                yield GpsResponse.from_json(response)
+            else:
+                yield GpsResponse()
+
+
+@pytest.fixture
+def gps_logger(tmpdir, monkeypatch):
+    for name in ['DISPLAY_CLASS', 'EXTRA_DATA_CLASS', 'DISPLAY_ODOMETER']:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('OUT_DIR', str(tmpdir))
+    monkeypatch.setenv('SUMMARY_INTERVAL', '50')
+    monkeypatch.setattr(runner, 'GpsClient', FakeGpsClient)
+    return runner.GpsLogger()
+
+
+class TestTripStats(object):
+
+    def test_summary(self, gps_logger):
+        num_fixes = 0
+        for packet in recorded_packets():
+            gps_logger._handle_packet(packet)
+            num_fixes += packet.mode >= 2
+        outfile = gps_logger._outfile
+        with open(summary_path(outfile)) as fh:
+            partial = json.load(fh)
+        assert not partial['closed']
+        assert partial['stats']['num_points'] == num_fixes // 50 * 50
+        gps_logger.close()
+        # the deferred last fix is written out on close
+        fixes = list(iter_fixes(outfile, errors=None))
+        assert len(fixes) == num_fixes
+        expected = Track.from_fixes(fixes).stats()
+        with open(summary_path(outfile)) as fh:
+            summary = json.load(fh)
+        assert summary['closed']
+        assert set(summary['stats']) == set(expected)
+        for k, v in expected.items():
+            if isinstance(v, float):
+                assert summary['stats'][k] == pytest.approx(
+                    v, rel=1e-9, abs=1e-9
+                ), k
+            else:
+                assert summary['stats'][k] == (
+                    v.isoformat() if isinstance(v, datetime) else v
+                ), k
+        assert summary['stats']['num_points'] == num_fixes
+
+    def test_close_stops_display_and_extra_data(self, gps_logger):
+        calls = []
+
+        class Stoppable(object):
+
+            def __init__(self, name):
+                self.name = name
+
+            def stop(self):
+                calls.append(self.name)
+
+        gps_logger._display = Stoppable('display')
+        gps_logger._extra_data_instance = Stoppable('extradata')
+        gps_logger.close()
+        assert calls == ['display', 'extradata']
+        assert gps_logger._display is None
+
+    def test_odometer(self, gps_logger, monkeypatch):
+        assert gps_logger._display_message() == ''
+        monkeypatch.setenv('DISPLAY_ODOMETER', 'km')
+        g = runner.GpsLogger()
+        g._stats.distance_2d = 12345.0
+        assert g._display_message() == '12.35km'
+        g._extra_data_instance.data = {'message': '42 CPM'}
+        assert g._display_message() == '12.35km 42 CPM'
+        monkeypatch.setenv('DISPLAY_ODOMETER', 'furlongs')
+        with pytest.raises(RuntimeError):
+            runner.GpsLogger()
@@ -0,0 +1,145 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import os
+import time
+
+import pytest
+
+from pizero_gpslog.extradata.serial_lines import (
+    PortConfig, SerialLineSensors, get_parser, parse_keyvalue,
+    parse_port_list
+)
+
+
+def wait_for(func, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if func():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestParsers(object):
+
+    def test_port_list(self):
+        assert parse_port_list(
+            'env:/dev/ttyUSB0:115200:keyvalue, batt:/dev/ttyACM0,'
+            'x:/dev/ttyS0:9600:mymod:parse'
+        ) == [
+            PortConfig('env', '/dev/ttyUSB0', 115200, 'keyvalue'),
+            PortConfig('batt', '/dev/ttyACM0', 9600, 'raw'),
+            PortConfig('x', '/dev/ttyS0', 9600, 'mymod:parse'),
+        ]
+
+    def test_port_list_colons_in_path(self):
+        path = '/dev/serial/by-path/platform-3f980000.usb-usb-0:1.2:1.0-port0'
+        assert parse_port_list(
+            f'a:{path},b:{path}:115200,c:{path}:19200:json,'
+            f'd:{path}:57600:mymod.sub:parse'
+        ) == [
+            PortConfig('a', path, 9600, 'raw'),
+            PortConfig('b', path, 115200, 'raw'),
+            PortConfig('c', path, 19200, 'json'),
+            PortConfig('d', path, 57600, 'mymod.sub:parse'),
+        ]
+        with pytest.raises(ValueError):
+            parse_port_list('a:/dev/ttyUSB0:12345')
+        with pytest.raises(ValueError):
+            parse_port_list('a')
+
+    def test_keyvalue(self):
+        assert parse_keyvalue('T=21.5, RH:40 name=foo') == {
+            'T': 21.5, 'RH': 40, 'name': 'foo'
+        }
+        assert parse_keyvalue('garbage') is None
+
+    def test_get_parser(self):
+        assert get_parser('keyvalue') is parse_keyvalue
+        assert get_parser('os.path:basename') is os.path.basename
+        with pytest.raises(ValueError):
+            get_parser('nope')
+
+
+class TestSerialLineSensors(object):
+
+    def setup_method(self):
+        self.ptys = [os.openpty() for _ in range(2)]
+
+    def teardown_method(self):
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+    def test_parse_errors_rate_limited(self, caplog):
+        p = SerialLineSensors([
+            PortConfig('batt', os.ttyname(self.ptys[0][1]), 9600, 'raw')
+        ])
+        port = p._ports[0]
+        with caplog.at_level(logging.WARNING):
+            for _ in range(3):
+                p._parse_error(port, 'bad')
+        assert port.errors == 3
+        assert caplog.text.count('Error parsing line') == 1
+        port.error_logged_at -= p.error_log_sec
+        with caplog.at_level(logging.WARNING):
+            p._parse_error(port, 'bad')
+        assert caplog.text.count('Error parsing line') == 2
+        assert '4 errors so far' in caplog.text
+
+    def test_multiple_ports(self):
+        p = SerialLineSensors([
+            PortConfig('env', os.ttyname(self.ptys[0][1]), 9600, 'keyvalue'),
+            PortConfig('batt', os.ttyname(self.ptys[1][1]), 115200, 'number'),
+        ])
+        p.start()
+        env, batt = self.ptys[0][0], self.ptys[1][0]
+        assert wait_for(lambda: all(x.fd is not None for x in p._ports))
+        os.write(env, b'T=21.5 RH=4')
+        os.write(batt, b'3.71\r\nnot a number\r\n')
+        assert wait_for(lambda: 'batt' in p.data['data'])
+        assert 'env' not in p.data['data']
+        os.write(env, b'0\nT=22.0 RH=41\n')
+        assert wait_for(lambda: p.data['data'].get('env', {}).get('T') == 22.0)
+        data = p.data['data']
+        assert data['env']['RH'] == 41
+        assert data['batt']['value'] == 3.71
+        assert p.data['message'] == 'batt 3.71 env 22.0'
+        assert len(p._buffer) == 3
+        assert [x.lines for x in p._ports] == [2, 1]
@@ -0,0 +1,173 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+from pizero_gpslog import converter
+from pizero_gpslog.converter import convert_file, main
+from pizero_gpslog.logreader import iter_fixes
+from pizero_gpslog.simplify import (
+    douglas_peucker, fixes_to_keep, project, simplify, visvalingam
+)
+
+
+def max_deviation(x, y, kept):
+    """Largest distance of any point from the simplified line's segment."""
+    result = 0.0
+    for start, end in zip(kept[:-1], kept[1:]):
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start:end + 1] - x[start], y[start:end + 1] - y[start]
+        t = np.clip((px * dx + py * dy) / max(dx * dx + dy * dy, 1e-12), 0, 1)
+        result = max(result, np.hypot(px - t * dx, py - t * dy).max())
+    return result
+
+
+def reference_dp(x, y, tolerance):
+    """Textbook recursive Douglas-Peucker."""
+    def recurse(start, end):
+        if end - start < 2:
+            return []
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        t = np.clip((px * dx + py * dy) / max(dx * dx + dy * dy, 1e-12), 0, 1)
+        dists = np.hypot(px - t * dx, py - t * dy)
+        idx = int(dists.argmax())
+        if dists[idx] <= tolerance:
+            return []
+        idx += start + 1
+        return recurse(start, idx) + [idx] + recurse(idx, end)
+    return [0] + recurse(0, len(x) - 1) + [len(x) - 1]
+
+
+@pytest.fixture
+def walk():
+    rnd = np.random.RandomState(42)
+    heading = np.cumsum(rnd.normal(0, 0.1, 5000))
+    x = np.cumsum(10 * np.cos(heading)) + rnd.normal(0, 2, 5000)
+    y = np.cumsum(10 * np.sin(heading)) + rnd.normal(0, 2, 5000)
+    return x, y
+
+
+class TestDouglasPeucker(object):
+
+    def test_same_as_recursive(self, walk):
+        x, y = walk
+        kept = douglas_peucker(x, y, 10.0)
+        assert kept.tolist() == reference_dp(x, y, 10.0)
+        assert max_deviation(x, y, kept) <= 10.0
+        assert len(kept) < len(x) / 4
+
+    def test_small(self):
+        x = np.array([0.0, 1.0, 2.0, 3.0])
+        y = np.array([0.0, 0.5, -0.5, 0.0])
+        assert douglas_peucker(x, y, 1.0).tolist() == [0, 3]
+        assert douglas_peucker(x, y, 0.1).tolist() == [0, 1, 2, 3]
+        assert douglas_peucker(x[:2], y[:2], 1.0).tolist() == [0, 1]
+        # a track that returns to its start
+        x = np.array([0.0, 50.0, 100.0, 50.0, 0.0])
+        y = np.zeros(5)
+        assert douglas_peucker(x, y, 1.0).tolist() == [0, 2, 4]
+
+
+class TestVisvalingam(object):
+
+    def test_walk(self, walk):
+        x, y = walk
+        fine = visvalingam(x, y, 5.0)
+        coarse = visvalingam(x, y, 20.0)
+        assert fine[0] == coarse[0] == 0
+        assert fine[-1] == coarse[-1] == len(x) - 1
+        assert len(coarse) < len(fine) < len(x)
+        assert np.all(np.diff(fine) > 0)
+
+    def test_small(self):
+        # collinear points go; the corner of the L stays
+        x = np.array([0.0, 10.0, 20.0, 20.0, 20.0])
+        y = np.array([0.0, 0.0, 0.0, 10.0, 20.0])
+        assert visvalingam(x, y, 1.0).tolist() == [0, 2, 4]
+        assert visvalingam(x, y, 15.0).tolist() == [0, 4]
+
+
+class TestSimplify(object):
+
+    def test_project(self):
+        x, y = project(
+            np.array([10.0, 10.0, 10.001]), np.array([179.9995, -179.9995, 180])
+        )
+        assert x[1] == pytest.approx(109.6, abs=0.1)
+        assert y[2] == pytest.approx(111.3, abs=0.1)
+        assert simplify(
+            np.array([]), np.array([]), 10.0
+        ).tolist() == []
+
+    def test_convert(self, moving_log_path, tmpdir, capsys):
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        keep = fixes_to_keep(fixes, 25.0)
+        out = str(tmpdir.join('out.csv'))
+        stats = convert_file(
+            moving_log_path, {'csv': out}, stream=True, simplify=25.0
+        )
+        assert stats['num_points'] == len(fixes)
+        assert stats['simplified_points'] == keep.sum() < len(fixes) / 2
+        with open(out) as fh:
+            rows = list(csv.DictReader(fh))
+        assert [r['time'] for r in rows] == [
+            f.time for f, k in zip(fixes, keep) if k
+        ]
+        main(['--simplify', '25', '--simplify-method', 'vw', '-f', 'csv',
+              '-o', out, moving_log_path])
+        assert 'points written after simplification' in capsys.readouterr().out
+        with pytest.raises(SystemExit):
+            main(['--simplify', '25', '-c', moving_log_path])
+
+    def test_convert_two_passes(self, log_path, tmpdir, monkeypatch):
+        calls = []
+
+        def recording_iter_fixes(fpath, errors=None):
+            calls.append(errors)
+            return iter_fixes(fpath, errors=errors)
+
+        monkeypatch.setattr(converter, 'iter_fixes', recording_iter_fixes)
+        out = str(tmpdir.join('out.csv'))
+        stats = convert_file(log_path, {'csv': out}, stream=True, simplify=5.0)
+        assert stats['num_points'] == 175
+        # invalid lines are only reported by the pass that writes
+        assert len(calls) == 2
+        assert calls[0] is None and calls[1] is not None
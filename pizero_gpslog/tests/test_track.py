@@ -0,0 +1,87 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import pytest
+
+from pizero_gpslog.converter import GpxConverter
+from pizero_gpslog.logreader import iter_fixes
+from pizero_gpslog.track import Track, TrackColumns
+
+
+def assert_same_stats(path):
+    conv = GpxConverter(path)
+    expected = conv.stats_for_gpx(conv.convert())
+    actual = Track.from_file(path).stats()
+    assert set(actual) == set(expected)
+    for k, v in expected.items():
+        if isinstance(v, float):
+            assert actual[k] == pytest.approx(v, rel=1e-9, abs=1e-9), k
+        else:
+            assert actual[k] == v, k
+
+
+class TestTrack(object):
+
+    def test_stillfix(self, log_path):
+        assert_same_stats(log_path)
+
+    def test_moving(self, moving_log_path):
+        assert_same_stats(moving_log_path)
+
+    def test_reduce_many_points(self, moving_log_path):
+        conv = GpxConverter(moving_log_path)
+        gpx = conv.convert()
+        gpx.reduce_points(500, min_distance=10)
+        track = Track.from_file(moving_log_path).reduce_points(
+            500, min_distance=10
+        )
+        assert len(track) == gpx.get_points_no()
+        assert list(track.lat) == [p.latitude for p in gpx.walk(True)]
+
+    def test_empty(self, tmpdir):
+        path = str(tmpdir.join('empty.json'))
+        with open(path, 'w') as fh:
+            fh.write('{"tpv": [{"mode": 1}]}\n')
+        assert_same_stats(path)
+
+    def test_columns(self, moving_log_path):
+        cols = TrackColumns()
+        for fix in iter_fixes(moving_log_path, errors=None):
+            cols.append(fix)
+        assert len(cols) == 3000
+        assert cols.lat.itemsize * 5 == 40
+        assert cols.track().stats() == Track.from_file(moving_log_path).stats()
@@ -0,0 +1,123 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import pytest
+
+from pizero_gpslog.logreader import iter_fixes
+from pizero_gpslog.track import Track
+from pizero_gpslog.tripstats import MAX_MIN_DISTANCE, RunningStats
+from pizero_gpslog.utils import parse_gps_time
+
+
+def add_all(stats, fixes):
+    for fix in fixes:
+        stats.add(parse_gps_time(fix.time), fix.lat, fix.lon, fix.alt)
+
+
+def assert_same_stats(actual, expected):
+    """
+    Running sums are added in a different order to the NumPy sums, so
+    floats may differ in the last bits.
+    """
+    assert set(actual) == set(expected)
+    for k, v in expected.items():
+        if isinstance(v, float):
+            assert actual[k] == pytest.approx(v, rel=1e-9, abs=1e-9), k
+        else:
+            assert actual[k] == v, k
+
+
+class TestRunningStats(object):
+
+    def test_empty(self):
+        assert RunningStats().stats() == {
+            'num_points': 0, '2d_horizontal_distance': 0.0
+        }
+
+    def test_same_as_track(self, moving_log_path):
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        s = RunningStats()
+        add_all(s, fixes)
+        track = Track.from_fixes(fixes)
+        # the track is long enough that the reduction distance grows
+        assert s.min_distance > 10
+        assert_same_stats(s.stats(), track.stats())
+        # the moving data is found from the same reduced points
+        reduced = track.reduce_points(2000, min_distance=10)
+        assert s.reduced_track().time.tolist() == reduced.time.tolist()
+        # the reduced tracks no longer in use are dropped
+        assert all(len(x) == 0 for x in s.reduced[:s.min_distance - 10])
+
+    def test_same_as_track_partial(self, moving_log_path):
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        s = RunningStats()
+        for count in (1, 2, 3, 4, 50, 1000, 2000, len(fixes)):
+            add_all(s, fixes[s.num_points:count])
+            assert_same_stats(
+                s.stats(), Track.from_fixes(fixes[:count]).stats()
+            )
+
+    def test_same_as_track_stillfix(self, log_path):
+        fixes = list(iter_fixes(log_path, errors=None))
+        s = RunningStats()
+        add_all(s, fixes)
+        assert_same_stats(s.stats(), Track.from_fixes(fixes).stats())
+
+    def test_longer_than_max(self, moving_log_path):
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        s = RunningStats()
+        # spread the points out so the reduction distance passes the
+        # largest exact one
+        for fix in fixes:
+            s.add(parse_gps_time(fix.time), fix.lat * 30, fix.lon * 30)
+        assert s.min_distance > MAX_MIN_DISTANCE
+        assert s.thresholds[-1] == s.min_distance
+        assert all(len(x) == 0 for x in s.reduced[:-1])
+        assert s.stats()['num_points'] == len(fixes)
+
+    def test_round_trip(self, moving_log_path):
+        fixes = list(iter_fixes(moving_log_path, errors=None))
+        whole = RunningStats()
+        add_all(whole, fixes)
+        part = RunningStats()
+        add_all(part, fixes[:1000])
+        data = part.to_bytes()
+        part = RunningStats.from_bytes(data)
+        add_all(part, fixes[1000:])
+        assert part.stats() == whole.stats()
+        with pytest.raises(ValueError):
+            RunningStats.from_bytes(data[:-8])
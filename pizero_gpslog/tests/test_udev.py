@@ -0,0 +1,126 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+from threading import Timer
+
+import pizero_gpslog.extradata.udev as udev
+from pizero_gpslog.extradata.udev import DeviceCache, UdevDeviceWatcher
+
+GMC = ('1a86', '7523', '0263')
+OTHER = ('0403', '6001', '0600')
+
+
+class TestDeviceCache(object):
+
+    def test_find(self):
+        c = DeviceCache()
+        c.add('/dev/ttyUSB1', OTHER)
+        assert c.find([GMC]) is None
+        c.add('/dev/ttyUSB0', GMC)
+        assert c.find([GMC]) == '/dev/ttyUSB0'
+        c.remove('/dev/ttyUSB0')
+        assert c.find([GMC]) is None
+        assert c.devices == {'/dev/ttyUSB1': OTHER}
+
+    def test_wait_for_add(self):
+        c = DeviceCache()
+        c.add('/dev/ttyUSB0', GMC)
+        # already present before the wait started
+        assert c.wait_for_add(matches=[GMC], timeout=0.01) is None
+        since = c.generation
+        c.remove('/dev/ttyUSB0')
+        t = Timer(0.05, c.add, args=('/dev/ttyUSB2', GMC))
+        t.start()
+        assert c.wait_for_add(matches=[GMC], timeout=5) == '/dev/ttyUSB2'
+        t.join()
+        # added after "since", even though before the wait started
+        assert c.wait_for_add(matches=[GMC], since=since) == '/dev/ttyUSB2'
+        assert c.wait_for_add(
+            devname='/dev/ttyUSB2', timeout=0, since=since
+        ) == '/dev/ttyUSB2'
+        assert c.wait_for_add(matches=[OTHER], timeout=0, since=since) is None
+
+
+class StopPolling(BaseException):
+    pass
+
+
+class FakeDevice(object):
+
+    action = 'add'
+    device_node = '/dev/ttyUSB0'
+    properties = {
+        'ID_BUS': 'usb', 'ID_VENDOR_ID': GMC[0], 'ID_MODEL_ID': GMC[1],
+        'ID_REVISION': GMC[2]
+    }
+
+
+class FakeMonitor(object):
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    def poll(self):
+        if not self.results:
+            raise StopPolling()
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeWatcher(UdevDeviceWatcher):
+
+    def __init__(self, results):
+        DeviceCache.__init__(self)
+        self._monitor = FakeMonitor(results)
+
+
+class TestUdevDeviceWatcher(object):
+
+    def test_error_backoff(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(udev, 'sleep', sleeps.append)
+        w = FakeWatcher(
+            [OSError()] * 8 + [FakeDevice()] + [OSError()] * 2
+        )
+        try:
+            w.run()
+        except StopPolling:
+            pass
+        assert sleeps == [1, 2, 4, 8, 16, 32, 60, 60, 1, 2]
+        assert w.devices == {'/dev/ttyUSB0': GMC}
@@ -0,0 +1,385 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Columnar (NumPy) track representation for fast track statistics.
+"""
+
+import math
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+from gpxpy.geo import EARTH_RADIUS, ONE_DEGREE
+from gpxpy.gpx import (
+    DEFAULT_STOPPED_SPEED_THRESHOLD, IGNORE_TOP_SPEED_PERCENTILES
+)
+
+from pizero_gpslog.logreader import FixRecord, iter_fixes
+from pizero_gpslog.utils import parse_gps_time
+
+#: ``max_points_no`` and ``min_distance`` that :py:meth:`Track.stats` (like
+#: ``stats_for_gpx``) reduces the track with before finding moving data
+REDUCE_MAX_POINTS = 2000
+REDUCE_MIN_DISTANCE = 10
+
+
+class MovingData(NamedTuple):
+    moving_time: float
+    stopped_time: float
+    moving_distance: float
+    stopped_distance: float
+    max_speed: float
+
+
+def distances(
+    lat1: np.ndarray, lon1: np.ndarray, ele1: Optional[np.ndarray],
+    lat2: np.ndarray, lon2: np.ndarray, ele2: Optional[np.ndarray]
+) -> np.ndarray:
+    """
+    Element-wise distances in metres between two sets of points, using the
+    same rules as ``gpxpy.geo.distance()``: haversine for points more than
+    0.2 degrees apart (ignoring elevation), otherwise an equirectangular
+    approximation using the latitude of the first point, plus the elevation
+    difference if ``ele1`` and ``ele2`` are given.
+    """
+    dlat = lat1 - lat2
+    dlon = lon1 - lon2
+    y = dlon * np.cos(np.radians(lat1))
+    result = np.sqrt(dlat * dlat + y * y) * ONE_DEGREE
+    if ele1 is not None and ele2 is not None:
+        dele = ele1 - ele2
+        result = np.where(
+            dele != 0, np.sqrt(result ** 2 + dele ** 2), result
+        )
+    far = (np.abs(dlat) > .2) | (np.abs(dlon) > .2)
+    if far.any():
+        rlat1 = np.radians(lat1[far])
+        rlat2 = np.radians(lat2[far])
+        a = np.sin((rlat1 - rlat2) / 2) ** 2 + \
+            np.sin(np.radians(dlon[far]) / 2) ** 2 * \
+            np.cos(rlat1) * np.cos(rlat2)
+        result[far] = EARTH_RADIUS * 2 * np.arcsin(np.sqrt(a))
+    return result
+
+
+def _distance(lat1, lon1, ele1, lat2, lon2, ele2) -> float:
+    """Scalar version of :py:func:`~.distances`."""
+    if abs(lat1 - lat2) > .2 or abs(lon1 - lon2) > .2:
+        return float(distances(
+            np.array([lat1]), np.array([lon1]), None,
+            np.array([lat2]), np.array([lon2]), None
+        )[0])
+    x = lat1 - lat2
+    y = (lon1 - lon2) * math.cos(math.radians(lat1))
+    d = math.sqrt(x * x + y * y) * ONE_DEGREE
+    if ele1 == ele2:
+        return d
+    return math.sqrt(d ** 2 + (ele1 - ele2) ** 2)
+
+
+class Track:
+    """
+    A single track segment stored as parallel NumPy arrays of time (float
+    UTC timestamps), latitude, longitude, altitude and speed. The statistics
+    methods reproduce those of the same-named gpxpy methods on a one-track,
+    one-segment GPX (as built by
+    :py:meth:`pizero_gpslog.converter.GpxConverter.convert`), but work on
+    whole columns at once.
+    """
+
+    def __init__(
+        self, time: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+        alt: np.ndarray, speed: np.ndarray
+    ):
+        self.time: np.ndarray = np.asarray(time, dtype=np.float64)
+        self.lat: np.ndarray = np.asarray(lat, dtype=np.float64)
+        self.lon: np.ndarray = np.asarray(lon, dtype=np.float64)
+        self.alt: np.ndarray = np.asarray(alt, dtype=np.float64)
+        self.speed: np.ndarray = np.asarray(speed, dtype=np.float64)
+
+    @classmethod
+    def from_fixes(cls, fixes: Iterable[FixRecord]) -> 'Track':
+        cols = TrackColumns()
+        for fix in fixes:
+            cols.append(fix)
+        return cols.track()
+
+    @classmethod
+    def from_file(cls, fpath: str) -> 'Track':
+        """Build a track from the fixes in a pizero-gpslog file."""
+        return cls.from_fixes(iter_fixes(fpath))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def _subset(self, idx) -> 'Track':
+        return Track(
+            self.time[idx], self.lat[idx], self.lon[idx], self.alt[idx],
+            self.speed[idx]
+        )
+
+    def _steps(self, use_3d) -> np.ndarray:
+        """
+        Distance from each point to the next (measured from the later
+        point, as gpxpy does); ``use_3d`` may be a bool or a boolean array.
+        """
+        d2 = distances(
+            self.lat[1:], self.lon[1:], None,
+            self.lat[:-1], self.lon[:-1], None
+        )
+        if use_3d is False:
+            return d2
+        d3 = distances(
+            self.lat[1:], self.lon[1:], self.alt[1:],
+            self.lat[:-1], self.lon[:-1], self.alt[:-1]
+        )
+        return np.where(use_3d, d3, d2)
+
+    def length_2d(self) -> float:
+        if len(self) < 2:
+            return 0.0
+        return float(self._steps(False).sum())
+
+    def length_3d(self) -> float:
+        if len(self) < 2:
+            return 0.0
+        return float(self._steps(True).sum())
+
+    def duration(self) -> Optional[float]:
+        if len(self) < 2:
+            return 0.0
+        if self.time[-1] < self.time[0]:
+            return None
+        return float(self.time[-1] - self.time[0])
+
+    def time_bounds(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        if len(self) == 0:
+            return None, None
+        return (
+            datetime.fromtimestamp(self.time[0], timezone.utc),
+            datetime.fromtimestamp(self.time[-1], timezone.utc)
+        )
+
+    def elevation_extremes(self) -> Tuple[Optional[float], Optional[float]]:
+        if len(self) == 0:
+            return None, None
+        return float(self.alt.min()), float(self.alt.max())
+
+    def uphill_downhill(self) -> Tuple[float, float]:
+        """Elevation gain and loss of a 0.3/0.4/0.3 smoothed profile."""
+        e = self.alt.copy()
+        if len(e) > 2:
+            e[1:-1] = self.alt[:-2] * .3 + self.alt[1:-1] * .4 + \
+                self.alt[2:] * .3
+        d = np.diff(e)
+        return float(d[d > 0].sum()), float(-d[d <= 0].sum())
+
+    def reduce_points(
+        self, max_points_no: Optional[int] = None,
+        min_distance: Optional[float] = None
+    ) -> 'Track':
+        """
+        Return a track with only points at least ``min_distance`` metres (or
+        enough to leave at most ``max_points_no`` points) from the
+        previously kept point.
+        """
+        if max_points_no is not None and len(self) <= max_points_no and \
+                not min_distance:
+            return self
+        min_distance = max(
+            min_distance or 0,
+            math.ceil(self.length_3d() / (max_points_no or 1000000000))
+        )
+        # each point's distance is measured from the last kept point, so
+        # this is inherently sequential
+        lat, lon, alt = self.lat.tolist(), self.lon.tolist(), self.alt.tolist()
+        keep = [0] if len(self) else []
+        last = 0
+        for i in range(1, len(lat)):
+            if _distance(
+                lat[last], lon[last], alt[last], lat[i], lon[i], alt[i]
+            ) >= min_distance:
+                keep.append(i)
+                last = i
+        return self._subset(np.array(keep, dtype=np.intp))
+
+    def smooth(self, vertical: bool = True, horizontal: bool = False) -> 'Track':
+        """
+        Return a track with each interior point moved to the 0.4/0.2/0.4
+        weighted average of itself and its neighbours; elevations are only
+        smoothed where all three are non-zero.
+        """
+        if len(self) <= 3:
+            return self
+        result = self._subset(slice(None))
+        result.alt = self.alt.copy()
+        result.lat = self.lat.copy()
+        result.lon = self.lon.copy()
+        if vertical:
+            e = self.alt
+            mask = (e[:-2] != 0) & (e[1:-1] != 0) & (e[2:] != 0)
+            result.alt[1:-1] = np.where(
+                mask, .4 * e[:-2] + .2 * e[1:-1] + .4 * e[2:], e[1:-1]
+            )
+        if horizontal:
+            for src, dest in ((self.lat, result.lat), (self.lon, result.lon)):
+                dest[1:-1] = .4 * src[:-2] + .2 * src[1:-1] + .4 * src[2:]
+        return result
+
+    def moving_data(
+        self, stopped_speed_threshold: float = DEFAULT_STOPPED_SPEED_THRESHOLD
+    ) -> MovingData:
+        """
+        Classify each step as moving or stopped by its speed, and find the
+        maximum speed ignoring outlying step lengths and the top 5% of
+        speeds.
+        """
+        if len(self) < 2:
+            return MovingData(0.0, 0.0, 0.0, 0.0, 0.0)
+        seconds = np.diff(self.time)
+        dist = self._steps((self.alt[1:] != 0) & (self.alt[:-1] != 0))
+        valid = (seconds > 0) & (dist != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed_kmh = (dist / 1000) / (seconds / 60 ** 2)
+        moving = valid & (speed_kmh > stopped_speed_threshold)
+        stopped = valid & ~moving
+        moving_seconds = np.where(moving, seconds, 0.0)
+        counted = valid & (np.cumsum(moving_seconds) > 0)
+        return MovingData(
+            float(moving_seconds.sum()),
+            float(seconds[stopped].sum()),
+            float(dist[moving].sum()),
+            float(dist[stopped].sum()),
+            _max_speed(dist[counted] / seconds[counted], dist[counted])
+        )
+
+    def smoothed_moving_data(self) -> MovingData:
+        """
+        Smooth this (reduced) track as :py:meth:`~.stats` does, and return
+        its :py:meth:`~.moving_data`.
+        """
+        smoothed = self.smooth(vertical=True, horizontal=True)
+        smoothed = smoothed.smooth(vertical=True, horizontal=False)
+        return smoothed.moving_data()
+
+    def stats(self, reduced: Optional['Track'] = None) -> dict:
+        """
+        Return the same statistics as
+        :py:meth:`pizero_gpslog.converter.GpxConverter.stats_for_gpx`.
+        ``reduced`` is the result of :py:meth:`~.reduce_points` with
+        :py:data:`~.REDUCE_MAX_POINTS` and :py:data:`~.REDUCE_MIN_DISTANCE`,
+        if it is already known.
+        """
+        if reduced is None:
+            reduced = self.reduce_points(
+                REDUCE_MAX_POINTS, min_distance=REDUCE_MIN_DISTANCE
+            )
+        moving = reduced.smoothed_moving_data()
+        start, end = self.time_bounds()
+        uphill, downhill = self.uphill_downhill()
+        min_elev, max_elev = self.elevation_extremes()
+        return {
+            'track_start': start,
+            'track_end': end,
+            'duration_sec': self.duration(),
+            'num_points': len(self),
+            'moving_time': moving.moving_time,
+            'stopped_time': moving.stopped_time,
+            'moving_distance': moving.moving_distance,
+            'stopped_distance': moving.stopped_distance,
+            'max_speed_ms': moving.max_speed,
+            '2d_horizontal_distance': self.length_2d(),
+            'total_elev_inc': uphill,
+            'total_elev_dec': downhill,
+            'min_elev': min_elev,
+            'max_elev': max_elev
+        }
+
+
+class TrackColumns:
+    """
+    Compact columns of fixes, appended one at a time, to build a
+    :py:class:`~.Track` from without keeping the
+    :py:class:`~pizero_gpslog.logreader.FixRecord` objects; each fix takes
+    40 bytes.
+    """
+
+    def __init__(self):
+        self.time: array = array('d')
+        self.lat: array = array('d')
+        self.lon: array = array('d')
+        self.alt: array = array('d')
+        self.speed: array = array('d')
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def append(self, fix: FixRecord):
+        self.time.append(parse_gps_time(fix.time))
+        self.lat.append(fix.lat)
+        self.lon.append(fix.lon)
+        self.alt.append(fix.alt)
+        self.speed.append(fix.speed)
+
+    def track(self) -> 'Track':
+        """
+        Return a :py:class:`~.Track` of the columns. The track's arrays share
+        memory with the columns, which can't be appended to while it exists.
+        """
+        return Track(*(
+            np.frombuffer(col, dtype=np.float64) if len(col) else
+            np.zeros(0) for col in (
+                self.time, self.lat, self.lon, self.alt, self.speed
+            )
+        ))
+
+
+def _max_speed(speeds: np.ndarray, dists: np.ndarray) -> float:
+    """
+    Maximum speed, ignoring steps whose length is more than 1.5 standard
+    deviations from the mean and the top 5% of the remaining speeds.
+    """
+    if len(speeds) < 2:
+        return 0.0
+    keep = np.abs(dists - dists.mean()) <= dists.std() * 1.5
+    speeds = np.sort(speeds[keep])
+    if len(speeds) == 0:
+        return 0.0
+    index = int(len(speeds) * (1 - IGNORE_TOP_SPEED_PERCENTILES))
+    if index >= len(speeds):
+        index = -1
+    return float(speeds[index])
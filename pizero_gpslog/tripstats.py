@@ -0,0 +1,319 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/pizero-gpslog>
+
+##################################################################################
+Copyright 2018-2020 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of pizero-gpslog, also known as pizero-gpslog.
+
+    pizero-gpslog is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    pizero-gpslog is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with pizero-gpslog.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/pizero-gpslog> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+Trip statistics that are updated one fix at a time, so they can be kept up
+to date while logging or while following a growing log file, and the
+``.summary`` sidecar files that ``pizero-gpslog`` writes them to.
+"""
+
+import json
+import math
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from pizero_gpslog.track import (
+    REDUCE_MAX_POINTS, REDUCE_MIN_DISTANCE, Track, _distance, distances
+)
+
+#: Largest reduction distance that :py:class:`~.RunningStats` keeps a
+#: reduced track for, so its stats are exactly those of
+#: :py:meth:`pizero_gpslog.track.Track.stats` for tracks up to this times
+#: :py:data:`~pizero_gpslog.track.REDUCE_MAX_POINTS` metres (200km) long
+MAX_MIN_DISTANCE = 100
+
+
+class RunningStats(object):
+    """
+    Statistics for a track, updated by :py:meth:`~.add` for each fix in
+    constant time and memory, that are the same as
+    :py:meth:`pizero_gpslog.track.Track.stats` for the same fixes (and so as
+    ``pizero-gpslog-convert``), up to floating point rounding.
+
+    The fixes themselves are not kept. The count, time and elevation bounds,
+    distances and smoothed elevation gain and loss are running sums and
+    extremes. The moving data is found from the track reduced to points at
+    least ``min_distance`` apart, which depends on the length of the whole
+    track; so a reduced track is kept for every whole number of metres from
+    ``min_distance`` up to :py:data:`~.MAX_MIN_DISTANCE`, each holding only
+    the points it keeps, and those below ``min_distance`` are dropped as the
+    track grows. Beyond :py:data:`~.MAX_MIN_DISTANCE` the largest one keeps
+    being reduced with the growing ``min_distance``, which only approximates
+    reducing the whole track at once. :py:meth:`~.stats` smooths the current
+    reduced track and finds its moving data.
+
+    :py:meth:`~.to_bytes` and :py:meth:`~.from_bytes` serialize the state,
+    so it can be saved and restored without the fixes.
+    """
+
+    def __init__(self):
+        self.num_points: int = 0
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.min_elev: Optional[float] = None
+        self.max_elev: Optional[float] = None
+        #: 2D distance so far, in metres
+        self.distance_2d: float = 0.0
+        #: 3D distance so far, in metres, which sets ``min_distance``
+        self.distance_3d: float = 0.0
+        #: total elevation gain and loss of the 0.3/0.4/0.3 smoothed
+        #: profile, up to the last point whose smoothed elevation is final
+        self.elev_inc: float = 0.0
+        self.elev_dec: float = 0.0
+        #: last smoothed elevation that is final (the last point's depends
+        #: on the next one)
+        self.last_smoothed: float = 0.0
+        #: time, latitude, longitude and elevation of the last two points
+        self.prev: List[float] = []
+        self.last: List[float] = []
+        #: minimum distance between the points of the reduced track
+        self.min_distance: int = REDUCE_MIN_DISTANCE
+        #: reduction distance of each reduced track
+        self.thresholds: np.ndarray = np.arange(
+            REDUCE_MIN_DISTANCE, MAX_MIN_DISTANCE + 1, dtype=float
+        )
+        #: latitude, longitude and elevation of the last point each reduced
+        #: track kept
+        self.kept: np.ndarray = np.zeros((3, len(self.thresholds)))
+        #: time, latitude, longitude and elevation of the points of each
+        #: reduced track; those below ``min_distance`` are empty
+        self.reduced: List[array] = [array('d') for _ in self.thresholds]
+
+    @property
+    def _first(self) -> int:
+        """Index of the first reduced track still in use."""
+        return min(self.min_distance, MAX_MIN_DISTANCE) - REDUCE_MIN_DISTANCE
+
+    def add(self, t: float, lat: float, lon: float, alt: Optional[float] = None):
+        """Add a fix at timestamp ``t``."""
+        alt = 0.0 if alt is None else alt
+        point = [t, lat, lon, alt]
+        self.num_points += 1
+        self.end_time = t
+        before = self.prev
+        self.prev, self.last = self.last, point
+        if self.num_points == 1:
+            self.start_time = t
+            self.min_elev = self.max_elev = alt
+            self.last_smoothed = alt
+            self.kept[:] = np.array([[lat], [lon], [alt]])
+            for reduced in self.reduced:
+                reduced.extend(point)
+            return
+        self.min_elev = min(self.min_elev, alt)
+        self.max_elev = max(self.max_elev, alt)
+        _, plat, plon, palt = self.prev
+        self.distance_2d += _distance(lat, lon, None, plat, plon, None)
+        self.distance_3d += _distance(lat, lon, alt, plat, plon, palt)
+        if self.num_points > 2:
+            # the previous point's smoothed elevation is now final
+            smoothed = before[3] * .3 + palt * .4 + alt * .3
+            self._add_elev_diff(smoothed - self.last_smoothed)
+            self.last_smoothed = smoothed
+        self._reduce(point)
+        min_distance = max(
+            REDUCE_MIN_DISTANCE,
+            math.ceil(self.distance_3d / REDUCE_MAX_POINTS)
+        )
+        if min_distance == self.min_distance:
+            return
+        old = self._first
+        self.min_distance = min_distance
+        for i in range(old, self._first):
+            self.reduced[i] = array('d')
+        if min_distance > MAX_MIN_DISTANCE:
+            self.thresholds[-1] = min_distance
+
+    def _add_elev_diff(self, diff: float):
+        if diff > 0:
+            self.elev_inc += diff
+        else:
+            self.elev_dec -= diff
+
+    def _reduce(self, point: List[float]):
+        """
+        Add ``point`` to each reduced track in use whose last point it is at
+        least that track's reduction distance from, as
+        :py:meth:`pizero_gpslog.track.Track.reduce_points` does.
+        """
+        first = self._first
+        kept = self.kept[:, first:]
+        thresholds = self.thresholds[first:]
+        new = np.broadcast_to(np.array([point[1:]]).T, kept.shape)
+        dist = distances(kept[0], kept[1], kept[2], new[0], new[1], new[2])
+        keep = dist >= thresholds
+        # reduce_points() uses the scalar distance, which may differ in the
+        # last bit; use it where that could change the result
+        for i in np.flatnonzero(np.abs(dist - thresholds) <= thresholds * 1e-9):
+            keep[i] = _distance(
+                float(kept[0, i]), float(kept[1, i]), float(kept[2, i]),
+                *point[1:]
+            ) >= thresholds[i]
+        idx = np.flatnonzero(keep)
+        if len(idx) == 0:
+            return
+        kept[:, idx] = new[:, idx]
+        for i in idx:
+            self.reduced[first + i].extend(point)
+
+    def reduced_track(self) -> Track:
+        """
+        Return the track reduced with the current ``min_distance``, as a
+        :py:class:`~pizero_gpslog.track.Track` with zero speeds.
+        """
+        points = np.array(self.reduced[self._first]).reshape(-1, 4)
+        return Track(
+            points[:, 0], points[:, 1], points[:, 2], points[:, 3],
+            np.zeros(len(points))
+        )
+
+    def stats(self) -> dict:
+        """
+        Return the current statistics, with the same keys as
+        :py:meth:`pizero_gpslog.track.Track.stats`; if there are no points
+        yet, only ``num_points`` and ``2d_horizontal_distance``.
+        """
+        if self.num_points == 0:
+            return {'num_points': 0, '2d_horizontal_distance': 0.0}
+        moving = self.reduced_track().smoothed_moving_data()
+        duration: Optional[float] = 0.0
+        if self.num_points > 1:
+            duration = self.end_time - self.start_time
+            if duration < 0:
+                duration = None
+        # the last point is an end point, so its smoothed elevation is its
+        # own; include the (provisional) difference to it
+        diff = self.last[3] - self.last_smoothed if self.num_points > 1 \
+            else 0.0
+        uphill, downhill = self.elev_inc, self.elev_dec
+        if diff > 0:
+            uphill += diff
+        else:
+            downhill -= diff
+        return {
+            'track_start': datetime.fromtimestamp(
+                self.start_time, timezone.utc
+            ),
+            'track_end': datetime.fromtimestamp(self.end_time, timezone.utc),
+            'duration_sec': duration,
+            'num_points': self.num_points,
+            'moving_time': moving.moving_time,
+            'stopped_time': moving.stopped_time,
+            'moving_distance': moving.moving_distance,
+            'stopped_distance': moving.stopped_distance,
+            'max_speed_ms': moving.max_speed,
+            '2d_horizontal_distance': self.distance_2d,
+            'total_elev_inc': uphill,
+            'total_elev_dec': downhill,
+            'min_elev': self.min_elev,
+            'max_elev': self.max_elev
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        Return the full state in a compact form, to restore with
+        :py:meth:`~.from_bytes`: a line of JSON with the running sums, then
+        the last kept points and the points of each reduced track in use as
+        native ``float64`` values.
+        """
+        header = {
+            k: v for k, v in vars(self).items()
+            if k not in ('thresholds', 'kept', 'reduced')
+        }
+        header['last_threshold'] = float(self.thresholds[-1])
+        header['lengths'] = [len(x) for x in self.reduced]
+        return b''.join(
+            [json.dumps(header).encode('utf-8'), b'\n', self.kept.tobytes()] +
+            [x.tobytes() for x in self.reduced]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RunningStats':
+        """
+        Restore an instance from the output of :py:meth:`~.to_bytes`; raises
+        ValueError if ``data`` isn't valid.
+        """
+        result = cls()
+        end = data.index(b'\n')
+        header = json.loads(data[:end].decode('utf-8'))
+        lengths = header.pop('lengths')
+        size = result.kept.size * 8
+        if len(lengths) != len(result.reduced) or \
+                len(data) != end + 1 + size + sum(lengths) * 8:
+            raise ValueError('Invalid RunningStats state')
+        result.thresholds[-1] = header.pop('last_threshold')
+        for k, v in header.items():
+            if not hasattr(result, k):
+                raise ValueError('Invalid RunningStats state key: %s' % k)
+            setattr(result, k, v)
+        pos = end + 1
+        result.kept = np.frombuffer(
+            data[pos:pos + size]
+        ).reshape(result.kept.shape).copy()
+        pos += size
+        for i, length in enumerate(lengths):
+            result.reduced[i].frombytes(data[pos:pos + length * 8])
+            pos += length * 8
+        return result
+
+
+#: Suffix added to a log file's path for its summary sidecar file
+SUMMARY_SUFFIX = '.summary'
+
+
+def summary_path(log_fpath: str) -> str:
+    """Return the path of the summary sidecar file for ``log_fpath``."""
+    return log_fpath + SUMMARY_SUFFIX
+
+
+def write_summary(fpath: str, stats: RunningStats, closed: bool = False):
+    """
+    Atomically write ``stats`` to the summary file at ``fpath``, as JSON
+    with the :py:meth:`~.RunningStats.stats` under ``stats`` (with times as
+    ISO8601 strings). ``closed`` records whether the log is complete.
+    """
+    summary = {
+        k: v.isoformat() if isinstance(v, datetime) else v
+        for k, v in stats.stats().items()
+    }
+    tmp = fpath + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(
+            {'closed': closed, 'stats': summary}, fh, sort_keys=True
+        )
+    os.replace(tmp, fpath)
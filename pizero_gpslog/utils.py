@@ -1,29 +1,14 @@
-from threading import Lock
-from copy import copy
+from threading import Condition
 import logging
+from calendar import timegm
 from enum import Enum
+from importlib import import_module
+from multiprocessing import get_context
+from multiprocessing.context import BaseContext
+from time import strptime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-
-class ThreadSafeValue:
-
-    def __init__(self, initial=''):
-        self._value = initial
-        self._lock = Lock()
-
-    def set(self, val):
-        self._lock.acquire()
-        try:
-            self._value = copy(val)
-        finally:
-            self._lock.release()
-
-    def get(self):
-        self._lock.acquire()
-        try:
-            result = copy(self._value)
-        finally:
-            self._lock.release()
-        return result
+logger = logging.getLogger(__name__)
 
 
 class FixType(Enum):
@@ -34,6 +19,181 @@ class FixType(Enum):
     FIX_3D = 3
 
 
+class DisplayState(NamedTuple):
+    """
+    Immutable snapshot of everything shown on the display. ``version`` is
+    incremented on every change; ``clear_count`` is incremented every time
+    the display should be cleared.
+    """
+
+    version: int = 0
+    fix_type: FixType = FixType.NO_GPS
+    fix_precision: Tuple[float, float] = (0.0, 0.0)
+    lat: float = 0.0
+    lon: float = 0.0
+    extradata: str = ''
+    clear_count: int = 0
+
+
+class AtomicState:
+    """
+    Holds an immutable :py:class:`~.DisplayState` that is replaced as a whole
+    on every update, so readers always get a consistent snapshot with a
+    single attribute read; :py:meth:`~.get` never takes a lock, while
+    :py:meth:`~.wait_for_newer` waits on the update condition.
+    """
+
+    def __init__(self, initial: DisplayState = DisplayState()):
+        self._state: DisplayState = initial
+        self._cond: Condition = Condition()
+
+    def get(self) -> DisplayState:
+        return self._state
+
+    def modify(
+        self, func: Callable[[DisplayState], Dict[str, Any]]
+    ) -> DisplayState:
+        """
+        Atomically replace the current state with one that has the changes
+        returned by ``func(current_state)`` applied and the version
+        incremented. Returns the new state.
+        """
+        with self._cond:
+            changes = func(self._state)
+            self._state = self._state._replace(
+                version=self._state.version + 1, **changes
+            )
+            self._cond.notify_all()
+            return self._state
+
+    def set(self, state: DisplayState):
+        """
+        Replace the current state with ``state`` as-is, including its
+        version; used to mirror a state received from another process.
+        """
+        with self._cond:
+            self._state = state
+            self._cond.notify_all()
+
+    def update(self, **changes) -> DisplayState:
+        """
+        Atomically set the given fields and increment the version.
+        """
+        return self.modify(lambda _: changes)
+
+    def wait_for_newer(
+        self, version: int, timeout: Optional[float] = None
+    ) -> DisplayState:
+        """
+        Wait up to ``timeout`` seconds for the state version to differ from
+        ``version``, and return the current state.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._state.version != version, timeout
+            )
+            return self._state
+
+
+class LatencyStats:
+    """
+    Accumulate count, mean and maximum of a series of durations, in seconds.
+    Not thread-safe; intended to be used from a single loop.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.maximum: float = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def __str__(self):
+        return 'mean=%.3fms max=%.3fms n=%d' % (
+            self.mean * 1000, self.maximum * 1000, self.count
+        )
+
+
+def parse_class_list(value: str) -> List[Tuple[str, str]]:
+    """
+    Parse a comma-separated list of colon-separated ``module:Class`` strings,
+    as used in the ``DISPLAY_CLASS`` environment variable, into a list of
+    (module name, class name) tuples.
+    """
+    result = []
+    for item in value.split(','):
+        item = item.strip()
+        if item == '':
+            continue
+        modname, clsname = item.split(':')
+        result.append((modname, clsname))
+    return result
+
+
+def import_classes(classes: List[Tuple[str, str]]) -> List[type]:
+    """
+    Import each of a list of (module name, class name) tuples, as returned by
+    :py:func:`~.parse_class_list`, and return the classes.
+    """
+    result = []
+    for modname, clsname in classes:
+        logger.debug('Import %s:%s', modname, clsname)
+        mod = import_module(modname)
+        result.append(getattr(mod, clsname))
+    return result
+
+
+def process_context() -> BaseContext:
+    """
+    Return the :py:mod:`multiprocessing` context to start child processes
+    with. This uses the ``spawn`` start method, so a child starts from a
+    fresh interpreter instead of a ``fork`` of the parent with its threads,
+    locks and imported modules, and only receives its pickled arguments and
+    the environment at the time it is started.
+    """
+    return get_context('spawn')
+
+
+def init_child_logging(level: int):
+    """
+    Configure logging in a child process started with
+    :py:func:`~.process_context`, which doesn't inherit the parent's logging
+    configuration, to log at ``level`` (the parent's root logger level).
+    """
+    logging.basicConfig(
+        level=level,
+        format='[%(asctime)s %(levelname)s %(processName)s] %(message)s'
+    )
+
+
+def parse_gps_time(s: str) -> float:
+    """
+    Convert a gpsd ISO8601 UTC time string, such as
+    ``2020-09-11T12:34:56.000Z``, to a float timestamp.
+
+    :raises ValueError: if the string can't be parsed
+    """
+    s = s.rstrip('Z')
+    whole, _, frac = s.partition('.')
+    t = float(timegm(strptime(whole, '%Y-%m-%dT%H:%M:%S')))
+    if frac:
+        t += float('0.' + frac)
+    return t
+
+
 def set_log_info(log: logging.Logger):
     """
     set logger level to INFO via :py:func:`~.set_log_level_format`.
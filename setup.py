@@ -44,6 +44,7 @@ with open('README.rst') as file:
 requires = [
     'gpiozero',
     'gpxpy',
+    'numpy',
     'pint',
     'pillow'
 ]
@@ -80,6 +81,9 @@ setup(
     pizero-gpslog-install = pizero_gpslog.installer:main
     pizero-gpslog-convert = pizero_gpslog.converter:main
     pizero-gpslog-screentest = pizero_gpslog.screentest:main
+    pizero-gpslog-gmc-history = pizero_gpslog.extradata.gmc_history:main
+    pizero-gpslog-query = pizero_gpslog.logindex:main
+    pizero-gpslog-ls = pizero_gpslog.lister:main
     """,
     keywords="raspberry pi rpi gps log logger gpsd",
     classifiers=classifiers,